@@ -22,6 +22,12 @@ export const emailApi = {
     return response.data;
   },
 
+  // Conversation (thread) the email belongs to, oldest first
+  getEmailThread: async (emailId) => {
+    const response = await api.get(`/emails/${emailId}/thread`);
+    return response.data;
+  },
+
   // Classify email
   classifyEmail: async (emailId) => {
     const response = await api.post(`/emails/${emailId}/classify`);
@@ -29,14 +35,16 @@ export const emailApi = {
   },
 
   // Generate reply
-  generateReply: async (emailId, context = {}) => {
-    const response = await api.post(`/emails/${emailId}/generate-reply`, context);
+  generateReply: async (emailId, context = {}, regenerate = false) => {
+    const response = await api.post(`/emails/${emailId}/generate-reply`, context, {
+      params: regenerate ? { regenerate: true } : {}
+    });
     return response.data;
   },
 
   // Update email status
-  updateEmailStatus: async (emailId, status) => {
-    const response = await api.put(`/emails/${emailId}`, { status });
+  updateEmailStatus: async (emailId, status, version) => {
+    const response = await api.put(`/emails/${emailId}`, { status, version });
     return response.data;
   },
 
@@ -58,6 +66,17 @@ export const emailApi = {
   syncEmails: async () => {
     const response = await api.post('/sync');
     return response.data;
+  },
+
+  // Subscribe to server-sent email events; returns a function that closes the stream
+  subscribeEvents: (onEvent) => {
+    const source = new EventSource(`${API_BASE_URL}/events`);
+    const types = ['hello', 'email_created', 'email_updated', 'status_changed',
+                   'classification_updated', 'draft_ready', 'email_deleted', 'resync'];
+    types.forEach((type) => {
+      source.addEventListener(type, (message) => onEvent(JSON.parse(message.data)));
+    });
+    return () => source.close();
   }
 };
 
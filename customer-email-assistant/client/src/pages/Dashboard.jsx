@@ -4,6 +4,13 @@ import EmailCard from '../components/EmailCard';
 import StatsCard from '../components/StatsCard';
 import { emailApi } from '../api/emailApi';
 
+const EMAIL_LIST_LIMIT = 50;
+const STATS_REFRESH_DELAY_MS = 1000;
+// 서버가 실시간 이벤트를 보낼 수 없을 때(live: false)만 사용하는 새로고침 주기
+const FALLBACK_POLL_MS = 30000;
+
+const byReceivedAtDesc = (a, b) => new Date(b.received_at) - new Date(a.received_at);
+
 const Dashboard = () => {
   const [emails, setEmails] = useState([]);
   const [stats, setStats] = useState({});
@@ -13,12 +20,78 @@ const Dashboard = () => {
 
   useEffect(() => {
     loadData();
+
+    let connected = false;
+    let pollTimer = null;
+    let statsTimer = null;
+
+    // 이벤트가 몰려 와도 통계는 한 번만 다시 읽음
+    const refreshStats = () => {
+      clearTimeout(statsTimer);
+      statsTimer = setTimeout(async () => {
+        try {
+          setStats(await emailApi.getStats());
+        } catch (error) {
+          console.error('Failed to refresh stats:', error);
+        }
+      }, STATS_REFRESH_DELAY_MS);
+    };
+
+    const patchEmail = (id, fields) => {
+      setEmails(prev => prev.map(email => (email.id === id ? { ...email, ...fields } : email)));
+    };
+
+    const closeEvents = emailApi.subscribeEvents((event) => {
+      switch (event.type) {
+        case 'hello':
+          clearInterval(pollTimer);
+          pollTimer = event.live ? null : setInterval(loadData, FALLBACK_POLL_MS);
+          // 재연결이면 끊겨 있던 동안의 변경을 한 번에 반영
+          if (connected) loadData();
+          connected = true;
+          break;
+        case 'resync':
+          loadData();
+          break;
+        case 'email_created':
+          setEmails(prev => (
+            prev.some(email => email.id === event.email.id)
+              ? prev
+              : [event.email, ...prev].sort(byReceivedAtDesc).slice(0, EMAIL_LIST_LIMIT)
+          ));
+          refreshStats();
+          break;
+        case 'email_updated':
+          patchEmail(event.email.id, event.email);
+          refreshStats();
+          break;
+        case 'status_changed':
+        case 'classification_updated': {
+          const { type, id, ...fields } = event;
+          patchEmail(id, fields);
+          refreshStats();
+          break;
+        }
+        case 'email_deleted':
+          setEmails(prev => prev.filter(email => email.id !== event.id));
+          refreshStats();
+          break;
+        default:
+          break;
+      }
+    });
+
+    return () => {
+      closeEvents();
+      clearInterval(pollTimer);
+      clearTimeout(statsTimer);
+    };
   }, []);
 
   const loadData = async () => {
     try {
       const [emailsData, statsData] = await Promise.all([
-        emailApi.fetchEmails(),
+        emailApi.fetchEmails(EMAIL_LIST_LIMIT),
         emailApi.getStats()
       ]);
       setEmails(emailsData);
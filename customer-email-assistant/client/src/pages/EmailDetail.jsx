@@ -12,11 +12,25 @@ const EmailDetail = () => {
   const [loading, setLoading] = useState(true);
   const [showReplyEditor, setShowReplyEditor] = useState(false);
   const [classifying, setClassifying] = useState(false);
+  const [thread, setThread] = useState([]);
 
   useEffect(() => {
     loadEmail();
   }, [id]);
 
+  // 다른 탭/담당자/서버 작업이 이 이메일을 바꾸면 바로 반영
+  useEffect(() => {
+    return emailApi.subscribeEvents((event) => {
+      if (event.id !== id) return;
+      if (event.type === 'status_changed' || event.type === 'classification_updated') {
+        const { type, id: eventId, ...fields } = event;
+        setEmail(prev => (prev ? { ...prev, ...fields } : prev));
+      } else if (event.type === 'email_deleted') {
+        navigate('/');
+      }
+    });
+  }, [id]);
+
   const loadEmail = async () => {
     try {
       const emailData = await emailApi.getEmail(id);
@@ -32,11 +46,12 @@ const EmailDetail = () => {
       console.log('📄 텍스트 내용 미리보기:', emailData.text_content?.substring(0, 200));
       
       setEmail(emailData);
+      loadThread();
       
-      // Mark as read if unread
+      // Mark as in progress if unread
       if (emailData.status === 'unread') {
-        await emailApi.updateEmailStatus(id, 'read');
-        setEmail(prev => ({ ...prev, status: 'read' }));
+        const result = await emailApi.updateEmailStatus(id, 'in_progress', emailData.version);
+        setEmail(prev => ({ ...prev, status: result.status, version: result.version }));
       }
     } catch (error) {
       console.error('Failed to load email:', error);
@@ -44,6 +59,16 @@ const EmailDetail = () => {
     setLoading(false);
   };
 
+  // 같은 대화의 다른 메시지 (실패해도 본문 표시는 계속)
+  const loadThread = async () => {
+    try {
+      const data = await emailApi.getEmailThread(id);
+      setThread(data.emails.filter(item => item.id !== id));
+    } catch (error) {
+      console.error('Failed to load thread:', error);
+    }
+  };
+
   const handleClassify = async () => {
     setClassifying(true);
     try {
@@ -147,6 +172,31 @@ const EmailDetail = () => {
         </div>
       </div>
 
+      {/* Other messages in this conversation */}
+      {thread.length > 0 && (
+        <div className="bg-white rounded-lg shadow-sm border border-gray-200 p-4 space-y-3">
+          <h2 className="text-sm font-medium text-gray-700">
+            Conversation ({thread.length + 1} messages)
+          </h2>
+          {thread.map(item => (
+            <div
+              key={item.id}
+              onClick={() => navigate(`/email/${item.id}`)}
+              className="text-sm border-l-2 border-gray-200 pl-3 cursor-pointer hover:border-blue-400"
+            >
+              <div className="flex justify-between text-gray-500">
+                <span>{item.sender_name || item.sender_email}</span>
+                <span>{formatDistanceToNow(new Date(item.received_at), { addSuffix: true })}</span>
+              </div>
+              <p className="text-gray-800 line-clamp-2">{item.body}</p>
+              {item.sent_reply && (
+                <p className="text-green-700 line-clamp-2 mt-1">↳ {item.sent_reply}</p>
+              )}
+            </div>
+          ))}
+        </div>
+      )}
+
       {/* Email Content */}
       <div className="bg-white rounded-lg shadow-sm border border-gray-200 p-6">
         {/* Email Header */}
@@ -205,6 +255,11 @@ const EmailDetail = () => {
         </div>
 
         {/* Email Body */}
+        {email.body_fetched === false && (
+          <p className="text-sm text-amber-700 bg-amber-50 p-3 rounded-lg mb-4">
+            헤더 필터로 본문 없이 저장된 메일입니다. Gmail에서 본문을 가져오지 못했습니다 — 새로고침하면 다시 시도합니다.
+          </p>
+        )}
         <div className="prose max-w-none">
           <div className="text-gray-900 whitespace-pre-wrap bg-gray-50 p-4 rounded-lg">
             {email.text_content || email.body || 'No content available'}
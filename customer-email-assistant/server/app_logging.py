@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# 요청 단위 상관관계 ID (미들웨어에서 설정)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+_listener: Optional[QueueListener] = None
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request ID to every record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with structured fields passed via extra={'fields': {...}}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+def setup_logging() -> None:
+    """Route all logging through a queue so stream I/O happens off the event loop"""
+    global _listener
+    if _listener:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv("LOG_FORMAT", "json") == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"
+        ))
+
+    # 필터는 호출한 쪽 컨텍스트에서 실행되어야 request_id를 읽을 수 있음
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener = QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the background listener"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+def _truncate(value, max_chars: int) -> str:
+    text = value if isinstance(value, str) else str(value)
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
+
+def log_payload(logger: logging.Logger, message: str, **payload) -> None:
+    """Log verbose payloads (prompts, replies, guest text) at DEBUG for a sample of calls only"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    if random.random() >= float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", 0)):
+        return
+
+    max_chars = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", 200))
+    fields = {key: _truncate(value, max_chars) for key, value in payload.items()}
+    logger.debug(message, extra={'fields': fields})
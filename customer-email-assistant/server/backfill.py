@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Import past mail into MongoDB, parsing MIME across all CPU cores.
+Progress is checkpointed in MongoDB, so an interrupted run resumes where it stopped.
+
+    python backfill.py --days 365 --workers 8
+    python backfill.py --days 365 --use-ai
+    python backfill.py --restart
+"""
+
+import os
+import time
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from classifier import EmailClassifier
+from db import Database
+from mime_parser import MimeParseStage, parse_raw_batch
+from simple_email_reader import SimpleEmailReader
+from text_cleaner import get_llm_text
+from llm_scheduler import llm_lane, BACKFILL
+from email_threads import ThreadIndex
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHECKPOINT = "email_backfill"
+
+class BackfillJob:
+    """Walks the inbox in UID windows: fetch, parse, classify and bulk-insert, with checkpoints"""
+
+    def __init__(self, db, reader, classifier, parse_stage=None):
+        self.db = db
+        self.reader = reader
+        self.classifier = classifier
+        self.parse_stage = parse_stage
+        self.threads = ThreadIndex(db)
+
+        self.window_size = int(os.getenv("BACKFILL_WINDOW_SIZE", 500))
+        self.llm_concurrency = int(os.getenv("BACKFILL_LLM_CONCURRENCY", 4))
+        self.target_rate = float(os.getenv("BACKFILL_TARGET_MSGS_PER_SEC", 50))
+
+        self._task: Optional[asyncio.Task] = None
+        self.status = {
+            'running': False,
+            'use_ai': False,
+            'since': None,
+            'last_uid': 0,
+            'uidnext': None,
+            'total': None,
+            'fetched': 0,
+            'stored': 0,
+            'msgs_per_sec': 0.0,
+            'target_msgs_per_sec': self.target_rate,
+            'started_at': None,
+            'finished_at': None,
+            'error': None
+        }
+
+    def get_status(self) -> Dict:
+        """Get progress of the current or last backfill"""
+        return dict(self.status)
+
+    def start(self, days: int = 365, use_ai: bool = False, restart: bool = False) -> bool:
+        """Run the backfill in the background; False if one is already running"""
+        if self._task and not self._task.done():
+            return False
+        self._task = asyncio.create_task(self.run(days, use_ai, restart))
+        return True
+
+    async def stop(self) -> None:
+        """Cancel a running backfill (its checkpoint is kept)"""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def run(self, days: int = 365, use_ai: bool = False, restart: bool = False) -> Dict:
+        """Backfill mail received in the last N days, resuming from the saved checkpoint"""
+        self.status.update({
+            'running': True,
+            'use_ai': use_ai,
+            'fetched': 0,
+            'stored': 0,
+            'msgs_per_sec': 0.0,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'error': None
+        })
+
+        try:
+            if restart:
+                await self.db.delete_checkpoint(BACKFILL_CHECKPOINT)
+
+            uidvalidity, uidnext = await asyncio.to_thread(self.reader.get_uid_range)
+            checkpoint = await self.db.get_checkpoint(BACKFILL_CHECKPOINT)
+
+            # UIDVALIDITY가 바뀌면 UID가 다시 매겨진 것이므로 처음부터 (중복은 gmail_id로 걸러짐)
+            if checkpoint and checkpoint.get('uidvalidity') == uidvalidity:
+                since = checkpoint['since']
+                last_uid = checkpoint['last_uid']
+                logger.info(f"Backfill: resuming after UID {last_uid}")
+            else:
+                since = datetime.utcnow() - timedelta(days=days)
+                last_uid = 0
+
+            self.status.update({'since': since.isoformat(), 'last_uid': last_uid, 'uidnext': uidnext})
+            await self._walk_windows(uidvalidity, uidnext, since, last_uid, use_ai)
+
+            logger.info(f"Backfill completed. {self.status['stored']} emails stored "
+                        f"({self.status['msgs_per_sec']} msgs/sec).")
+
+        except asyncio.CancelledError:
+            logger.info(f"Backfill stopped after UID {self.status['last_uid']}")
+            raise
+        except Exception as e:
+            logger.error(f"Backfill failed: {e}")
+            self.status['error'] = str(e)
+        finally:
+            self.status['running'] = False
+            self.status['finished_at'] = datetime.utcnow().isoformat()
+
+        return self.get_status()
+
+    async def _walk_windows(self, uidvalidity: int, uidnext: int, since: datetime,
+                            last_uid: int, use_ai: bool) -> None:
+        start = time.perf_counter()
+        # SINCE 검색 한 번으로 대상 UID를 모두 받은 뒤 실제 UID로 윈도를 나눔 (빈 UID 범위를 훑지 않음)
+        uids = await asyncio.to_thread(self.reader.search_uids_since, since, last_uid, uidnext)
+        self.status['total'] = len(uids)
+        windows = [uids[i:i + self.window_size] for i in range(0, len(uids), self.window_size)]
+
+        # 다음 윈도의 IMAP fetch를 현재 윈도 파싱/저장과 겹쳐서 실행
+        next_fetch = self._fetch_window(windows[0]) if windows else None
+        for index, window in enumerate(windows):
+            raw_messages = await next_fetch
+            if index + 1 < len(windows):
+                next_fetch = self._fetch_window(windows[index + 1])
+            window_last_uid = window[-1]
+
+            emails = await self._parse(raw_messages)
+            await self._classify(emails, use_ai)
+            # UID(도착) 순서로 하나씩 연결해야 같은 윈도 안의 답장도 앞 메일의 스레드를 찾음
+            for email_data in emails:
+                await self.threads.assign(email_data)
+            stored = await self.db.store_emails(emails)
+
+            self.status['fetched'] += len(raw_messages)
+            self.status['stored'] += stored
+            self.status['last_uid'] = window_last_uid
+            self.status['msgs_per_sec'] = round(self.status['fetched'] / max(time.perf_counter() - start, 1e-6), 1)
+
+            await self.db.save_checkpoint(BACKFILL_CHECKPOINT, {
+                'uidvalidity': uidvalidity,
+                'since': since,
+                'last_uid': window_last_uid,
+            })
+
+            rate = self.status['msgs_per_sec']
+            logger.info(f"Backfill: {self.status['fetched']}/{len(uids)} messages (UID {window_last_uid}), "
+                        f"{self.status['stored']} stored ({rate} msgs/sec)")
+            if self.status['fetched'] >= self.window_size and rate < self.target_rate:
+                logger.warning(f"Backfill throughput {rate} msgs/sec is below target {self.target_rate}")
+
+    def _fetch_window(self, uids: List[int]) -> asyncio.Task:
+        return asyncio.create_task(asyncio.to_thread(
+            self.reader.fetch_raw_by_uid, [str(uid).encode() for uid in uids]
+        ))
+
+    async def _parse(self, raw_messages) -> List[Dict]:
+        if self.parse_stage:
+            return await self.parse_stage.parse(raw_messages)
+
+        # 프로세스 풀 없이 (API 서버 안에서) 실행할 때는 스레드에서 파싱
+        return await asyncio.to_thread(parse_raw_batch, raw_messages)
+
+    async def _classify(self, emails: List[Dict], use_ai: bool) -> None:
+        semaphore = asyncio.Semaphore(self.llm_concurrency)
+
+        async def classify_one(email_data: Dict) -> None:
+            if use_ai:
+                async with semaphore:
+                    classification = await self.classifier.classify(get_llm_text(email_data), email_data['subject'])
+            else:
+                classification = self.classifier.quick_classify(get_llm_text(email_data), email_data['subject'])
+
+            email_data.update({
+                'priority': classification['priority'],
+                'tags': classification['tags'],
+                'classification_source': classification.get('source'),
+                'status': 'unread'
+            })
+
+        # 가장 낮은 우선순위 레인 (gather가 만드는 태스크가 현재 레인을 복사함)
+        with llm_lane(BACKFILL):
+            await asyncio.gather(*(classify_one(email_data) for email_data in emails))
+
+async def run_cli(days: int, use_ai: bool, restart: bool, workers: int, chunk_size: int) -> Dict:
+    db = Database()
+    reader = SimpleEmailReader()
+    stage = MimeParseStage(workers=workers or None, chunk_size=chunk_size or None)
+    job = BackfillJob(db, reader, EmailClassifier(), parse_stage=stage)
+
+    await db.connect()
+    try:
+        logger.info(f"Backfill: {stage.workers} parse workers, AI classification {'on' if use_ai else 'off'}")
+        return await job.run(days, use_ai, restart)
+    finally:
+        stage.close()
+        reader.close()
+        await db.disconnect()
+
+def main():
+    from dotenv import load_dotenv
+    from app_logging import setup_logging, shutdown_logging
+
+    parser = argparse.ArgumentParser(description="Import past Gmail messages into MongoDB")
+    parser.add_argument("--days", type=int, default=365, help="How many days of mail to import")
+    parser.add_argument("--use-ai", action="store_true", help="Classify with the LLM instead of keywords")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint and start over")
+    parser.add_argument("--workers", type=int, default=0, help="Parse processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=0, help="Messages per process pool task")
+    args = parser.parse_args()
+
+    load_dotenv()
+    setup_logging()
+    try:
+        asyncio.run(run_cli(args.days, args.use_ai, args.restart, args.workers, args.chunk_size))
+    finally:
+        shutdown_logging()
+
+if __name__ == "__main__":
+    main()
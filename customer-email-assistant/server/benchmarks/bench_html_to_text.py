@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Micro-benchmark for text_cleaner.html_to_text on a corpus of newsletters
+
+    python benchmarks/bench_html_to_text.py ~/newsletters --repeat 20
+
+The corpus is a directory of saved messages: .html files are used as-is, and for .eml files
+the first text/html part is extracted. Without a corpus, a synthetic marketing newsletter is used.
+"""
+
+import os
+import sys
+import time
+import email
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mime_parser import decode_payload
+from text_cleaner import html_to_text
+
+def _html_from_eml(path: str) -> str:
+    with open(path, 'rb') as f:
+        msg = email.message_from_bytes(f.read())
+    for part in msg.walk():
+        if part.get_content_type() == 'text/html':
+            payload = part.get_payload(decode=True)
+            if payload:
+                return decode_payload(payload, part.get_content_charset())
+    return ''
+
+def load_corpus(directory: str):
+    documents = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith(('.html', '.htm')):
+            with open(path, 'rb') as f:
+                documents.append((name, decode_payload(f.read())))
+        elif name.endswith('.eml'):
+            html = _html_from_eml(path)
+            if html:
+                documents.append((name, html))
+    return documents
+
+def synthetic_newsletter() -> str:
+    # 마케팅 메일에서 흔한 구조: 큰 head/style, 중첩 테이블, 인라인 스타일, 반복 블록
+    style = '\n'.join(f'.c{i} {{ color: #{i:06x}; padding: {i % 20}px; }}' for i in range(400))
+    block = ('<table role="presentation" width="100%"><tr><td style="padding:10px;font-family:Arial">'
+             '<h2>이번 주 특가 &amp; 소식</h2><p>RPA펜션 <b>가을 시즌</b> 예약이 열렸습니다.'
+             ' <a href="https://example.com/?utm_source=newsletter">자세히 보기</a></p>'
+             '<img src="https://example.com/banner.png" alt=""></td></tr></table>')
+    return f'<html><head><style>{style}</style><body>{block * 200}</body></html>'
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark html_to_text on newsletters")
+    parser.add_argument("corpus", nargs="?", help="Directory of .html/.eml newsletters")
+    parser.add_argument("--repeat", type=int, default=10, help="Conversions per document")
+    parser.add_argument("--max-chars", type=int, default=None, help="Character budget (default: HTML_TEXT_MAX_CHARS)")
+    args = parser.parse_args()
+
+    documents = load_corpus(args.corpus) if args.corpus else [('synthetic', synthetic_newsletter())]
+    if not documents:
+        sys.exit(f"No .html/.eml files in {args.corpus}")
+
+    timings = []
+    total_bytes = 0
+    for name, html in documents:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            text = html_to_text(html, args.max_chars)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        timings.append(elapsed)
+        total_bytes += len(html)
+        print(f"{name[:40]:40} {len(html) / 1024:8.1f} KB -> {len(text):6} chars  {elapsed * 1000:7.2f} ms")
+
+    print(f"\n{len(documents)} documents, median {statistics.median(timings) * 1000:.2f} ms, "
+          f"max {max(timings) * 1000:.2f} ms, {total_bytes / sum(timings) / 1024 / 1024:.1f} MB/s")
+
+if __name__ == "__main__":
+    main()
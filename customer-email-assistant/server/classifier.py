@@ -1,15 +1,102 @@
 import os
-import google.generativeai as genai
+import time
+import asyncio
+import logging
 from typing import Dict, List
-import json
-import re
+
+from metrics import registry, llm_request_latency, llm_tokens
+from model_registry import get_gemini_model
+from structured_output import compile_validator, generate_json
+from local_classifier import LocalClassifier, build_text, train_and_evaluate
+from text_cleaner import CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = ['urgent', 'support', 'general', 'sales', 'spam']
+
+# Gemini response_schema로 보내고 같은 정의로 응답을 검증
+CLASSIFICATION_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'priority': {'type': 'STRING', 'enum': PRIORITIES},
+        'tags': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'confidence': {'type': 'NUMBER'},
+        'reasoning': {'type': 'STRING'}
+    },
+    'required': ['priority', 'tags', 'confidence']
+}
+_classification_validator = compile_validator(CLASSIFICATION_SCHEMA)
+
+classifier_cascade_decisions = registry.counter(
+    "classifier_cascade_decisions_total", "Emails answered by each classification stage", ("stage",)
+)
+local_classifier_latency = registry.histogram(
+    "local_classifier_duration_seconds", "Local model prediction latency",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
 
 class EmailClassifier:
     def __init__(self):
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        self.model = genai.GenerativeModel(os.getenv("CLASSIFICATION_MODEL", "gemini-pro"))
+        self.model_name = os.getenv("CLASSIFICATION_MODEL", "gemini-pro")
         
+        # 로컬 모델이 이 신뢰도 이상이면 LLM을 호출하지 않음
+        self.local_model_path = os.getenv("LOCAL_CLASSIFIER_PATH", "models/local_classifier.json.gz")
+        self.local_threshold = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", 0.85))
+        self.local_min_samples = int(os.getenv("LOCAL_CLASSIFIER_MIN_SAMPLES", 200))
+        self.llm_cost_per_1k_tokens = float(os.getenv("LLM_COST_PER_1K_TOKENS", 0.0005))
+        # 모델 파일은 첫 분류 때 읽고, 다른 워커가 재학습해 파일이 바뀌면 다시 읽음
+        self._local_model = None
+        self._local_model_mtime = None
+        self.last_report = None
+    
+    @property
+    def model(self):
+        """Shared Gemini model, created on first use"""
+        return get_gemini_model(self.model_name)
+    
+    @property
+    def local_model(self):
+        """Local model from LOCAL_CLASSIFIER_PATH, loaded on first use and reloaded when the file changes"""
+        try:
+            mtime = os.stat(self.local_model_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != self._local_model_mtime:
+            self._local_model = LocalClassifier.load(self.local_model_path) if mtime else None
+            self._local_model_mtime = mtime
+        return self._local_model
+    
+    def classify_local(self, email_content: str, subject: str = "") -> Dict:
+        """Local model prediction, or None if no model has been trained"""
+        local_model = self.local_model
+        if not local_model:
+            return None
+        
+        start = time.perf_counter()
+        try:
+            result = local_model.predict(email_content, subject)
+        except Exception as e:
+            logger.error(f"Error in local classification: {e}")
+            return None
+        local_classifier_latency.observe(time.perf_counter() - start)
+        result['source'] = 'local'
+        return result
+    
     async def classify(self, email_content: str, subject: str = "") -> Dict:
+        """Classify with the local model first, and escalate low-confidence emails to the LLM"""
+        local = self.classify_local(email_content, subject)
+        if local and local['confidence'] >= self.local_threshold:
+            classifier_cascade_decisions.inc(stage="local")
+            return local
+        
+        classifier_cascade_decisions.inc(stage="llm")
+        result = await self.classify_llm(email_content, subject)
+        # LLM이 실패하면 기본값 대신 로컬 예측 사용
+        if result['source'] == 'default' and local:
+            return local
+        return result
+    
+    async def classify_llm(self, email_content: str, subject: str = "") -> Dict:
         """Classify email priority and extract tags"""
         try:
             # Build classification prompt
@@ -17,14 +104,80 @@ class EmailClassifier:
             user_prompt = self._build_classification_prompt(email_content, subject)
             full_prompt = f"{system_prompt}\n\n{user_prompt}"
             
-            response = self.model.generate_content(full_prompt)
-            result = response.text.strip()
-            return self._parse_classification_result(result)
+            data, invalid = await generate_json(
+                self.model, self.model_name, "classify", full_prompt,
+                CLASSIFICATION_SCHEMA, _classification_validator
+            )
+            if data is None or ('priority',) in invalid:
+                logger.warning("Classification output was not usable, using default")
+                return self._get_default_classification()
+            
+            classification = self._validate_classification(data)
+            classification['source'] = 'llm'
+            return classification
             
         except Exception as e:
-            print(f"Error classifying email: {e}")
+            logger.error(f"Error classifying email: {e}")
             return self._get_default_classification()
     
+    async def retrain(self, db, llm_sample: int = 0) -> Dict:
+        """Retrain the local model from labeled emails and report how it compares with the LLM"""
+        samples = [
+            {
+                'text': build_text(doc.get('subject', ''), doc.get('latest_message_text') or doc.get('body', '')),
+                'priority': doc['priority'],
+                'tags': doc.get('tags') or []
+            }
+            for doc in await db.get_training_emails()
+        ]
+        if len(samples) < self.local_min_samples:
+            raise ValueError(f"Need at least {self.local_min_samples} labeled emails to train, found {len(samples)}")
+        
+        model, report, holdout = await asyncio.to_thread(train_and_evaluate, samples, self.local_threshold)
+        report['llm_only'] = await self._evaluate_llm(holdout, llm_sample)
+        report['cascade']['cost_per_1k'] = round(
+            report['llm_only']['cost_per_1k'] * report['cascade']['llm_calls_per_1k'] / 1000, 4
+        )
+        
+        await asyncio.to_thread(model.save, self.local_model_path)
+        self._local_model = model
+        self._local_model_mtime = os.stat(self.local_model_path).st_mtime_ns
+        self.last_report = {**report, 'trained_at': model.trained_at, 'samples': model.sample_count}
+        logger.info(f"Local classifier retrained on {model.sample_count} emails "
+                    f"(accuracy {report['local']['accuracy']}, coverage {report['cascade']['local_coverage']})")
+        return self.last_report
+    
+    async def _evaluate_llm(self, holdout: List[Dict], llm_sample: int) -> Dict:
+        """LLM-only accuracy on a sample of held-out emails, with latency and cost from live metrics"""
+        evaluated = holdout[:llm_sample]
+        correct = 0
+        for sample in evaluated:
+            result = await self.classify_llm(sample['text'])
+            correct += result['priority'] == sample['priority']
+        
+        calls, total_seconds = llm_request_latency.summary(provider="gemini", operation="classify")
+        tokens = sum(
+            llm_tokens.value(provider="gemini", operation="classify", kind=kind) for kind in ("prompt", "completion")
+        )
+        if calls and tokens:
+            tokens_per_call = tokens / calls
+            tokens_source = 'measured'
+        else:
+            # 아직 호출 기록이 없으면 프롬프트 길이로 추정 (응답은 약 100 토큰)
+            prompt_chars = len(self._get_classification_system_prompt()) + len(self._build_classification_prompt('', ''))
+            average_chars = sum(len(sample['text']) for sample in holdout) / len(holdout) if holdout else 0
+            tokens_per_call = (prompt_chars + average_chars) / CHARS_PER_TOKEN + 100
+            tokens_source = 'estimated'
+        
+        return {
+            'accuracy': round(correct / len(evaluated), 4) if evaluated else None,
+            'evaluated_samples': len(evaluated),
+            'latency_ms': round(total_seconds / calls * 1000, 1) if calls else None,
+            'tokens_per_call': round(tokens_per_call, 1),
+            'tokens_source': tokens_source,
+            'cost_per_1k': round(tokens_per_call * self.llm_cost_per_1k_tokens, 4)
+        }
+    
     def _build_classification_prompt(self, email_content: str, subject: str) -> str:
         """Build the classification prompt"""
         return f"""
@@ -64,41 +217,23 @@ Tags should be specific and relevant (e.g., billing, technical, complaint, refun
 
 Always respond with valid JSON format."""
     
-    def _parse_classification_result(self, result: str) -> Dict:
-        """Parse the classification result from AI response"""
-        try:
-            # Try to extract JSON from the response
-            json_match = re.search(r'\{.*\}', result, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                classification = json.loads(json_str)
-                
-                # Validate the classification
-                return self._validate_classification(classification)
-            else:
-                # Fallback parsing
-                return self._fallback_parse(result)
-                
-        except json.JSONDecodeError:
-            print(f"Failed to parse classification result: {result}")
-            return self._get_default_classification()
-    
     def _validate_classification(self, classification: Dict) -> Dict:
         """Validate and clean classification result"""
-        valid_priorities = ['urgent', 'support', 'general', 'sales', 'spam']
-        
         # Ensure priority is valid
-        priority = classification.get('priority', 'general').lower()
-        if priority not in valid_priorities:
+        priority = str(classification.get('priority') or 'general').lower()
+        if priority not in PRIORITIES:
             priority = 'general'
         
-        # Ensure tags is a list
-        tags = classification.get('tags', [])
+        # Ensure tags is a list of strings
+        tags = classification.get('tags') or []
         if not isinstance(tags, list):
             tags = []
+        tags = [tag for tag in tags if isinstance(tag, str)]
         
         # Ensure confidence is a float between 0 and 1
-        confidence = classification.get('confidence', 0.5)
+        confidence = classification.get('confidence')
+        if confidence is None:
+            confidence = 0.5
         try:
             confidence = float(confidence)
             confidence = max(0.0, min(1.0, confidence))
@@ -112,50 +247,14 @@ Always respond with valid JSON format."""
             'reasoning': classification.get('reasoning', '')
         }
     
-    def _fallback_parse(self, result: str) -> Dict:
-        """Fallback parsing when JSON parsing fails"""
-        result_lower = result.lower()
-        
-        # Determine priority based on keywords
-        if any(word in result_lower for word in ['urgent', 'emergency', 'critical', 'asap']):
-            priority = 'urgent'
-        elif any(word in result_lower for word in ['support', 'technical', 'help', 'issue']):
-            priority = 'support'
-        elif any(word in result_lower for word in ['sales', 'buy', 'purchase', 'price']):
-            priority = 'sales'
-        elif any(word in result_lower for word in ['spam', 'promotional', 'marketing']):
-            priority = 'spam'
-        else:
-            priority = 'general'
-        
-        # Extract basic tags
-        tags = []
-        tag_keywords = {
-            'billing': ['bill', 'payment', 'invoice', 'charge'],
-            'technical': ['technical', 'bug', 'error', 'not working'],
-            'complaint': ['complaint', 'unhappy', 'disappointed', 'angry'],
-            'refund': ['refund', 'money back', 'return'],
-            'account': ['account', 'login', 'password', 'access']
-        }
-        
-        for tag, keywords in tag_keywords.items():
-            if any(keyword in result_lower for keyword in keywords):
-                tags.append(tag)
-        
-        return {
-            'priority': priority,
-            'tags': tags,
-            'confidence': 0.6,
-            'reasoning': 'Fallback classification based on keywords'
-        }
-    
     def _get_default_classification(self) -> Dict:
         """Get default classification when all else fails"""
         return {
             'priority': 'general',
             'tags': [],
             'confidence': 0.3,
-            'reasoning': 'Default classification due to processing error'
+            'reasoning': 'Default classification due to processing error',
+            'source': 'default'
         }
     
     async def batch_classify(self, emails: List[Dict]) -> List[Dict]:
@@ -266,9 +365,10 @@ Always respond with valid JSON format."""
                 'priority': priority,
                 'tags': tags[:3],  # Limit to 3 tags
                 'confidence': 0.8,  # High confidence for keyword matching
-                'reasoning': 'Quick keyword-based classification'
+                'reasoning': 'Quick keyword-based classification',
+                'source': 'keyword'
             }
             
         except Exception as e:
-            print(f"Error in quick classification: {e}")
+            logger.error(f"Error in quick classification: {e}")
             return self._get_default_classification()
\ No newline at end of file
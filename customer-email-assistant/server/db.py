@@ -1,33 +1,213 @@
 import os
-import motor.motor_asyncio
+import time
+import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
-from bson import ObjectId
+from typing import TYPE_CHECKING, AsyncIterator, List, Dict, Optional
 import json
 
+# pymongo/bson도 motor와 함께 실제로 쓰는 시점에 import (서버 import 시간 단축)
+if TYPE_CHECKING:
+    from bson import ObjectId
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+mongo_command_latency = registry.histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", ("command", "collection")
+)
+mongo_command_failures = registry.counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", ("command", "collection")
+)
+mongo_pool_checked_out = registry.gauge(
+    "mongo_pool_checked_out_connections", "Connections currently checked out of the pool"
+)
+mongo_pool_checkout_failures = registry.counter(
+    "mongo_pool_checkout_failures_total", "Failed connection checkouts", ("reason",)
+)
+
+# 컬렉션별 인덱스 정의 (이미 있는 인덱스는 시작 시 건너뜀)
+INDEX_SPECS = {
+    'emails_collection': [
+        # Index on gmail_id for uniqueness
+        ([("gmail_id", 1)], {'unique': True}),
+        # Index on received_at for sorting
+        ([("received_at", 1)], {}),
+        # Date range filters (export, retention) on the normalized UTC time
+        ([("received_utc", 1)], {}),
+        # Index on status for filtering
+        ([("status", 1)], {}),
+        # Index on priority for filtering
+        ([("priority", 1)], {}),
+        # Compound index for common queries
+        ([("status", 1), ("received_at", -1)], {}),
+        # Thread view / reply context
+        ([("thread_id", 1), ("received_at", -1)], {})
+    ],
+    'cold_emails_collection': [
+        # Cold storage lookups by Gmail ID
+        ([("gmail_id", 1)], {})
+    ],
+    'threads_collection': [
+        # Recent conversations first
+        ([("last_activity_at", -1)], {}),
+        # References/In-Reply-To lookups (multikey)
+        ([("message_ids", 1)], {}),
+        # Subject/sender fallback
+        ([("subject_key", 1), ("last_activity_at", -1)], {})
+    ],
+    'locks_collection': [
+        # Remove expired leases
+        ([("expires_at", 1)], {'expireAfterSeconds': 0})
+    ]
+}
+
+# 이메일 상태 전이 규칙 (현재 상태 -> 허용되는 다음 상태)
+EMAIL_STATUS_TRANSITIONS = {
+    'unread': ['in_progress', 'replied', 'archived'],
+    'in_progress': ['unread', 'replied', 'archived'],
+    'read': ['in_progress', 'replied', 'archived'],  # 이전 클라이언트가 저장한 상태
+    'replied': ['archived'],
+    'archived': ['unread']
+}
+# 답장 전송을 시작할 수 있는 상태
+REPLYABLE_STATUSES = ['unread', 'read', 'in_progress']
+
+# 로컬 분류기 학습에 쓰는 라벨 출처
+TRAINING_LABEL_SOURCES = ['llm', 'manual']
+
+# 상태 전이 없이 수정할 수 있는 필드 (classification_source는 서버에서만 설정)
+EMAIL_EDITABLE_FIELDS = ['priority', 'tags', 'classification_source']
+
+class EmailConflictError(Exception):
+    """Raised when an email update precondition (status or version) does not hold"""
+    pass
+
+def _object_id(value) -> "ObjectId":
+    from bson import ObjectId
+    return ObjectId(value)
+
+def _listener(monitor_class, listener_base):
+    """Combine a monitor with its pymongo listener base class, which is imported only when connecting"""
+    return type(monitor_class.__name__, (monitor_class, listener_base), {})
+
+class MongoCommandMonitor:
+    """Records per-command latency and logs slow queries (a pymongo CommandListener)"""
+    
+    def __init__(self, slow_query_ms: int = 100):
+        self.slow_query_ms = slow_query_ms
+        self._collections = {}
+    
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._collections[event.request_id] = collection if isinstance(collection, str) else ""
+    
+    def succeeded(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        duration = event.duration_micros / 1_000_000
+        mongo_command_latency.observe(duration, command=event.command_name, collection=collection)
+        
+        if duration * 1000 >= self.slow_query_ms:
+            logger.warning(f"Slow MongoDB query: {event.command_name} on {collection} took {duration * 1000:.1f}ms")
+    
+    def failed(self, event):
+        collection = self._collections.pop(event.request_id, "")
+        mongo_command_failures.inc(command=event.command_name, collection=collection)
+        logger.error(f"MongoDB command failed: {event.command_name} on {collection}: {event.failure}")
+
+class MongoPoolMonitor:
+    """Tracks connection pool usage for deployment sizing (a pymongo ConnectionPoolListener)"""
+    
+    def connection_checked_out(self, event):
+        mongo_pool_checked_out.inc()
+    
+    def connection_checked_in(self, event):
+        mongo_pool_checked_out.dec()
+    
+    def connection_check_out_failed(self, event):
+        mongo_pool_checkout_failures.inc(reason=event.reason)
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_created(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        pass
+    
+    def connection_check_out_started(self, event):
+        pass
+
 class Database:
     def __init__(self):
         self.client = None
         self.db = None
         self.emails_collection = None
+        self.cold_emails_collection = None
+        self.pension_collection = None
+        self.response_settings_collection = None
+        self.locks_collection = None
+        self.checkpoints_collection = None
+        self.counters_collection = None
+        self.threads_collection = None
         
     async def connect(self):
         """Connect to MongoDB"""
         try:
+            # motor는 실제 연결 시점에 import (서버 import 시간 단축)
+            import motor.motor_asyncio
+            from pymongo import monitoring
+            
             mongodb_uri = os.getenv("MONGODB_URI", "mongodb://localhost:27017/email_assistant")
-            self.client = motor.motor_asyncio.AsyncIOMotorClient(mongodb_uri)
+            self.client = motor.motor_asyncio.AsyncIOMotorClient(
+                mongodb_uri,
+                maxPoolSize=int(os.getenv("MONGO_MAX_POOL_SIZE", 50)),
+                minPoolSize=int(os.getenv("MONGO_MIN_POOL_SIZE", 5)),
+                maxIdleTimeMS=int(os.getenv("MONGO_MAX_IDLE_TIME_MS", 300000)),
+                waitQueueTimeoutMS=int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", 5000)),
+                serverSelectionTimeoutMS=int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+                connectTimeoutMS=int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+                socketTimeoutMS=int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", 30000)),
+                event_listeners=[
+                    _listener(MongoCommandMonitor, monitoring.CommandListener)(
+                        int(os.getenv("MONGO_SLOW_QUERY_MS", 100))
+                    ),
+                    _listener(MongoPoolMonitor, monitoring.ConnectionPoolListener)()
+                ]
+            )
             
             # Use a simple database name
             self.db = self.client.emails
             self.emails_collection = self.db.emails
+            self.cold_emails_collection = self.db.emails_cold
+            self.pension_collection = self.db.pension_info
+            self.response_settings_collection = self.db.response_settings
+            self.locks_collection = self.db.locks
+            self.checkpoints_collection = self.db.checkpoints
+            self.counters_collection = self.db.counters
+            self.threads_collection = self.db.threads
             
             # Create indexes for better performance
             await self._create_indexes()
+            await self._backfill_received_utc()
             
-            print("Connected to MongoDB successfully")
+            logger.info("Connected to MongoDB successfully")
             
         except Exception as e:
-            print(f"Error connecting to MongoDB: {e}")
+            logger.error(f"Error connecting to MongoDB: {e}")
             raise
     
     async def disconnect(self):
@@ -35,29 +215,92 @@ class Database:
         if self.client:
             self.client.close()
     
+    async def ping(self) -> Dict:
+        """Check MongoDB connectivity and round-trip latency"""
+        start = time.perf_counter()
+        try:
+            await self.client.admin.command("ping")
+            return {'ok': True, 'latency_ms': round((time.perf_counter() - start) * 1000, 2)}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+    
+    async def acquire_lock(self, name: str, owner: str, ttl_seconds: int) -> bool:
+        """Acquire or renew a lease lock shared by all workers"""
+        from pymongo.errors import DuplicateKeyError
+        now = datetime.utcnow()
+        try:
+            # 만료됐거나 내가 가진 락만 갱신; 다른 워커가 보유 중이면 upsert가 _id 중복으로 실패
+            await self.locks_collection.update_one(
+                {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+                {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=ttl_seconds)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+    
+    async def release_lock(self, name: str, owner: str) -> None:
+        """Release a lease lock held by this owner"""
+        await self.locks_collection.delete_one({"_id": name, "owner": owner})
+    
+    async def get_checkpoint(self, name: str) -> Optional[Dict]:
+        """Get the saved progress of a resumable job"""
+        return await self.checkpoints_collection.find_one({"_id": name})
+    
+    async def save_checkpoint(self, name: str, data: Dict) -> None:
+        """Save the progress of a resumable job"""
+        await self.checkpoints_collection.update_one(
+            {"_id": name},
+            {"$set": {**data, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+    
+    async def delete_checkpoint(self, name: str) -> None:
+        """Forget the progress of a resumable job so it starts over"""
+        await self.checkpoints_collection.delete_one({"_id": name})
+    
+    async def get_revision(self, name: str) -> int:
+        """Change counter of a collection, bumped on every write that changes what clients see"""
+        counter = await self.counters_collection.find_one({"_id": name})
+        return counter['revision'] if counter else 0
+    
+    async def _bump_revision(self, name: str) -> None:
+        await self.counters_collection.update_one({"_id": name}, {"$inc": {"revision": 1}}, upsert=True)
+    
     async def _create_indexes(self):
-        """Create database indexes"""
+        """Create database indexes that do not exist yet"""
+        from pymongo import IndexModel
         try:
-            # Index on gmail_id for uniqueness
-            await self.emails_collection.create_index("gmail_id", unique=True)
-            
-            # Index on received_at for sorting
-            await self.emails_collection.create_index("received_at")
-            
-            # Index on status for filtering
-            await self.emails_collection.create_index("status")
-            
-            # Index on priority for filtering
-            await self.emails_collection.create_index("priority")
-            
-            # Compound index for common queries
-            await self.emails_collection.create_index([
-                ("status", 1),
-                ("received_at", -1)
-            ])
+            for collection_attr, specs in INDEX_SPECS.items():
+                collection = getattr(self, collection_attr)
+                existing = await collection.index_information()
+                
+                missing = []
+                for keys, options in specs:
+                    name = "_".join(f"{field}_{direction}" for field, direction in keys)
+                    if name not in existing:
+                        missing.append(IndexModel(keys, name=name, **options))
+                
+                if missing:
+                    await collection.create_indexes(missing)
             
         except Exception as e:
-            print(f"Error creating indexes: {e}")
+            logger.error(f"Error creating indexes: {e}")
+    
+    async def _backfill_received_utc(self):
+        """Set received_utc on emails stored before the field existed"""
+        try:
+            # $dateFromString은 문자열의 오프셋을 반영해 UTC로 변환 (파싱 실패 시 null)
+            result = await self.emails_collection.update_many(
+                {"received_utc": {"$exists": False}, "received_at": {"$type": "string"}},
+                [{"$set": {"received_utc": {
+                    "$dateFromString": {"dateString": "$received_at", "onError": None}
+                }}}]
+            )
+            if result.modified_count:
+                logger.info(f"Backfilled received_utc on {result.modified_count} emails")
+        except Exception as e:
+            logger.error(f"Error backfilling received_utc: {e}")
     
     async def store_email(self, email_data: Dict) -> str:
         """Store a new email in the database"""
@@ -65,18 +308,47 @@ class Database:
             # Add timestamp
             email_data['created_at'] = datetime.utcnow()
             email_data['updated_at'] = datetime.utcnow()
+            email_data.setdefault('version', 0)
             
             # Insert email
             result = await self.emails_collection.insert_one(email_data)
+            await self._bump_revision('emails')
             return str(result.inserted_id)
             
         except Exception as e:
-            print(f"Error storing email: {e}")
+            logger.error(f"Error storing email: {e}")
             raise
     
+    async def store_emails(self, emails: List[Dict]) -> int:
+        """Insert many new emails at once, skipping ones already stored (by gmail_id)"""
+        from pymongo.errors import BulkWriteError
+        if not emails:
+            return 0
+        
+        now = datetime.utcnow()
+        for email_data in emails:
+            email_data['created_at'] = now
+            email_data['updated_at'] = now
+            email_data.setdefault('version', 0)
+        
+        try:
+            result = await self.emails_collection.insert_many(emails, ordered=False)
+            inserted = len(result.inserted_ids)
+        except BulkWriteError as e:
+            # 중복(11000)만 무시하고 나머지 오류는 그대로 올림
+            errors = e.details.get('writeErrors', [])
+            if e.details.get('nInserted'):
+                await self._bump_revision('emails')
+            if any(error.get('code') != 11000 for error in errors):
+                raise
+            return e.details.get('nInserted', 0)
+        
+        await self._bump_revision('emails')
+        return inserted
+    
     async def get_emails(self, limit: int = 50, status: Optional[str] = None, 
-                        priority: Optional[str] = None) -> List[Dict]:
-        """Get emails from database with optional filtering"""
+                        priority: Optional[str] = None, fields: Optional[List[str]] = None) -> List[Dict]:
+        """Get emails from database with optional filtering (only `fields` if given)"""
         try:
             # Build query
             query = {}
@@ -86,7 +358,8 @@ class Database:
                 query['priority'] = priority
             
             # Execute query
-            cursor = self.emails_collection.find(query).sort("received_at", -1).limit(limit)
+            projection = {field: 1 for field in fields} if fields else None
+            cursor = self.emails_collection.find(query, projection).sort("received_at", -1).limit(limit)
             emails = await cursor.to_list(length=limit)
             
             # Convert ObjectId to string
@@ -97,13 +370,13 @@ class Database:
             return emails
             
         except Exception as e:
-            print(f"Error fetching emails: {e}")
+            logger.error(f"Error fetching emails: {e}")
             return []
     
     async def get_email(self, email_id: str) -> Optional[Dict]:
         """Get a specific email by ID"""
         try:
-            email = await self.emails_collection.find_one({"_id": ObjectId(email_id)})
+            email = await self.emails_collection.find_one({"_id": _object_id(email_id)})
             
             if email:
                 email['id'] = str(email['_id'])
@@ -113,7 +386,18 @@ class Database:
             return None
             
         except Exception as e:
-            print(f"Error fetching email {email_id}: {e}")
+            logger.error(f"Error fetching email {email_id}: {e}")
+            return None
+    
+    async def get_email_revision(self, email_id: str) -> Optional[Dict]:
+        """Only the fields that change whenever the email changes (for ETags)"""
+        try:
+            return await self.emails_collection.find_one(
+                {"_id": _object_id(email_id)},
+                {"_id": 0, "version": 1, "updated_at": 1, "cold_storage": 1, "body_fetched": 1}
+            )
+        except Exception as e:
+            logger.error(f"Error fetching revision of email {email_id}: {e}")
             return None
     
     async def get_email_by_gmail_id(self, gmail_id: str) -> Optional[Dict]:
@@ -129,33 +413,119 @@ class Database:
             return None
             
         except Exception as e:
-            print(f"Error fetching email by Gmail ID {gmail_id}: {e}")
+            logger.error(f"Error fetching email by Gmail ID {gmail_id}: {e}")
             return None
     
-    async def update_email(self, email_id: str, update_data: Dict) -> bool:
-        """Update an email"""
+    async def update_email(self, email_id: str, update_data: Dict,
+                           expected_version: Optional[int] = None) -> Optional[Dict]:
+        """Update editable email fields and return the new document"""
+        fields = {k: v for k, v in update_data.items() if k in EMAIL_EDITABLE_FIELDS}
+        return await self._find_and_update(email_id, {}, fields, expected_version)
+    
+    async def transition_email(self, email_id: str, to_status: str,
+                               expected_version: Optional[int] = None,
+                               update_data: Optional[Dict] = None,
+                               unset_fields: Optional[List[str]] = None,
+                               extra_query: Optional[Dict] = None) -> Optional[Dict]:
+        """Atomically move an email to a new status and return the new document"""
+        if to_status == 'read':
+            to_status = 'in_progress'
+        if to_status not in EMAIL_STATUS_TRANSITIONS:
+            raise ValueError(f"Unknown email status: {to_status}")
+        
+        from_statuses = [status for status, targets in EMAIL_STATUS_TRANSITIONS.items()
+                         if to_status in targets]
+        query = dict(extra_query or {})
+        query['status'] = {"$in": from_statuses}
+        
+        fields = dict(update_data or {})
+        fields['status'] = to_status
+        return await self._find_and_update(email_id, query, fields, expected_version, unset_fields)
+    
+    async def store_fetched_body(self, email_id: str, email_data: Dict) -> Optional[Dict]:
+        """Fill in the body of an email the header prefilter stored without one"""
+        fields = {field: email_data[field] for field in ('body', 'text_content', 'latest_message_text')}
+        fields['body_fetched'] = True
         try:
-            update_data['updated_at'] = datetime.utcnow()
-            
-            result = await self.emails_collection.update_one(
-                {"_id": ObjectId(email_id)},
-                {"$set": update_data}
-            )
-            
-            return result.modified_count > 0
-            
-        except Exception as e:
-            print(f"Error updating email {email_id}: {e}")
-            return False
+            return await self._find_and_update(email_id, {"body_fetched": False}, fields)
+        except EmailConflictError:
+            # 다른 요청이 먼저 채움
+            return await self.get_email(email_id)
+    
+    async def claim_email_for_reply(self, email_id: str, lease_seconds: int = 300) -> Optional[Dict]:
+        """Mark an email as being replied to so a second sender is rejected"""
+        lease_expired = datetime.utcnow() - timedelta(seconds=lease_seconds)
+        # 이메일을 열면 이미 in_progress가 되므로 전이 규칙 대신 답장 가능한 상태를 직접 지정
+        query = {
+            "status": {"$in": REPLYABLE_STATUSES},
+            "$or": [
+                {"reply_claimed_at": {"$exists": False}},
+                {"reply_claimed_at": {"$lt": lease_expired}}
+            ]
+        }
+        return await self._find_and_update(
+            email_id, query, {'status': 'in_progress', 'reply_claimed_at': datetime.utcnow()}
+        )
+    
+    async def release_reply_claim(self, email_id: str) -> None:
+        """Release a reply claim after a failed send"""
+        await self.emails_collection.update_one(
+            {"_id": _object_id(email_id)},
+            {"$unset": {"reply_claimed_at": ""}}
+        )
+    
+    async def _find_and_update(self, email_id: str, query: Dict, fields: Dict,
+                               expected_version: Optional[int] = None,
+                               unset_fields: Optional[List[str]] = None) -> Optional[Dict]:
+        """Apply an update with find_one_and_update, raising EmailConflictError if a precondition fails"""
+        from pymongo import ReturnDocument
+        query = dict(query)
+        query['_id'] = _object_id(email_id)
+        if expected_version is not None:
+            # version 필드가 없는 기존 문서는 0으로 취급
+            query['version'] = {"$in": [0, None]} if expected_version == 0 else expected_version
+        
+        fields['updated_at'] = datetime.utcnow()
+        update = {"$set": fields, "$inc": {"version": 1}}
+        if unset_fields:
+            update["$unset"] = {field: "" for field in unset_fields}
+        
+        email = await self.emails_collection.find_one_and_update(
+            query, update, return_document=ReturnDocument.AFTER
+        )
+        
+        if email:
+            await self._bump_revision('emails')
+            email['id'] = str(email['_id'])
+            del email['_id']
+            return email
+        
+        # 실패한 경우에만 존재 여부를 다시 확인
+        if await self.emails_collection.count_documents({"_id": _object_id(email_id)}, limit=1):
+            raise EmailConflictError(f"Email {email_id} was modified or is not in a valid state")
+        return None
+    
+    async def save_draft_reply(self, email_id: str, draft_key: str, reply: str) -> None:
+        """Persist a generated draft so identical requests can reuse it"""
+        await self.emails_collection.update_one(
+            {"_id": _object_id(email_id)},
+            {"$set": {"draft_reply": {
+                'key': draft_key,
+                'reply': reply,
+                'generated_at': datetime.utcnow()
+            }}}
+        )
     
     async def delete_email(self, email_id: str) -> bool:
         """Delete an email"""
         try:
-            result = await self.emails_collection.delete_one({"_id": ObjectId(email_id)})
+            result = await self.emails_collection.delete_one({"_id": _object_id(email_id)})
+            if result.deleted_count:
+                await self._bump_revision('emails')
             return result.deleted_count > 0
             
         except Exception as e:
-            print(f"Error deleting email {email_id}: {e}")
+            logger.error(f"Error deleting email {email_id}: {e}")
             return False
     
     async def get_email_stats(self) -> Dict:
@@ -177,7 +547,7 @@ class Database:
             # Get recent activity (last 7 days)
             week_ago = datetime.utcnow() - timedelta(days=7)
             recent = await self.emails_collection.count_documents({
-                "received_at": {"$gte": week_ago.isoformat()}
+                "received_utc": {"$gte": week_ago}
             })
             
             # Calculate average response time (for replied emails)
@@ -197,7 +567,7 @@ class Database:
             }
             
         except Exception as e:
-            print(f"Error getting email stats: {e}")
+            logger.error(f"Error getting email stats: {e}")
             return {}
     
     async def _calculate_avg_response_time(self) -> str:
@@ -231,7 +601,7 @@ class Database:
             return "N/A"
             
         except Exception as e:
-            print(f"Error calculating response time: {e}")
+            logger.error(f"Error calculating response time: {e}")
             return "N/A"
     
     async def search_emails(self, query: str, limit: int = 20) -> List[Dict]:
@@ -258,24 +628,181 @@ class Database:
             return emails
             
         except Exception as e:
-            print(f"Error searching emails: {e}")
+            logger.error(f"Error searching emails: {e}")
             return []
     
-    async def cleanup_old_emails(self, days: int = 90) -> int:
-        """Clean up emails older than specified days"""
+    async def iter_email_batches(self, query: Dict, fields: List[str],
+                                 batch_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        """Stream matching emails in _id order, one cursor batch at a time (never the whole result)"""
+        projection = {field: 1 for field in fields if field != 'id'}
+        cursor = self.emails_collection.find(query, projection or {"_id": 1}).sort("_id", 1).batch_size(batch_size)
         try:
-            cutoff_date = datetime.utcnow() - timedelta(days=days)
-            
-            result = await self.emails_collection.delete_many({
-                "received_at": {"$lt": cutoff_date.isoformat()},
-                "status": {"$in": ["archived", "spam"]}
-            })
-            
-            return result.deleted_count
-            
-        except Exception as e:
-            print(f"Error cleaning up old emails: {e}")
+            batch = []
+            async for email in cursor:
+                email['id'] = str(email.pop('_id'))
+                batch.append(email)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            await cursor.close()
+    
+    async def find_thread_by_message_ids(self, message_ids: List[str]) -> Optional[Dict]:
+        """Most recently active thread that contains any of these Message-IDs"""
+        return await self.threads_collection.find_one(
+            {"message_ids": {"$in": message_ids}}, {"_id": 1}, sort=[("last_activity_at", -1)]
+        )
+    
+    async def find_email_by_gmail_ids(self, gmail_ids: List[str]) -> Optional[Dict]:
+        """Any stored email whose Message-ID is in the list"""
+        return await self.emails_collection.find_one(
+            {"gmail_id": {"$in": gmail_ids}},
+            {"_id": 0, "gmail_id": 1, "thread_id": 1, "subject": 1, "sender_email": 1, "received_at": 1}
+        )
+    
+    async def find_recent_thread(self, subject_key: str, sender_email: str, since: datetime) -> Optional[Dict]:
+        """Latest thread with this normalized subject that the sender took part in after `since`"""
+        return await self.threads_collection.find_one(
+            {"subject_key": subject_key, "participants": sender_email, "last_activity_at": {"$gte": since}},
+            {"_id": 1}, sort=[("last_activity_at", -1)]
+        )
+    
+    async def upsert_thread(self, thread_id: str, email_data: Dict, subject_key: str,
+                            activity_at: datetime) -> None:
+        """Add a message to a thread; repeating it for the same message changes nothing"""
+        # 파이프라인 업데이트에서 "$"로 시작하는 문자열은 필드 경로로 해석되므로 $literal로 감쌈
+        sender = {"$literal": email_data.get('sender_email')}
+        await self.threads_collection.update_one(
+            {"_id": thread_id},
+            [
+                {"$set": {
+                    "subject": {"$ifNull": ["$subject", {"$literal": email_data.get('subject')}]},
+                    "subject_key": {"$ifNull": ["$subject_key", {"$literal": subject_key}]},
+                    "participants": {"$setUnion": [{"$ifNull": ["$participants", []]}, [sender]]},
+                    "message_ids": {"$setUnion": [{"$ifNull": ["$message_ids", []]}, [{"$literal": email_data['gmail_id']}]]},
+                    "first_message_at": {"$min": ["$first_message_at", activity_at]},
+                    "last_activity_at": {"$max": ["$last_activity_at", activity_at]},
+                    "last_sender_email": {"$cond": [
+                        {"$gte": [activity_at, {"$ifNull": ["$last_activity_at", activity_at]}]},
+                        sender, "$last_sender_email"
+                    ]},
+                    "updated_at": datetime.utcnow()
+                }},
+                {"$set": {"message_count": {"$size": "$message_ids"}}}
+            ],
+            upsert=True
+        )
+    
+    async def get_threads(self, limit: int = 50) -> List[Dict]:
+        """Conversations ordered by last activity"""
+        cursor = self.threads_collection.find({}, {"message_ids": 0}).sort("last_activity_at", -1).limit(limit)
+        threads = await cursor.to_list(length=limit)
+        for thread in threads:
+            thread['id'] = thread.pop('_id')
+        return threads
+    
+    async def get_thread(self, thread_id: str) -> Optional[Dict]:
+        thread = await self.threads_collection.find_one({"_id": thread_id}, {"message_ids": 0})
+        if thread:
+            thread['id'] = thread.pop('_id')
+        return thread
+    
+    async def get_thread_emails(self, thread_id: str, fields: Optional[List[str]] = None, limit: int = 100,
+                                before: Optional[str] = None, exclude_id: Optional[str] = None) -> List[Dict]:
+        """Emails of a thread, oldest first (the newest `limit` of them, received before `before` if given)"""
+        query = {"thread_id": thread_id}
+        if before:
+            query['received_at'] = {"$lte": before}
+        if exclude_id:
+            query['_id'] = {"$ne": _object_id(exclude_id)}
+        projection = {field: 1 for field in fields} if fields else None
+        cursor = self.emails_collection.find(query, projection).sort("received_at", -1).limit(limit)
+        emails = await cursor.to_list(length=limit)
+        for email in emails:
+            email['id'] = str(email.pop('_id'))
+        emails.reverse()
+        return emails
+    
+    async def get_training_emails(self, limit: int = 20000) -> List[Dict]:
+        """Labeled emails for training the local classifier (newest first)"""
+        # LLM과 사람이 붙인 라벨만 사용 (키워드/로컬 모델/헤더 필터/실패 기본값, 출처 없는 기존 라벨은 제외)
+        query = {
+            "priority": {"$exists": True},
+            "classification_source": {"$in": TRAINING_LABEL_SOURCES},
+            "cold_storage": {"$exists": False}
+        }
+        projection = {"subject": 1, "body": 1, "latest_message_text": 1, "priority": 1, "tags": 1}
+        cursor = self.emails_collection.find(query, projection).sort("received_at", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+    
+    async def get_sender_reputation(self, days: int = 180) -> Dict[str, Dict]:
+        """Per-sender message and spam counts from recent mail"""
+        pipeline = [
+            # 로컬 분류기와 같은 라벨만 사용 (헤더 필터/키워드 판정으로 평판이 굳어지지 않도록)
+            {"$match": {
+                "created_at": {"$gte": datetime.utcnow() - timedelta(days=days)},
+                "classification_source": {"$in": TRAINING_LABEL_SOURCES}
+            }},
+            {"$group": {
+                "_id": {"$toLower": "$sender_email"},
+                "total": {"$sum": 1},
+                "spam": {"$sum": {"$cond": [{"$eq": ["$priority", "spam"]}, 1, 0]}}
+            }}
+        ]
+        stats = {}
+        async for row in self.emails_collection.aggregate(pipeline):
+            if row["_id"]:
+                stats[row["_id"]] = {"total": row["total"], "spam": row["spam"]}
+        return stats
+    
+    async def get_header_training_samples(self, limit: int = 5000) -> List[Dict]:
+        """Subjects and senders of labeled emails for the header prefilter's token model"""
+        # 로컬 분류기와 같은 라벨만 사용 (출처 없는 기존 라벨, 키워드/기본값 라벨 제외)
+        query = {
+            "priority": {"$exists": True},
+            "classification_source": {"$in": TRAINING_LABEL_SOURCES}
+        }
+        projection = {"_id": 0, "subject": 1, "sender_email": 1, "priority": 1}
+        cursor = self.emails_collection.find(query, projection).sort("created_at", -1).limit(limit)
+        return await cursor.to_list(length=limit)
+    
+    async def get_retention_candidates(self, cutoff: datetime, batch_size: int = 200) -> List[Dict]:
+        """Get the oldest archived/spam emails received before cutoff (naive UTC) still in the hot collection"""
+        query = {
+            "received_utc": {"$lt": cutoff},
+            "$or": [
+                {"status": {"$in": ["archived", "spam"]}},
+                {"priority": "spam"}
+            ],
+            "cold_storage": {"$exists": False}
+        }
+        # 보존 기간이 지난 범위만 인덱스로 읽음 (젊은 메일은 건너뛰지 않고 아예 읽지 않음)
+        cursor = (self.emails_collection.find(query)
+                  .sort("received_utc", 1).hint([("received_utc", 1)]).limit(batch_size))
+        return await cursor.to_list(length=batch_size)
+    
+    async def store_cold_emails(self, cold_docs: List[Dict]) -> int:
+        """Store compressed emails in the cold storage collection"""
+        from pymongo import ReplaceOne
+        if not cold_docs:
+            return 0
+        
+        requests = [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in cold_docs]
+        result = await self.cold_emails_collection.bulk_write(requests, ordered=False)
+        return result.upserted_count + result.modified_count
+    
+    async def replace_with_stubs(self, stubs: List[Dict]) -> int:
+        """Replace hot emails with slim stubs after they were moved to cold storage"""
+        from pymongo import ReplaceOne
+        if not stubs:
             return 0
+        
+        requests = [ReplaceOne({"_id": stub["_id"]}, stub) for stub in stubs]
+        result = await self.emails_collection.bulk_write(requests, ordered=False)
+        await self._bump_revision('emails')
+        return result.modified_count
     
     async def get_email_trends(self, days: int = 30) -> Dict:
         """Get email trends over the specified period"""
@@ -283,13 +810,10 @@ class Database:
             start_date = datetime.utcnow() - timedelta(days=days)
             
             pipeline = [
-                {"$match": {"received_at": {"$gte": start_date.isoformat()}}},
+                {"$match": {"received_utc": {"$gte": start_date}}},
                 {"$group": {
                     "_id": {
-                        "date": {"$dateToString": {
-                            "format": "%Y-%m-%d",
-                            "date": {"$dateFromString": {"dateString": "$received_at"}}
-                        }},
+                        "date": {"$dateToString": {"format": "%Y-%m-%d", "date": "$received_utc"}},
                         "priority": "$priority"
                     },
                     "count": {"$sum": 1}
@@ -314,19 +838,16 @@ class Database:
             return trends
             
         except Exception as e:
-            print(f"Error getting email trends: {e}")
+            logger.error(f"Error getting email trends: {e}")
             return {}
     
     # 펜션 정보 관리 메서드들
-    async def get_pension_info(self) -> Optional[Dict]:
-        """펜션 정보 조회"""
+    async def get_pension_info(self, include_analysis: bool = False) -> Optional[Dict]:
+        """펜션 정보 조회 (include_analysis=True이면 증분 분석용 상태 포함)"""
         try:
             # pension_info 컬렉션에서 최신 정보 조회
-            if not hasattr(self, 'pension_collection'):
-                self.pension_collection = self.db.pension_info
-            
             pension_info = await self.pension_collection.find_one(
-                {}, sort=[("updated_at", -1)]
+                {}, None if include_analysis else {"analysis": 0}, sort=[("updated_at", -1)]
             )
             
             if pension_info:
@@ -337,15 +858,12 @@ class Database:
             return None
             
         except Exception as e:
-            print(f"Error getting pension info: {e}")
+            logger.error(f"Error getting pension info: {e}")
             return None
     
     async def save_pension_info(self, raw_text: str, analyzed_info: Optional[Dict] = None) -> bool:
         """펜션 정보 저장"""
         try:
-            if not hasattr(self, 'pension_collection'):
-                self.pension_collection = self.db.pension_info
-            
             pension_data = {
                 'raw_text': raw_text,
                 'analyzed_info': analyzed_info,
@@ -359,6 +877,9 @@ class Database:
             if existing:
                 # 업데이트
                 pension_data['created_at'] = existing.get('created_at', datetime.utcnow())
+                # 증분 분석 상태는 분석 API에서만 갱신
+                if 'analysis' in existing:
+                    pension_data['analysis'] = existing['analysis']
                 await self.pension_collection.replace_one(
                     {"_id": existing["_id"]}, 
                     pension_data
@@ -370,17 +891,20 @@ class Database:
             return True
             
         except Exception as e:
-            print(f"Error saving pension info: {e}")
+            logger.error(f"Error saving pension info: {e}")
             return False
     
+    async def save_pension_analysis(self, analysis: Dict) -> None:
+        """증분 분석 상태 저장 (문단별 해시/섹션, 분석 결과, 키워드 분석으로 채운 섹션)"""
+        await self.pension_collection.update_one(
+            {}, {"$set": {"analysis": analysis}, "$setOnInsert": {"created_at": datetime.utcnow()}}, upsert=True
+        )
+    
     # 응답 설정 관리 메서드들
     async def get_response_settings(self) -> Optional[Dict]:
         """응답 설정 조회"""
         try:
             # response_settings 컬렉션에서 최신 설정 조회
-            if not hasattr(self, 'response_settings_collection'):
-                self.response_settings_collection = self.db.response_settings
-            
             settings = await self.response_settings_collection.find_one(
                 {}, sort=[("updated_at", -1)]
             )
@@ -393,15 +917,12 @@ class Database:
             return None
             
         except Exception as e:
-            print(f"Error getting response settings: {e}")
+            logger.error(f"Error getting response settings: {e}")
             return None
     
     async def save_response_settings(self, settings: Dict) -> bool:
         """응답 설정 저장"""
         try:
-            if not hasattr(self, 'response_settings_collection'):
-                self.response_settings_collection = self.db.response_settings
-            
             settings_data = {
                 'settings': settings,
                 'updated_at': datetime.utcnow(),
@@ -425,5 +946,5 @@ class Database:
             return True
             
         except Exception as e:
-            print(f"Error saving response settings: {e}")
+            logger.error(f"Error saving response settings: {e}")
             return False
\ No newline at end of file
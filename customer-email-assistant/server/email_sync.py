@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import uuid
+import socket
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from metrics import registry
+from text_cleaner import get_llm_text
+from llm_scheduler import llm_lane, BACKGROUND
+from email_threads import ThreadIndex
+
+logger = logging.getLogger(__name__)
+
+email_sync_latency = registry.histogram(
+    "email_sync_duration_seconds", "Time for one full email sync", ("trigger",)
+)
+email_sync_new_messages = registry.counter(
+    "email_sync_new_messages_total", "New emails stored by sync", ("trigger",)
+)
+email_sync_coalesced = registry.counter(
+    "email_sync_coalesced_total", "Sync requests that attached to a run already in progress"
+)
+email_sync_lock_skipped = registry.counter(
+    "email_sync_lock_skipped_total", "Syncs skipped because another worker holds the sync lock"
+)
+
+SYNC_LOCK_NAME = "email_sync"
+
+class EmailSync:
+    """Fetches new mail, classifies it and stores it, with progress reporting"""
+
+    def __init__(self, db, reader, classifier, fetch_limit: int = 50, bulk_filter=None):
+        self.db = db
+        self.reader = reader
+        self.classifier = classifier
+        self.fetch_limit = fetch_limit
+        self.bulk_filter = bulk_filter
+        self.threads = ThreadIndex(db)
+
+        self.lock_ttl_seconds = int(os.getenv("SYNC_LOCK_TTL_SECONDS", 120))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._inflight: Optional[asyncio.Task] = None
+        self.status = {
+            'running': False,
+            'trigger': None,
+            'fetched': 0,
+            'processed': 0,
+            'prefiltered': 0,
+            'started_at': None,
+            'finished_at': None,
+            'error': None
+        }
+
+    def get_status(self) -> Dict:
+        """Get progress of the current or last sync"""
+        return dict(self.status)
+
+    def _get_or_start(self, trigger: str, use_ai: bool) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._run_exclusive(trigger, use_ai))
+        else:
+            email_sync_coalesced.inc()
+        return self._inflight
+
+    async def run(self, trigger: str = "manual", use_ai: bool = True) -> Dict:
+        """Run a sync, or attach to the one already in progress and share its result"""
+        task = self._get_or_start(trigger, use_ai)
+        # 한 호출자의 연결이 끊겨도 다른 호출자가 기다리는 sync는 취소되지 않도록 shield
+        return await asyncio.shield(task)
+
+    def start_background(self, trigger: str = "startup", use_ai: bool = False) -> None:
+        """Schedule a sync without waiting for it"""
+        self._get_or_start(trigger, use_ai).add_done_callback(self._log_background_failure)
+
+    def _log_background_failure(self, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception():
+            logger.error(f"Background sync failed: {task.exception()}")
+
+    async def stop(self) -> None:
+        """Cancel a sync that is still running"""
+        if self._inflight and not self._inflight.done():
+            self._inflight.cancel()
+            try:
+                await self._inflight
+            except asyncio.CancelledError:
+                pass
+        self._inflight = None
+
+    async def _run_exclusive(self, trigger: str, use_ai: bool) -> Dict:
+        """Hold the cross-worker lease lock for the duration of one sync"""
+        if not await self.db.acquire_lock(SYNC_LOCK_NAME, self.owner, self.lock_ttl_seconds):
+            email_sync_lock_skipped.inc()
+            logger.info("Sync already running in another worker, skipping")
+            return {
+                "message": "Sync already running in another worker.",
+                "processed_count": 0,
+                "skipped": True
+            }
+
+        heartbeat = asyncio.create_task(self._renew_lock())
+        try:
+            return await self._sync(trigger, use_ai)
+        finally:
+            heartbeat.cancel()
+            await self.db.release_lock(SYNC_LOCK_NAME, self.owner)
+
+    async def _renew_lock(self) -> None:
+        while True:
+            await asyncio.sleep(self.lock_ttl_seconds / 3)
+            await self.db.acquire_lock(SYNC_LOCK_NAME, self.owner, self.lock_ttl_seconds)
+
+    async def _sync(self, trigger: str, use_ai: bool) -> Dict:
+        """Fetch, classify and store new emails"""
+        from pymongo.errors import DuplicateKeyError
+        start = time.perf_counter()
+        self.status.update({
+            'running': True,
+            'trigger': trigger,
+            'fetched': 0,
+            'processed': 0,
+            'prefiltered': 0,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'error': None
+        })
+
+        try:
+            logger.info(f"Syncing emails from Gmail ({trigger})...")
+            header_filter = None
+            if self.bulk_filter:
+                await self.bulk_filter.refresh(self.db)
+                header_filter = self.bulk_filter.check
+            new_emails = await self.reader.fetch_emails(limit=self.fetch_limit, header_filter=header_filter)
+            self.status['fetched'] = len(new_emails)
+
+            # 최신순으로 오므로 뒤집어서 원 메일이 답장보다 먼저 스레드에 들어가게 함
+            for email_data in reversed(new_emails):
+                # Check if email already exists
+                existing = await self.db.get_email_by_gmail_id(email_data['gmail_id'])
+                if existing:
+                    continue
+
+                # 헤더만으로 대량/자동 메일로 판정된 경우 본문도 LLM도 건너뜀
+                classification = email_data.pop('prefilter', None)
+                if classification:
+                    self.status['prefiltered'] += 1
+                elif use_ai:
+                    # 사용자가 기다리는 요청보다 뒤로 밀리도록 background 레인에서 호출
+                    with llm_lane(BACKGROUND):
+                        classification = await self.classifier.classify(
+                            get_llm_text(email_data),
+                            email_data['subject']
+                        )
+                else:
+                    # Quick classification (skip AI, use keywords)
+                    classification = self.classifier.quick_classify(
+                        get_llm_text(email_data),
+                        email_data['subject']
+                    )
+
+                # Store email with classification
+                email_data.update({
+                    'priority': classification['priority'],
+                    'tags': classification['tags'],
+                    'classification_source': classification.get('source'),
+                    'status': 'unread'
+                })
+                await self.threads.assign(email_data)
+
+                try:
+                    await self.db.store_email(email_data)
+                except DuplicateKeyError:
+                    # 다른 경로에서 이미 저장됨
+                    continue
+                self.status['processed'] += 1
+
+            processed_count = self.status['processed']
+            email_sync_new_messages.inc(processed_count, trigger=trigger)
+            logger.info(f"Sync completed ({trigger}). {processed_count} new emails processed.")
+
+            return {
+                "message": f"Sync completed. {processed_count} new emails processed.",
+                "processed_count": processed_count
+            }
+
+        except Exception as e:
+            self.status['error'] = str(e)
+            raise
+        finally:
+            email_sync_latency.observe(time.perf_counter() - start, trigger=trigger)
+            self.status['running'] = False
+            self.status['finished_at'] = datetime.utcnow().isoformat()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+email_threads_assigned = registry.counter(
+    "email_threads_assigned_total", "Incoming emails assigned to a conversation thread", ("method",)
+)
+
+# 답장/전달 접두사 (여러 번 붙은 경우 "Re: RE[2]: 답장:" 모두 제거)
+_REPLY_PREFIX = re.compile(r'^\s*((re|fw|fwd|aw|sv|답장|회신|전달)\s*(\[\d+\])?\s*[:：]\s*)+', re.IGNORECASE)
+# 제목만으로 묶으면 안 되는 흔한 제목
+_GENERIC_SUBJECTS = {'', 'no subject', '(no subject)', '제목 없음'}
+
+# 답장 생성 시 함께 보내는 이전 메시지 필드
+THREAD_SUMMARY_FIELDS = ['sender_email', 'received_at', 'latest_message_text', 'body', 'sent_reply']
+
+def normalize_subject(subject: Optional[str]) -> str:
+    """Subject without reply/forward prefixes, lowercased with collapsed whitespace"""
+    subject = _REPLY_PREFIX.sub('', subject or '')
+    return re.sub(r'\s+', ' ', subject).strip().lower()
+
+def activity_time(received_at: Optional[str]) -> datetime:
+    """received_at (ISO string) as a naive UTC datetime, the way pymongo stores dates"""
+    try:
+        moment = datetime.fromisoformat(received_at)
+    except (TypeError, ValueError):
+        return datetime.utcnow()
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def _compact(text: Optional[str], max_chars: int) -> str:
+    text = re.sub(r'\s+', ' ', text or '').strip()
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + '…'
+
+def summarize_thread(emails: List[Dict], max_chars: int) -> str:
+    """One line per earlier message (and the reply we sent to it), oldest first"""
+    lines = []
+    for email in emails:
+        when = (email.get('received_at') or '')[:16].replace('T', ' ')
+        text = _compact(email.get('latest_message_text') or email.get('body'), max_chars)
+        lines.append(f"[{when}] 고객({email.get('sender_email')}): {text}")
+        if email.get('sent_reply'):
+            lines.append(f"[{when}] 펜션 답장: {_compact(email['sent_reply'], max_chars)}")
+    return "\n".join(lines)
+
+class ThreadIndex:
+    """Groups incoming emails into conversations and keeps the threads collection up to date
+
+    A message joins a thread through its References/In-Reply-To headers; if none of them are known,
+    the same sender writing under the same (prefix-stripped) subject within THREAD_SUBJECT_WINDOW_DAYS
+    continues the thread. Otherwise its own Message-ID starts a new one.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.subject_window_days = int(os.getenv("THREAD_SUBJECT_WINDOW_DAYS", 14))
+        self.context_messages = int(os.getenv("THREAD_CONTEXT_MESSAGES", 4))
+        self.context_chars = int(os.getenv("THREAD_CONTEXT_CHARS", 300))
+
+    async def assign(self, email_data: Dict) -> str:
+        """Set email_data['thread_id'] and record the message on its thread (safe to repeat)"""
+        try:
+            thread_id, method = await self._resolve(email_data)
+            email_data['thread_id'] = thread_id
+            await self._record(thread_id, email_data)
+            email_threads_assigned.inc(method=method)
+        except Exception as e:
+            # 스레드 연결에 실패해도 메일 저장은 계속 (thread_id는 자기 Message-ID로 남음)
+            logger.warning(f"Could not assign thread for {email_data.get('gmail_id')}: {e}")
+        return email_data['thread_id']
+
+    async def _resolve(self, email_data: Dict) -> Tuple[str, str]:
+        # 자기 Message-ID도 함께 찾아 백필을 다시 돌려도 같은 스레드에 들어가게 함
+        references = email_data.get('references') or []
+        thread = await self.db.find_thread_by_message_ids([email_data['gmail_id']] + references)
+        if thread:
+            return thread['_id'], 'references'
+
+        if references:
+            # threads 컬렉션이 생기기 전에 저장된 메일에 대한 답장
+            parent = await self.db.find_email_by_gmail_ids(references)
+            if parent:
+                thread_id = parent.get('thread_id') or parent['gmail_id']
+                await self._record(thread_id, parent)
+                return thread_id, 'parent'
+
+        subject_key = normalize_subject(email_data.get('subject'))
+        if subject_key not in _GENERIC_SUBJECTS and email_data.get('sender_email'):
+            received = activity_time(email_data.get('received_at'))
+            thread = await self.db.find_recent_thread(
+                subject_key, email_data['sender_email'], received - timedelta(days=self.subject_window_days)
+            )
+            if thread:
+                return thread['_id'], 'subject'
+
+        return email_data['gmail_id'], 'new'
+
+    async def _record(self, thread_id: str, email_data: Dict) -> None:
+        await self.db.upsert_thread(
+            thread_id, email_data, normalize_subject(email_data.get('subject')),
+            activity_time(email_data.get('received_at'))
+        )
+
+    async def summary_for(self, email: Dict) -> str:
+        """Compact history of the messages before this one in its thread, for reply generation"""
+        if not email.get('thread_id') or self.context_messages <= 0:
+            return ""
+        earlier = await self.db.get_thread_emails(
+            email['thread_id'], fields=THREAD_SUMMARY_FIELDS, limit=self.context_messages,
+            before=email.get('received_at'), exclude_id=email['id']
+        )
+        return summarize_thread(earlier, self.context_chars)
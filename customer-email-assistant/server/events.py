@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+email_events_published = registry.counter(
+    "email_events_published_total", "Email change events sent to dashboard subscribers", ("type",)
+)
+email_event_subscribers = registry.gauge(
+    "email_event_subscribers", "Open /events connections in this worker"
+)
+email_event_overflows = registry.counter(
+    "email_event_overflows_total", "Subscribers that fell behind and were told to reload"
+)
+
+# 목록 화면(EmailCard)에 필요한 필드만 전송 (본문은 미리보기 길이로 자름)
+EVENT_EMAIL_FIELDS = ('subject', 'sender_email', 'sender_name', 'received_at', 'status', 'priority', 'tags', 'version')
+EVENT_BODY_PREVIEW_CHARS = 200
+CLASSIFICATION_FIELDS = ('priority', 'tags')
+
+# 변경 스트림 단계에서 큰 필드를 미리 걸러냄
+CHANGE_STREAM_PIPELINE = [
+    {'$match': {'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}}},
+    {'$project': {
+        'fullDocument.text_content': 0,
+        'fullDocument.latest_message_text': 0,
+        'fullDocument.draft_reply': 0,
+        'updateDescription.removedFields': 0,
+        'updateDescription.truncatedArrays': 0
+    }}
+]
+# standalone MongoDB (replica set이 아님)에서는 변경 스트림을 쓸 수 없음
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+def _email_summary(email_id: str, document: Dict) -> Dict:
+    summary = {'id': email_id}
+    summary.update({field: document.get(field) for field in EVENT_EMAIL_FIELDS if field in document})
+    summary['body'] = (document.get('body') or '')[:EVENT_BODY_PREVIEW_CHARS]
+    return summary
+
+def change_to_events(change: Dict) -> List[Dict]:
+    """Dashboard events for one change stream document"""
+    email_id = str(change['documentKey']['_id'])
+    operation = change['operationType']
+
+    if operation in ('insert', 'replace'):
+        event_type = 'email_created' if operation == 'insert' else 'email_updated'
+        return [{'type': event_type, 'email': _email_summary(email_id, change.get('fullDocument') or {})}]
+    if operation == 'delete':
+        # 콜드 스토리지로 이동했거나 삭제됨
+        return [{'type': 'email_deleted', 'id': email_id}]
+
+    updated = (change.get('updateDescription') or {}).get('updatedFields') or {}
+    # 낙관적 잠금 버전이 함께 바뀌었으면 클라이언트가 다음 수정에 쓸 수 있도록 전달
+    version = {'version': updated['version']} if 'version' in updated else {}
+    events = []
+    if 'status' in updated:
+        events.append({'type': 'status_changed', 'id': email_id, 'status': updated['status'], **version})
+    classification = {field: updated[field] for field in CLASSIFICATION_FIELDS if field in updated}
+    if classification:
+        events.append({'type': 'classification_updated', 'id': email_id, **classification, **version})
+    if any(field == 'draft_reply' or field.startswith('draft_reply.') for field in updated):
+        events.append({'type': 'draft_ready', 'id': email_id})
+    return events
+
+def format_sse(event: Dict) -> str:
+    """One Server-Sent Events message"""
+    data = json.dumps(event, ensure_ascii=False, default=str)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+class EmailEventStream:
+    """Tails the emails collection with a MongoDB change stream and fans events out to /events subscribers
+
+    Every worker runs its own watcher, so a write made by any worker reaches every connected dashboard.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.queue_size = int(os.getenv("EVENTS_QUEUE_SIZE", 200))
+        self.retry_seconds = float(os.getenv("EVENTS_RETRY_SECONDS", 5))
+
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+        self.status = {'watching': False, 'supported': True, 'error': None}
+
+    def get_status(self) -> Dict:
+        return {**self.status, 'subscribers': len(self._subscribers)}
+
+    def start(self) -> None:
+        """Start watching in the background"""
+        if os.getenv("EVENTS_ENABLED", "true").lower() != "true" or self._task:
+            return
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        """Stop watching and close every subscriber stream"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for queue in list(self._subscribers):
+            self._close(queue)
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        email_event_subscribers.set(len(self._subscribers))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+        email_event_subscribers.set(len(self._subscribers))
+
+    def _close(self, queue: asyncio.Queue) -> None:
+        # None은 스트림 종료 신호
+        self._drain(queue)
+        queue.put_nowait(None)
+        self.unsubscribe(queue)
+
+    def _drain(self, queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+
+    def publish(self, event: Dict) -> None:
+        email_events_published.inc(type=event['type'])
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # 느린 구독자는 밀린 이벤트 대신 전체 새로고침 요청 하나만 받음
+                email_event_overflows.inc()
+                self._drain(queue)
+                queue.put_nowait({'type': 'resync'})
+
+    async def _watch(self) -> None:
+        from pymongo.errors import OperationFailure, PyMongoError
+        while True:
+            try:
+                async with self.db.emails_collection.watch(
+                    CHANGE_STREAM_PIPELINE, resume_after=self._resume_token
+                ) as stream:
+                    self.status.update({'watching': True, 'error': None})
+                    logger.info("Watching email changes for /events")
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        for event in change_to_events(change):
+                            self.publish(event)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self.status.update({'watching': False, 'error': str(e)})
+                if e.code == CHANGE_STREAM_UNSUPPORTED:
+                    self.status['supported'] = False
+                    logger.warning("MongoDB change streams need a replica set; dashboards fall back to polling")
+                    self.publish({'type': 'hello', 'live': False})
+                    return
+                logger.error(f"Email change stream failed: {e}")
+                # 재개 토큰이 만료됐을 수 있으므로 현재 시점부터 다시 시작하고 구독자에게 새로고침을 알림
+                self._resume_token = None
+                self.publish({'type': 'resync'})
+            except PyMongoError as e:
+                self.status.update({'watching': False, 'error': str(e)})
+                logger.error(f"Email change stream interrupted: {e}")
+            await asyncio.sleep(self.retry_seconds)
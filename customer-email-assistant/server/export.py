@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+import csv
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+
+import orjson
+
+from metrics import registry
+
+email_export_rows = registry.counter(
+    "email_export_rows_total", "Emails written by /emails/export", ("format",)
+)
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_FIELDS = (
+    'id', 'gmail_id', 'thread_id', 'subject', 'sender_email', 'sender_name', 'received_at',
+    'status', 'priority', 'tags', 'classification_source', 'body', 'latest_message_text',
+    'created_at', 'updated_at', 'version'
+)
+# 본문은 크므로 요청할 때만 포함
+DEFAULT_EXPORT_FIELDS = (
+    'id', 'subject', 'sender_email', 'sender_name', 'received_at', 'status', 'priority', 'tags',
+    'classification_source'
+)
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8'
+}
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Comma-separated field list, validated against EXPORT_FIELDS"""
+    if not fields:
+        return list(DEFAULT_EXPORT_FIELDS)
+    selected = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in selected if field not in EXPORT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown export fields: {', '.join(unknown)}")
+    return selected
+
+def _as_utc(moment: datetime) -> datetime:
+    # 오프셋이 없는 값은 UTC로 간주 (received_utc와 같은 naive UTC로 맞춤)
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def build_export_query(since: Optional[datetime] = None, until: Optional[datetime] = None,
+                       status: Optional[str] = None, priority: Optional[str] = None) -> Dict:
+    query = {}
+    # received_at은 발신자 오프셋이 섞인 문자열이라 정규화된 received_utc로 비교
+    if since or until:
+        query['received_utc'] = {}
+        if since:
+            query['received_utc']['$gte'] = _as_utc(since)
+        if until:
+            query['received_utc']['$lt'] = _as_utc(until)
+    if status:
+        query['status'] = {'$in': status.split(',')}
+    if priority:
+        query['priority'] = {'$in': priority.split(',')}
+    return query
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ';'.join(str(item) for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+async def ndjson_chunks(batches: AsyncIterator[List[Dict]], fields: List[str]) -> AsyncIterator[bytes]:
+    """One NDJSON chunk per cursor batch"""
+    async for batch in batches:
+        yield b''.join(
+            orjson.dumps({field: email.get(field) for field in fields}, default=str, option=orjson.OPT_APPEND_NEWLINE)
+            for email in batch
+        )
+        email_export_rows.inc(len(batch), format='ndjson')
+
+async def csv_chunks(batches: AsyncIterator[List[Dict]], fields: List[str]) -> AsyncIterator[bytes]:
+    """Header row, then one CSV chunk per cursor batch (with a BOM so Excel reads Korean text)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(email.get(field)) for field in fields] for email in batch)
+        yield buffer.getvalue().encode('utf-8')
+        email_export_rows.inc(len(batch), format='csv')
+
+def export_chunks(format: str, batches: AsyncIterator[List[Dict]], fields: List[str]) -> AsyncIterator[bytes]:
+    return ndjson_chunks(batches, fields) if format == 'ndjson' else csv_chunks(batches, fields)
@@ -3,11 +3,21 @@
 
 import smtplib
 import os
+import logging
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import Header
+import time
 from typing import Optional
 
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+smtp_send_latency = registry.histogram(
+    "smtp_send_duration_seconds", "Time to send one reply over SMTP", ("kind", "result")
+)
+
 class GmailSender:
     def __init__(self):
         self.smtp_server = "smtp.gmail.com"
@@ -18,6 +28,8 @@ class GmailSender:
     def send_reply(self, to_email: str, subject: str, reply_content: str, 
                    original_message_id: Optional[str] = None) -> bool:
         """Gmail로 답장 보내기"""
+        start = time.perf_counter()
+        result = "failure"
         try:
             # SMTP 연결
             server = smtplib.SMTP(self.smtp_server, self.smtp_port)
@@ -47,16 +59,21 @@ class GmailSender:
             server.sendmail(self.email_address, to_email, text)
             server.quit()
             
-            print(f"✅ 답장 전송 성공: {to_email}")
+            logger.info("✅ 답장 전송 성공")
+            result = "success"
             return True
             
         except Exception as e:
-            print(f"❌ 답장 전송 실패: {e}")
+            logger.error(f"❌ 답장 전송 실패: {e}")
             return False
+        finally:
+            smtp_send_latency.observe(time.perf_counter() - start, kind="plain", result=result)
     
     def send_html_reply(self, to_email: str, subject: str, reply_content: str,
                        original_message_id: Optional[str] = None) -> bool:
         """HTML 형식으로 답장 보내기"""
+        start = time.perf_counter()
+        result = "failure"
         try:
             server = smtplib.SMTP(self.smtp_server, self.smtp_port)
             server.starttls()
@@ -85,9 +102,12 @@ class GmailSender:
             server.sendmail(self.email_address, to_email, text)
             server.quit()
             
-            print(f"✅ HTML 답장 전송 성공: {to_email}")
+            logger.info("✅ HTML 답장 전송 성공")
+            result = "success"
             return True
             
         except Exception as e:
-            print(f"❌ HTML 답장 전송 실패: {e}")
-            return False
\ No newline at end of file
+            logger.error(f"❌ HTML 답장 전송 실패: {e}")
+            return False
+        finally:
+            smtp_send_latency.observe(time.perf_counter() - start, kind="html", result=result)
\ No newline at end of file
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import time
+import hashlib
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+from metrics import registry
+
+http_not_modified = registry.counter(
+    "http_not_modified_total", "Conditional GETs answered with 304 Not Modified", ("route",)
+)
+
+# no-cache: 브라우저/프록시가 저장은 하되 매번 ETag로 재검증
+CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "no-cache")
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the revision values a response was built from"""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return '"' + hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:32] + '"'
+
+def time_bucket(seconds: int, now: Optional[float] = None) -> int:
+    """Index of the current fixed-length time window, for responses that change with time alone"""
+    return int((time.time() if now is None else now) // seconds)
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the client's If-None-Match already names this ETag"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    # If-None-Match는 약한 비교: W/ 접두사는 무시
+    candidates = [candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates]
+    return "*" in candidates or etag in candidates
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def not_modified(request: Request, etag: str) -> Response:
+    route = request.scope.get("route")
+    http_not_modified.inc(route=route.path if route else "unmatched")
+    return Response(status_code=304, headers=cache_headers(etag))
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from metrics import registry, track_llm, record_llm_usage
+from text_cleaner import CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# 우선순위 순서 (앞쪽 레인이 비어야 뒤쪽 레인이 실행됨)
+INTERACTIVE = "interactive"
+URGENT_DRAFT = "urgent_draft"
+BACKGROUND = "background"
+BACKFILL = "backfill"
+LANES = (INTERACTIVE, URGENT_DRAFT, BACKGROUND, BACKFILL)
+
+# 호출 위치마다 레인을 넘기지 않도록 컨텍스트로 전달 (HTTP 요청은 기본값 interactive)
+llm_lane_var: ContextVar[str] = ContextVar("llm_lane", default=INTERACTIVE)
+
+llm_queue_depth = registry.gauge(
+    "llm_queue_depth", "LLM calls waiting for a slot", ("lane",)
+)
+llm_inflight = registry.gauge(
+    "llm_inflight", "LLM calls currently running"
+)
+llm_queue_wait = registry.histogram(
+    "llm_queue_wait_seconds", "Time LLM calls spent waiting in the scheduler", ("lane",)
+)
+llm_cancelled = registry.counter(
+    "llm_cancelled_total", "LLM calls cancelled before they ran", ("lane",)
+)
+
+WINDOW_SECONDS = 60.0
+
+@contextmanager
+def llm_lane(lane: str):
+    """Run LLM calls made inside this block in the given lane"""
+    if lane not in LANES:
+        raise ValueError(f"Unknown LLM lane: {lane}")
+    token = llm_lane_var.set(lane)
+    try:
+        yield
+    finally:
+        llm_lane_var.reset(token)
+
+def estimate_tokens(args, kwargs) -> int:
+    """Rough prompt size from the string arguments (and OpenAI messages) of a call"""
+    chars = sum(len(arg) for arg in args if isinstance(arg, str))
+    for message in kwargs.get('messages') or []:
+        chars += len(str(message.get('content', '')))
+    return chars // CHARS_PER_TOKEN
+
+class _Waiter:
+    __slots__ = ('lane', 'tokens', 'future', 'queued_at')
+
+    def __init__(self, lane: str, tokens: int, future: asyncio.Future):
+        self.lane = lane
+        self.tokens = tokens
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+class LLMScheduler:
+    """Single in-process gate for every LLM call: priority lanes, global concurrency and a tokens-per-minute budget"""
+
+    def __init__(self, max_concurrency: Optional[int] = None, tokens_per_minute: Optional[int] = None):
+        self.max_concurrency = max_concurrency or int(os.getenv("LLM_MAX_CONCURRENCY", 4))
+        # 0이면 토큰 예산 없이 동시 실행 수만 제한
+        self.tokens_per_minute = (tokens_per_minute if tokens_per_minute is not None
+                                  else int(os.getenv("LLM_TOKENS_PER_MINUTE", 0)))
+        self.completion_tokens = int(os.getenv("LLM_EXPECTED_COMPLETION_TOKENS", 500))
+
+        self._queues: Dict[str, Deque[_Waiter]] = {lane: deque() for lane in LANES}
+        self._active = 0
+        # 최근 1분간 시작한 호출의 [시작 시각, 토큰] (완료 후 실제 사용량으로 보정)
+        self._usage: Deque[List] = deque()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+    def status(self) -> Dict:
+        return {
+            'active': self._active,
+            'max_concurrency': self.max_concurrency,
+            'tokens_last_minute': self._tokens_in_window(),
+            'tokens_per_minute': self.tokens_per_minute,
+            'queued': {lane: len(queue) for lane, queue in self._queues.items()}
+        }
+
+    async def submit(self, provider: str, operation: str, func: Callable, *args,
+                     lane: Optional[str] = None, **kwargs) -> Any:
+        """Run a blocking SDK call in a worker thread once the scheduler grants it a slot
+
+        Cancelling the caller while it is queued removes it from the queue; once started,
+        the slot is held until the SDK call actually returns.
+        """
+        lane = lane or llm_lane_var.get()
+        estimate = estimate_tokens(args, kwargs) + self.completion_tokens
+        reservation = await self._acquire(lane, estimate)
+
+        def call():
+            with track_llm(provider, operation):
+                response = func(*args, **kwargs)
+            used = record_llm_usage(provider, operation, response)
+            if used:
+                reservation[1] = used
+            return response
+
+        task = asyncio.ensure_future(asyncio.to_thread(call))
+        task.add_done_callback(lambda _: self._release())
+        return await asyncio.shield(task)
+
+    async def _acquire(self, lane: str, tokens: int) -> List:
+        if lane not in self._queues:
+            lane = BACKGROUND
+        waiter = _Waiter(lane, tokens, asyncio.get_running_loop().create_future())
+        self._queues[lane].append(waiter)
+        llm_queue_depth.inc(lane=lane)
+        self._dispatch()
+
+        try:
+            return await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 슬롯을 받은 직후에 취소된 경우 바로 반납
+                self._release()
+            else:
+                self._remove(waiter)
+                llm_cancelled.inc(lane=lane)
+            raise
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues[waiter.lane]
+        if waiter in queue:
+            queue.remove(waiter)
+            llm_queue_depth.dec(lane=waiter.lane)
+            self._dispatch()
+
+    def _release(self) -> None:
+        self._active -= 1
+        llm_inflight.set(self._active)
+        self._dispatch()
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - WINDOW_SECONDS
+        while self._usage and self._usage[0][0] < cutoff:
+            self._usage.popleft()
+
+    def _tokens_in_window(self) -> int:
+        self._prune()
+        return sum(tokens for _, tokens in self._usage)
+
+    def _dispatch(self) -> None:
+        """Start waiting calls in lane order while slots and token budget allow"""
+        while self._active < self.max_concurrency:
+            waiter = next((queue[0] for queue in self._queues.values() if queue), None)
+            if waiter is None:
+                return
+            if waiter.future.done():
+                # 취소된 호출 (_acquire에서 정리되기 전)
+                self._queues[waiter.lane].popleft()
+                llm_queue_depth.dec(lane=waiter.lane)
+                continue
+
+            if self.tokens_per_minute and self._usage:
+                # 예산이 바닥나면 앞 순위 호출이 자리를 잡을 때까지 뒤 레인도 기다림 (우선순위 역전 방지)
+                if self._tokens_in_window() + waiter.tokens > self.tokens_per_minute:
+                    self._schedule_wakeup()
+                    return
+
+            self._queues[waiter.lane].popleft()
+            llm_queue_depth.dec(lane=waiter.lane)
+            llm_queue_wait.observe(time.perf_counter() - waiter.queued_at, lane=waiter.lane)
+            reservation = [time.monotonic(), waiter.tokens]
+            self._prune()
+            self._usage.append(reservation)
+            self._active += 1
+            llm_inflight.set(self._active)
+            waiter.future.set_result(reservation)
+
+    def _schedule_wakeup(self) -> None:
+        if self._wakeup is not None and not self._wakeup.cancelled():
+            return
+        delay = max(0.05, self._usage[0][0] + WINDOW_SECONDS - time.monotonic()) if self._usage else 0.05
+
+        def wakeup():
+            self._wakeup = None
+            self._dispatch()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, wakeup)
+
+# classifier / reply_generator / pension_analyzer 공용
+llm_scheduler = LLMScheduler()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import gzip
+import json
+import math
+import time
+import random
+import logging
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 제목 + 본문 앞부분만 사용 (긴 메일도 비용이 일정하도록)
+MAX_TEXT_CHARS = 2000
+NGRAM_RANGE = (2, 4)
+_WHITESPACE = re.compile(r'\s+')
+
+def _ngrams(text: str) -> Counter:
+    text = ' ' + _WHITESPACE.sub(' ', text.lower()).strip() + ' '
+    counts = Counter()
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        for i in range(len(text) - n + 1):
+            counts[text[i:i + n]] += 1
+    return counts
+
+def build_text(subject: str, content: str) -> str:
+    return f"{subject or ''}\n{content or ''}"[:MAX_TEXT_CHARS]
+
+class _NaiveBayes:
+    """Multinomial naive Bayes over TF-IDF weights (a linear model per class)"""
+
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.priors: Dict[str, float] = {}
+        self.log_probs: Dict[str, Dict[str, float]] = {}
+        self.defaults: Dict[str, float] = {}
+
+    def fit(self, vectors: List[Dict[str, float]], labels: List[str], vocab_size: int):
+        label_counts = Counter(labels)
+        totals = {label: Counter() for label in label_counts}
+        for vector, label in zip(vectors, labels):
+            totals[label].update(vector)
+
+        for label, weights in totals.items():
+            denominator = sum(weights.values()) + self.alpha * vocab_size
+            self.priors[label] = math.log(label_counts[label] / len(labels))
+            self.log_probs[label] = {
+                feature: math.log((weight + self.alpha) / denominator) for feature, weight in weights.items()
+            }
+            self.defaults[label] = math.log(self.alpha / denominator)
+        return self
+
+    def predict_proba(self, vector: Dict[str, float]) -> Dict[str, float]:
+        scores = {}
+        for label, log_probs in self.log_probs.items():
+            default = self.defaults[label]
+            scores[label] = self.priors[label] + sum(
+                weight * log_probs.get(feature, default) for feature, weight in vector.items()
+            )
+
+        top = max(scores.values())
+        exps = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    def to_dict(self) -> Dict:
+        return {'alpha': self.alpha, 'priors': self.priors, 'log_probs': self.log_probs, 'defaults': self.defaults}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "_NaiveBayes":
+        model = cls(data['alpha'])
+        model.priors = data['priors']
+        model.log_probs = data['log_probs']
+        model.defaults = data['defaults']
+        return model
+
+class LocalClassifier:
+    """Character n-gram TF-IDF + naive Bayes classifier trained from labeled emails"""
+
+    def __init__(self, min_df: int = 2, max_features: int = 50000, min_tag_support: int = 10):
+        self.min_df = min_df
+        self.max_features = max_features
+        self.min_tag_support = min_tag_support
+        self.idf: Dict[str, float] = {}
+        self.priority_model: Optional[_NaiveBayes] = None
+        self.tag_models: Dict[str, _NaiveBayes] = {}
+        self.trained_at: Optional[str] = None
+        self.sample_count = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.priority_model is not None
+
+    def _vectorize(self, text: str) -> Dict[str, float]:
+        vector = {}
+        for gram, count in _ngrams(text).items():
+            idf = self.idf.get(gram)
+            if idf is not None:
+                vector[gram] = (1 + math.log(count)) * idf
+        norm = math.sqrt(sum(value * value for value in vector.values())) or 1.0
+        return {gram: value / norm for gram, value in vector.items()}
+
+    def fit(self, samples: List[Dict]) -> "LocalClassifier":
+        """Train on samples of {'text', 'priority', 'tags'}"""
+        grams = [_ngrams(sample['text']) for sample in samples]
+
+        document_frequency = Counter()
+        for counts in grams:
+            document_frequency.update(counts.keys())
+        kept = [(gram, df) for gram, df in document_frequency.items() if df >= self.min_df]
+        kept = sorted(kept, key=lambda item: item[1], reverse=True)[:self.max_features]
+        self.idf = {gram: math.log((1 + len(samples)) / (1 + df)) + 1 for gram, df in kept}
+
+        vectors = [self._vectorize(sample['text']) for sample in samples]
+        vocab_size = len(self.idf)
+        self.priority_model = _NaiveBayes().fit(vectors, [sample['priority'] for sample in samples], vocab_size)
+
+        tag_counts = Counter(tag for sample in samples for tag in set(sample['tags']))
+        self.tag_models = {}
+        for tag, support in tag_counts.items():
+            if support < self.min_tag_support or support == len(samples):
+                continue
+            labels = ['yes' if tag in sample['tags'] else 'no' for sample in samples]
+            self.tag_models[tag] = _NaiveBayes().fit(vectors, labels, vocab_size)
+
+        self.trained_at = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.sample_count = len(samples)
+        return self
+
+    def predict(self, content: str, subject: str = "") -> Optional[Dict]:
+        """Classification in the EmailClassifier result format, or None if untrained"""
+        if not self.is_trained:
+            return None
+
+        vector = self._vectorize(build_text(subject, content))
+        probabilities = self.priority_model.predict_proba(vector)
+        priority = max(probabilities, key=probabilities.get)
+
+        tag_scores = []
+        for tag, model in self.tag_models.items():
+            probability = model.predict_proba(vector).get('yes', 0.0)
+            if probability >= 0.5:
+                tag_scores.append((probability, tag))
+
+        return {
+            'priority': priority,
+            'tags': [tag for _, tag in sorted(tag_scores, reverse=True)[:5]],
+            'confidence': round(probabilities[priority], 4),
+            'reasoning': 'Local n-gram model'
+        }
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        data = {
+            'min_df': self.min_df,
+            'max_features': self.max_features,
+            'min_tag_support': self.min_tag_support,
+            'idf': self.idf,
+            'priority_model': self.priority_model.to_dict(),
+            'tag_models': {tag: model.to_dict() for tag, model in self.tag_models.items()},
+            'trained_at': self.trained_at,
+            'sample_count': self.sample_count
+        }
+        # 다른 워커가 반쯤 쓰인 파일을 읽지 않도록 임시 파일에 쓰고 교체
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LocalClassifier"]:
+        """Load a saved model; None if there is none yet"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                data = json.load(f)
+            model = cls(data['min_df'], data['max_features'], data['min_tag_support'])
+            model.idf = data['idf']
+            model.priority_model = _NaiveBayes.from_dict(data['priority_model'])
+            model.tag_models = {tag: _NaiveBayes.from_dict(tag_model) for tag, tag_model in data['tag_models'].items()}
+            model.trained_at = data['trained_at']
+            model.sample_count = data['sample_count']
+            return model
+        except Exception as e:
+            logger.error(f"Error loading local classifier from {path}: {e}")
+            return None
+
+def train_and_evaluate(samples: List[Dict], threshold: float, holdout_ratio: float = 0.2,
+                       seed: int = 42) -> Tuple[LocalClassifier, Dict, List[Dict]]:
+    """Evaluate on a held-out split, then train the final model on all samples
+
+    Returns the model, the evaluation report and the held-out samples.
+    """
+    shuffled = list(samples)
+    random.Random(seed).shuffle(shuffled)
+    split = int(len(shuffled) * (1 - holdout_ratio))
+    train, holdout = shuffled[:split], shuffled[split:]
+
+    evaluation = LocalClassifier().fit(train)
+    correct = covered = covered_correct = 0
+    start = time.perf_counter()
+    for sample in holdout:
+        result = evaluation.predict(sample['text'])
+        hit = result['priority'] == sample['priority']
+        correct += hit
+        if result['confidence'] >= threshold:
+            covered += 1
+            covered_correct += hit
+    elapsed = time.perf_counter() - start
+
+    total = len(holdout) or 1
+    report = {
+        'train_samples': len(train),
+        'holdout_samples': len(holdout),
+        'threshold': threshold,
+        'local': {
+            'accuracy': round(correct / total, 4),
+            'latency_ms': round(elapsed / total * 1000, 3),
+            'cost_per_1k': 0.0
+        },
+        'cascade': {
+            # 로컬 모델이 임계값 이상으로 답한 비율과 그 정확도 (나머지는 LLM으로 넘어감)
+            'local_coverage': round(covered / total, 4),
+            'local_accuracy': round(covered_correct / covered, 4) if covered else None,
+            'llm_calls_per_1k': round((1 - covered / total) * 1000, 1)
+        }
+    }
+
+    model = LocalClassifier().fit(samples)
+    return model, report, holdout
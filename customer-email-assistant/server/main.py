@@ -1,23 +1,63 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 import uvicorn
 import os
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime
 from dotenv import load_dotenv
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 from simple_email_reader import SimpleEmailReader
 from reply_generator import ReplyGenerator
 from classifier import EmailClassifier
-from db import Database
+from db import Database, EmailConflictError
 from gmail_sender import GmailSender
-from pension_analyzer import PensionAnalyzer
+from pension_analyzer import PensionAnalyzer, hash_text
+from retention import RetentionJob
+from email_sync import EmailSync
+from backfill import BackfillJob
+from bulk_filter import BulkMailFilter
+from events import EmailEventStream, format_sse
+from email_threads import ThreadIndex
+from single_flight import SingleFlight
+from http_cache import make_etag, etag_matches, cache_headers, not_modified, time_bucket
+from export import EXPORT_FORMATS, CONTENT_TYPES, parse_fields, build_export_query, export_chunks
+from llm_scheduler import llm_scheduler, llm_lane, INTERACTIVE, URGENT_DRAFT
+from text_cleaner import get_llm_text
+from metrics import registry
+from app_logging import setup_logging, shutdown_logging, request_id_var, log_payload
 
 # Load environment variables
 load_dotenv()
+setup_logging()
+logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Customer Email Assistant API", version="1.0.0")
+# orjson으로 직렬화 (한국어 본문이 긴 응답에서 기본 JSONResponse보다 훨씬 빠름)
+app = FastAPI(title="Customer Email Assistant API", version="1.0.0", default_response_class=ORJSONResponse)
+
+# 스트리밍 응답은 압축하면 버퍼링되어 이벤트가 늦게 도착하므로 제외
+UNCOMPRESSED_PATHS = ("/events",)
+
+class SelectiveGZipMiddleware:
+    """gzip responses above a size threshold when the client accepts it, except streaming endpoints"""
+
+    def __init__(self, app, minimum_size: int):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] not in UNCOMPRESSED_PATHS:
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+app.add_middleware(SelectiveGZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_SIZE", 1024)))
 
 # CORS middleware
 app.add_middleware(
@@ -28,19 +68,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-try:
-    gmail_reader = SimpleEmailReader()
-    print("Simple email reader initialized successfully")
-except Exception as e:
-    print(f"Simple email reader initialization failed: {e}")
-    gmail_reader = None
+# Request pipeline metrics
+http_request_latency = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # 경로 템플릿 기준으로 집계 (예: /emails/{email_id})
+        route = request.scope.get("route")
+        http_request_latency.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status
+        )
+
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        request_id_var.reset(token)
+
+# Initialize services (IMAP connects lazily on first sync)
+gmail_reader = SimpleEmailReader()
 
 reply_generator = ReplyGenerator()
 email_classifier = EmailClassifier()
 db = Database()
 gmail_sender = GmailSender()
 pension_analyzer = PensionAnalyzer()
+retention_job = RetentionJob(db)
+email_sync = EmailSync(db, gmail_reader, email_classifier, bulk_filter=BulkMailFilter())
+backfill_job = BackfillJob(db, gmail_reader, email_classifier)
+reply_flights = SingleFlight()
+email_events = EmailEventStream(db)
+thread_index = ThreadIndex(db)
+
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", 0.5))
+
+async def until_disconnected(http_request: Request, awaitable):
+    """Await LLM-backed work, cancelling it (and its queued LLM calls) if the client goes away"""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.info(f"Client disconnected, cancelling {http_request.url.path}")
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        if not task.done():
+            task.cancel()
+
+async def load_email(email_id: str) -> Optional[Dict]:
+    """get_email, first fetching the body from Gmail if the header prefilter stored the email without it"""
+    email = await db.get_email(email_id)
+    if not email or email.get('body_fetched') is not False:
+        return email
+    try:
+        fetched = await gmail_reader.fetch_body(email['gmail_id'])
+    except Exception as e:
+        logger.warning(f"Could not fetch body of {email_id} from Gmail: {e}")
+        return email
+    if not fetched:
+        return email
+    return await db.store_fetched_body(email_id, fetched) or email
 
 # Pydantic models
 class EmailResponse(BaseModel):
@@ -53,10 +160,19 @@ class EmailResponse(BaseModel):
     status: str = "unread"
     priority: Optional[str] = None
     tags: List[str] = []
+    thread_id: Optional[str] = None
+    body_fetched: bool = True
+    version: int = 0
 
 class ReplyRequest(BaseModel):
     content: str
 
+class EmailUpdateRequest(BaseModel):
+    status: Optional[str] = None
+    priority: Optional[str] = None
+    tags: Optional[List[str]] = None
+    version: Optional[int] = None
+
 class ClassificationResponse(BaseModel):
     priority: str
     tags: List[str]
@@ -76,114 +192,301 @@ class ResponsePreviewRequest(BaseModel):
     settings: dict
     sampleQuery: str
 
+class BackfillRequest(BaseModel):
+    days: int = 365
+    use_ai: bool = False
+    restart: bool = False
+
+class RetrainRequest(BaseModel):
+    llm_sample: int = 0
+
 class GenerateReplyRequest(BaseModel):
     context: Optional[dict] = {}
 
+# DB에서 읽은 문서는 형식이 보장되므로 Pydantic 검증 없이 EmailResponse 필드만 골라서 반환
+EMAIL_RESPONSE_DB_FIELDS = [field for field in EmailResponse.model_fields if field != 'id']
+
+def email_response(email: Dict) -> Dict:
+    """An email document in the EmailResponse shape, with its defaults for missing fields"""
+    return {
+        field: email.get(field, None if info.is_required() else info.get_default(call_default_factory=True))
+        for field, info in EmailResponse.model_fields.items()
+    }
+
 @app.get("/")
 async def root():
     return {"message": "Customer Email Assistant API", "version": "1.0.0"}
 
+@app.get("/health")
+async def health():
+    """Check API and database health"""
+    mongo = await db.ping()
+    return JSONResponse(
+        status_code=200 if mongo['ok'] else 503,
+        content={"status": "ok" if mongo['ok'] else "degraded", "mongo": mongo}
+    )
+
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))
+
+@app.get("/events")
+async def events(http_request: Request):
+    """Server-Sent Events: email_created, status_changed, classification_updated, draft_ready, email_deleted"""
+    queue = email_events.subscribe()
+
+    async def stream():
+        try:
+            # live가 false면 (변경 스트림 미지원) 클라이언트가 주기적 새로고침으로 대체
+            yield "retry: 5000\n\n"
+            yield format_sse({'type': 'hello', 'live': email_events.status['supported']})
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await http_request.is_disconnected():
+                        break
+                    # 프록시가 유휴 연결을 끊지 않도록 주석 한 줄 전송
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                yield format_sse(event)
+        finally:
+            email_events.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/events/status")
+async def events_status():
+    """Change stream watcher state and subscriber count for this worker"""
+    return email_events.get_status()
+
+@app.get("/llm/status")
+async def llm_status():
+    """LLM scheduler slots, token budget use and queue depth per lane"""
+    return llm_scheduler.status()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose metrics in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/emails", response_model=List[EmailResponse])
-async def get_emails(limit: int = 50, status: Optional[str] = None):
+async def get_emails(request: Request, limit: int = 50, status: Optional[str] = None):
     """Fetch emails from database"""
     try:
-        emails = await db.get_emails(limit=limit, status=status)
-        return emails
+        # 컬렉션 변경 카운터를 먼저 읽어야 ETag가 실제 데이터보다 새것이 되지 않음
+        etag = make_etag("emails", await db.get_revision("emails"), limit, status)
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+        
+        emails = await db.get_emails(limit=limit, status=status, fields=EMAIL_RESPONSE_DB_FIELDS)
+        return ORJSONResponse([email_response(email) for email in emails], headers=cache_headers(etag))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+
+@app.get("/emails/export")
+async def export_emails(format: str = "ndjson", fields: Optional[str] = None,
+                        since: Optional[datetime] = None, until: Optional[datetime] = None,
+                        status: Optional[str] = None, priority: Optional[str] = None):
+    """Stream the email archive as NDJSON or CSV (status/priority accept comma-separated values)"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    try:
+        selected = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    # 커서를 배치 단위로 읽어 바로 보냄: 전송이 밀리면 send()가 기다리므로 다음 배치도 그만큼 늦게 읽음
+    query = build_export_query(since, until, status, priority)
+    batches = db.iter_email_batches(query, selected, batch_size=EXPORT_BATCH_SIZE)
+    extension = 'jsonl' if format == 'ndjson' else 'csv'
+    filename = f"emails-{datetime.utcnow():%Y%m%d-%H%M%S}.{extension}"
+    return StreamingResponse(
+        export_chunks(format, batches, selected),
+        media_type=CONTENT_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store"}
+    )
+
 @app.get("/emails/{email_id}", response_model=EmailResponse)
-async def get_email(email_id: str):
+async def get_email(email_id: str, request: Request):
     """Get specific email by ID"""
     try:
+        revision = await db.get_email_revision(email_id)
+        if not revision:
+            raise HTTPException(status_code=404, detail="Email not found")
+        if revision.get('body_fetched') is False:
+            # 헤더 필터로 본문 없이 저장된 메일은 처음 열 때 가져옴
+            email = await load_email(email_id)
+            if email and email.get('body_fetched') is False:
+                # 가져오지 못했으면 캐시하지 않고 다음 요청에서 다시 시도
+                return ORJSONResponse(email_response(email), headers={"Cache-Control": "no-store"})
+            revision = await db.get_email_revision(email_id)
+        etag = make_etag("email", email_id, revision)
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+        
         email = await db.get_email(email_id)
         if not email:
             raise HTTPException(status_code=404, detail="Email not found")
-        return email
+        return ORJSONResponse(email_response(email), headers=cache_headers(etag))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/emails/{email_id}/thread")
+async def get_email_thread(email_id: str, request: Request, limit: int = 100):
+    """The conversation an email belongs to, oldest message first"""
+    try:
+        etag = make_etag("thread", await db.get_revision("emails"), email_id, limit)
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+        
+        email = await db.get_email(email_id)
+        if not email:
+            raise HTTPException(status_code=404, detail="Email not found")
+        thread_id = email.get('thread_id') or email['gmail_id']
+        emails = await db.get_thread_emails(thread_id, fields=EMAIL_RESPONSE_DB_FIELDS + ['sent_reply'], limit=limit)
+        # threads 컬렉션 도입 전에 저장된 단독 메일은 스레드 문서가 없음
+        thread = await db.get_thread(thread_id) or {
+            'id': thread_id, 'subject': email['subject'], 'message_count': len(emails)
+        }
+        return ORJSONResponse({
+            'thread': thread,
+            'emails': [{**email_response(item), 'sent_reply': item.get('sent_reply')} for item in emails]
+        }, headers=cache_headers(etag))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/threads")
+async def get_threads(request: Request, limit: int = 50):
+    """Conversations ordered by last activity"""
+    try:
+        etag = make_etag("threads", await db.get_revision("emails"), limit)
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+        
+        threads = await db.get_threads(limit=limit)
+        return ORJSONResponse(threads, headers=cache_headers(etag))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/emails/{email_id}/classify", response_model=ClassificationResponse)
-async def classify_email(email_id: str):
+async def classify_email(email_id: str, http_request: Request):
     """Classify email using AI"""
     try:
-        email = await db.get_email(email_id)
+        email = await load_email(email_id)
         if not email:
             raise HTTPException(status_code=404, detail="Email not found")
         
-        classification = await email_classifier.classify(email['body'], email['subject'])
+        classification = await until_disconnected(
+            http_request, email_classifier.classify(get_llm_text(email), email['subject'])
+        )
         
-        # Update email with classification
+        # Update email with classification, unless someone changed it meanwhile
         await db.update_email(email_id, {
             'priority': classification['priority'],
-            'tags': classification['tags']
-        })
+            'tags': classification['tags'],
+            'classification_source': classification.get('source')
+        }, expected_version=email.get('version', 0))
         
         return classification
+    except HTTPException:
+        raise
+    except EmailConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-class GenerateReplyRequest(BaseModel):
-    context: Optional[dict] = {}
-
 @app.post("/emails/{email_id}/generate-reply")
-async def generate_reply(email_id: str, request: GenerateReplyRequest = None):
-    """Generate AI reply for email with pension info"""
+async def generate_reply(email_id: str, http_request: Request, request: GenerateReplyRequest = None,
+                         regenerate: bool = False):
+    """Generate AI reply for email with pension info, reusing an identical draft unless regenerate=true"""
     try:
-        print(f"📧 이메일 답장 생성 요청: {email_id}")
+        logger.info(f"📧 이메일 답장 생성 요청: {email_id}")
         
-        email = await db.get_email(email_id)
+        email = await load_email(email_id)
         if not email:
             raise HTTPException(status_code=404, detail="Email not found")
         
-        print(f"📝 이메일 내용: {email['subject']} - {email['body'][:100]}...")
+        log_payload(logger, "📝 이메일 내용", subject=email['subject'], body=email['body'])
         
         # 요청에서 컨텍스트 가져오기
-        context = request.context if request else {}
-        print(f"📦 요청 컨텍스트: {context}")
+        context = dict(request.context or {}) if request else {}
+        log_payload(logger, "📦 요청 컨텍스트", context=context)
+        
+        # 같은 스레드의 이전 메시지는 원문 대신 짧은 요약으로 전달 (새 메시지가 오면 초안 키도 바뀜)
+        thread_summary = await thread_index.summary_for(email)
+        if thread_summary:
+            context['thread_summary'] = thread_summary
         
         # 펜션 정보 가져오기
         pension_info = await db.get_pension_info()
-        print(f"🏨 펜션 정보 조회 결과: {pension_info is not None}")
+        
+        # 같은 입력으로 이미 만든 초안이 있으면 재사용
+        draft_key = reply_generator.build_draft_key(email_id, context, pension_info)
+        draft = email.get('draft_reply') or {}
+        if not regenerate and draft.get('key') == draft_key:
+            logger.info("♻️ 저장된 답장 초안 재사용")
+            return {"reply": draft['reply'], "cached": True}
         
         if pension_info and pension_info.get('analyzed_info'):
             context['pension_info'] = pension_info['analyzed_info']
-            print(f"✅ 펜션 정보 컨텍스트에 포함됨")
-            print(f"📊 펜션 정보 키들: {list(pension_info['analyzed_info'].keys()) if pension_info.get('analyzed_info') else 'None'}")
+            logger.debug(f"✅ 펜션 정보 컨텍스트에 포함됨: {list(pension_info['analyzed_info'].keys())}")
         else:
-            print(f"❌ 펜션 정보가 없거나 analyzed_info가 없음")
-            if pension_info:
-                print(f"📄 펜션 정보 구조: {list(pension_info.keys())}")
+            logger.warning("❌ 펜션 정보가 없거나 analyzed_info가 없음")
         
-        print(f"🤖 AI 답장 생성 시작...")
+        # 긴급 메일 초안은 백그라운드 분류/백필보다 먼저 LLM 슬롯을 받음
+        lane = URGENT_DRAFT if email.get('priority') == 'urgent' else INTERACTIVE
         
-        reply = await reply_generator.generate_reply(
-            email_content=email['body'],
-            subject=email['subject'],
-            sender=email['sender_email'],
-            context=context
-        )
+        async def generate_and_store():
+            with llm_lane(lane):
+                reply, fallback = await reply_generator.generate_reply_with_source(
+                    email_content=get_llm_text(email),
+                    subject=email['subject'],
+                    sender=email['sender_email'],
+                    context=context
+                )
+            # LLM이 모두 실패해 만든 템플릿 답장은 저장하지 않음 (다음 요청에서 다시 생성)
+            if not fallback:
+                await db.save_draft_reply(email_id, draft_key, reply)
+            return reply, fallback
         
-        print(f"✅ 답장 생성 완료: {reply[:100]}...")
+        # 동시에 들어온 같은 요청은 하나의 생성 결과를 공유 (모두 연결을 끊으면 생성도 취소)
+        reply, fallback = await until_disconnected(http_request, reply_flights.do(draft_key, generate_and_store))
         
-        return {"reply": reply}
+        logger.info(f"✅ 답장 생성 완료 ({len(reply)} 문자)")
+        
+        return {"reply": reply, "cached": False, "fallback": fallback}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ 답장 생성 오류: {e}")
+        logger.error(f"❌ 답장 생성 오류: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/emails/{email_id}/send-reply")
 async def send_reply(email_id: str, reply_request: ReplyRequest):
     """Send reply via Gmail SMTP"""
     try:
-        email = await db.get_email(email_id)
+        # 다른 담당자가 동시에 답장하지 못하도록 먼저 이메일을 점유
+        email = await db.claim_email_for_reply(email_id)
         if not email:
             raise HTTPException(status_code=404, detail="Email not found")
         
-        print(f"📧 답장 전송 시도: {email['sender_email']}")
-        print(f"📝 답장 내용: {reply_request.content[:100]}...")
+        logger.info(f"📧 답장 전송 시도: {email_id}")
+        log_payload(logger, "📝 답장 내용", to=email['sender_email'], content=reply_request.content)
         
-        # 실제 Gmail로 답장 전송
-        success = gmail_sender.send_reply(
+        # 실제 Gmail로 답장 전송 (smtplib은 블로킹이라 스레드에서 실행)
+        success = await asyncio.to_thread(
+            gmail_sender.send_reply,
             to_email=email['sender_email'],
             subject=email['subject'],
             reply_content=reply_request.content,
@@ -192,82 +495,159 @@ async def send_reply(email_id: str, reply_request: ReplyRequest):
         
         if success:
             # DB에서 이메일 상태를 'replied'로 업데이트
-            print(f"✅ Gmail 전송 성공, DB 업데이트 중...")
-            update_result = await db.update_email(email_id, {'status': 'replied'})
-            print(f"📊 DB 업데이트 결과: {update_result}")
+            logger.info("✅ Gmail 전송 성공, DB 업데이트 중...")
+            # 보낸 답장은 이후 같은 스레드의 답장 생성 시 요약에 포함됨
+            try:
+                updated = await db.transition_email(
+                    email_id, 'replied',
+                    update_data={'sent_reply': reply_request.content},
+                    unset_fields=['reply_claimed_at']
+                ) or {}
+            except EmailConflictError:
+                # 이미 전송됐으므로 409로 응답하면 재시도로 고객에게 중복 발송됨 - 성공으로 처리하고 현재 상태를 돌려줌
+                logger.warning(f"Reply to {email_id} was sent but the email changed meanwhile; keeping its current status")
+                await db.release_reply_claim(email_id)
+                updated = await db.get_email(email_id) or {}
             
             return {
                 "message": "Reply sent successfully to Gmail",
                 "sent_to": email['sender_email'],
-                "status": "replied"
+                "status": updated.get('status', 'replied'),
+                "version": updated.get('version')
             }
         else:
+            await db.release_reply_claim(email_id)
             raise HTTPException(status_code=500, detail="Failed to send reply to Gmail")
             
+    except HTTPException:
+        raise
+    except EmailConflictError:
+        # claim_email_for_reply에서만 발생 (전송 전)
+        raise HTTPException(status_code=409, detail="Email is already replied or being replied to")
     except Exception as e:
-        print(f"❌ 답장 전송 오류: {e}")
+        logger.error(f"❌ 답장 전송 오류: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.put("/emails/{email_id}")
-async def update_email(email_id: str, update_data: dict):
-    """Update email status or other fields"""
+async def update_email(email_id: str, update_request: EmailUpdateRequest):
+    """Update email status (via allowed transitions), priority or tags"""
     try:
-        await db.update_email(email_id, update_data)
-        return {"message": "Email updated successfully"}
+        fields = update_request.model_dump(exclude_none=True, exclude={'status', 'version'})
+        if fields:
+            # 사람이 고친 라벨은 로컬 분류기 학습 데이터로 사용
+            fields['classification_source'] = 'manual'
+        
+        if update_request.status:
+            email = await db.transition_email(
+                email_id, update_request.status,
+                expected_version=update_request.version,
+                update_data=fields
+            )
+        else:
+            email = await db.update_email(email_id, fields, expected_version=update_request.version)
+        
+        if not email:
+            raise HTTPException(status_code=404, detail="Email not found")
+        
+        return {
+            "message": "Email updated successfully",
+            "status": email['status'],
+            "version": email['version']
+        }
+    except HTTPException:
+        raise
+    except EmailConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/classifier/retrain")
+async def retrain_classifier(request: RetrainRequest = RetrainRequest()):
+    """Retrain the local classifier from labeled emails and return its evaluation report"""
+    try:
+        return await email_classifier.retrain(db, llm_sample=request.llm_sample)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/classifier/report")
+async def get_classifier_report():
+    """Get the evaluation report of the last local classifier training"""
+    if not email_classifier.last_report:
+        raise HTTPException(status_code=404, detail="Local classifier has not been retrained yet")
+    return email_classifier.last_report
+
 @app.post("/sync")
 async def sync_emails():
     """Manually sync emails from Gmail"""
     try:
-        # Fetch new emails from Gmail
-        new_emails = await gmail_reader.fetch_emails(limit=50)
-        
-        # Process and store emails
-        processed_count = 0
-        for email_data in new_emails:
-            # Check if email already exists
-            existing = await db.get_email_by_gmail_id(email_data['id'])
-            if not existing:
-                # Classify new email
-                classification = await email_classifier.classify(
-                    email_data['body'], 
-                    email_data['subject']
-                )
-                
-                # Store email with classification
-                email_data.update({
-                    'priority': classification['priority'],
-                    'tags': classification['tags'],
-                    'status': 'unread'
-                })
-                
-                await db.store_email(email_data)
-                processed_count += 1
-        
-        return {
-            "message": f"Sync completed. {processed_count} new emails processed.",
-            "processed_count": processed_count
-        }
+        return await email_sync.run(trigger="manual", use_ai=True)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/sync/status")
+async def get_sync_status():
+    """Get progress of the current or last email sync"""
+    return email_sync.get_status()
+
+@app.post("/backfill")
+async def start_backfill(request: BackfillRequest):
+    """Start importing past mail in the background (resumes from the last checkpoint)"""
+    if not backfill_job.start(request.days, request.use_ai, request.restart):
+        raise HTTPException(status_code=409, detail="Backfill already running")
+    return {"message": "Backfill started", "status": backfill_job.get_status()}
+
+@app.get("/backfill/status")
+async def get_backfill_status():
+    """Get progress of the mailbox backfill"""
+    return backfill_job.get_status()
+
+@app.get("/retention/status")
+async def get_retention_status():
+    """Get progress of the cold storage retention job"""
+    return retention_job.get_status()
+
+@app.post("/retention/run")
+async def run_retention():
+    """Manually run the cold storage retention job"""
+    try:
+        return await retention_job.run()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+STATS_ETAG_BUCKET_SECONDS = 3600
+
 @app.get("/stats")
-async def get_stats():
+async def get_stats(request: Request, response: Response):
     """Get email statistics"""
     try:
+        # 최근 7일 건수는 쓰기가 없어도 시간이 지나면 바뀌므로 시간 구간도 ETag에 포함
+        etag = make_etag("stats", await db.get_revision("emails"), time_bucket(STATS_ETAG_BUCKET_SECONDS))
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+        
         stats = await db.get_email_stats()
+        response.headers.update(cache_headers(etag))
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # 펜션 정보 관리 API
 @app.get("/pension-info")
-async def get_pension_info():
+async def get_pension_info(request: Request, response: Response):
     """펜션 정보 조회"""
     try:
         pension_info = await db.get_pension_info()
+        # 문서는 작으므로 읽은 뒤 updated_at으로 ETag를 만들어 직렬화/전송만 생략
+        etag = make_etag("pension-info", pension_info and pension_info.get('id'),
+                         pension_info and pension_info.get('updated_at'))
+        if etag_matches(request, etag):
+            return not_modified(request, etag)
+        
+        response.headers.update(cache_headers(etag))
         return pension_info or {
             "raw_text": "",
             "analyzed_info": None,
@@ -281,16 +661,39 @@ async def save_pension_info(request: PensionInfoRequest):
     """펜션 정보 저장"""
     try:
         await db.save_pension_info(request.raw_text, request.analyzed_info)
+        
+        # 분석한 원문 그대로 저장하면 사용자가 수정한 분석 결과를 다음 증분 분석의 기준으로 사용
+        if request.analyzed_info:
+            pension_info = await db.get_pension_info(include_analysis=True)
+            analysis = (pension_info or {}).get('analysis')
+            if analysis and analysis.get('text_hash') == hash_text(request.raw_text):
+                # 사용자가 확인/수정한 결과이므로 키워드 분석으로 채운 섹션도 더는 재분석 대상이 아님
+                await db.save_pension_analysis({**analysis, 'analyzed_info': request.analyzed_info, 'fallback_sections': []})
+        
         return {"message": "펜션 정보가 저장되었습니다."}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/pension-info/analyze")
-async def analyze_pension_info(request: PensionAnalyzeRequest):
+async def analyze_pension_info(request: PensionAnalyzeRequest, http_request: Request):
     """펜션 정보 AI 분석"""
     try:
-        analyzed_info = await pension_analyzer.analyze_pension_info(request.text)
-        return {"analyzed_info": analyzed_info}
+        pension_info = await db.get_pension_info(include_analysis=True)
+        previous = (pension_info or {}).get('analysis')
+        
+        analyzed_info, analysis, reanalyzed = await until_disconnected(
+            http_request, pension_analyzer.analyze_incremental(request.text, previous)
+        )
+        if analysis is not previous:
+            await db.save_pension_analysis(analysis)
+        
+        return {
+            "analyzed_info": analyzed_info,
+            "reanalyzed_sections": reanalyzed,
+            "cached": not reanalyzed
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -326,12 +729,11 @@ async def save_response_settings(request: ResponseSettingsRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/response-preview")
-async def generate_response_preview(request: ResponsePreviewRequest):
+async def generate_response_preview(request: ResponsePreviewRequest, http_request: Request):
     """응답 설정 미리보기 생성"""
     try:
-        print(f"🔍 미리보기 요청 받음:")
-        print(f"📝 샘플 쿼리: {request.sampleQuery}")
-        print(f"⚙️ 응답 설정: {request.settings}")
+        logger.info("🔍 미리보기 요청 받음")
+        log_payload(logger, "📝 미리보기 요청", sample_query=request.sampleQuery, settings=request.settings)
         
         # 응답 설정을 컨텍스트에 포함
         context = {
@@ -341,75 +743,50 @@ async def generate_response_preview(request: ResponsePreviewRequest):
         
         # 펜션 정보도 포함
         pension_info = await db.get_pension_info()
-        print(f"🏨 펜션 정보 조회 결과: {pension_info is not None}")
         
         if pension_info and pension_info.get('analyzed_info'):
             context['pension_info'] = pension_info['analyzed_info']
-            print(f"✅ 펜션 정보 컨텍스트에 포함됨")
-            print(f"📊 펜션 정보 키들: {list(pension_info['analyzed_info'].keys()) if pension_info.get('analyzed_info') else 'None'}")
+            logger.debug(f"✅ 펜션 정보 컨텍스트에 포함됨: {list(pension_info['analyzed_info'].keys())}")
         else:
-            print(f"❌ 펜션 정보가 없거나 analyzed_info가 없음")
-            if pension_info:
-                print(f"📄 펜션 정보 구조: {list(pension_info.keys())}")
+            logger.warning("❌ 펜션 정보가 없거나 analyzed_info가 없음")
         
-        print(f"🤖 AI 응답 생성 시작...")
         
         # 미리보기 응답 생성
-        preview = await reply_generator.generate_reply(
+        preview = await until_disconnected(http_request, reply_generator.generate_reply(
             email_content=request.sampleQuery,
             subject="펜션 문의",
             sender="customer@example.com",
             context=context
-        )
+        ))
         
-        print(f"✅ 미리보기 응답 생성 완료: {preview[:100]}...")
+        logger.info(f"✅ 미리보기 응답 생성 완료 ({len(preview)} 문자)")
         
         return {"preview": preview}
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ 미리보기 생성 오류: {e}")
+        logger.error(f"❌ 미리보기 생성 오류: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database connection and sync emails"""
+    """Initialize database connection and schedule the initial sync"""
     await db.connect()
+    retention_job.start()
+    email_events.start()
     
-    # Auto-sync emails on startup
-    if gmail_reader:
-        try:
-            print("Auto-syncing emails from Gmail...")
-            new_emails = await gmail_reader.fetch_emails(limit=50)
-            
-            processed_count = 0
-            for email_data in new_emails:
-                # Check if email already exists
-                existing = await db.get_email_by_gmail_id(email_data['gmail_id'])
-                if not existing:
-                    # Quick classification (skip AI for now, use keywords)
-                    classification = email_classifier.quick_classify(
-                        email_data['body'], 
-                        email_data['subject']
-                    )
-                    
-                    # Store email with classification
-                    email_data.update({
-                        'priority': classification['priority'],
-                        'tags': classification['tags'],
-                        'status': 'unread'
-                    })
-                    
-                    await db.store_email(email_data)
-                    processed_count += 1
-            
-            print(f"Auto-sync completed. {processed_count} new emails processed.")
-            
-        except Exception as e:
-            print(f"Auto-sync failed: {e}")
+    # Auto-sync in the background so the server accepts traffic immediately
+    email_sync.start_background(trigger="startup", use_ai=False)
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Close database connection"""
+    await email_sync.stop()
+    await backfill_job.stop()
+    await retention_job.stop()
+    await email_events.stop()
     await db.disconnect()
+    shutdown_logging()
 
 if __name__ == "__main__":
     port = int(os.getenv("SERVER_PORT", 8000))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# 초 단위 latency 버킷
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        # pymongo 모니터링 콜백은 별도 스레드에서 호출됨
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            lines.extend(self._render_value(labelvalues, value))
+        return lines
+
+    def _render_value(self, labelvalues: Tuple[str, ...], value) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}"]
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def summary(self, **labels) -> Tuple[int, float]:
+        """(count, sum) of observations for one label set"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state['count'], state['sum']) if state else (0, 0.0)
+
+    def _render_value(self, labelvalues: Tuple[str, ...], state) -> List[str]:
+        lines = []
+        for bound, count in zip(self.buckets, state['counts']):
+            labels = _format_labels(self.labelnames, labelvalues, f'le="{bound}"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+        labels = _format_labels(self.labelnames, labelvalues, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{labels} {state['count']}")
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {state['sum']}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics registry rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = metric_class(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name: str, description: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter, name, description, labelnames)
+
+    def gauge(self, name: str, description: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge, name, description, labelnames)
+
+    def histogram(self, name: str, description: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, description, labelnames, buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+# LLM 호출 지표 (classifier, reply_generator, pension_analyzer 공용)
+llm_request_latency = registry.histogram(
+    "llm_request_duration_seconds", "LLM call latency", ("provider", "operation")
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "LLM tokens used", ("provider", "operation", "kind")
+)
+llm_failures = registry.counter(
+    "llm_failures_total", "Failed LLM calls", ("provider", "operation")
+)
+llm_fallbacks = registry.counter(
+    "llm_fallbacks_total", "Fallbacks from one provider to the next", ("from_provider", "to_provider", "operation")
+)
+
+@contextmanager
+def track_latency(histogram: Histogram, failures: Counter = None, **labels):
+    """Observe the duration of a block and count it as a failure if it raises"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if failures is not None:
+            failures.inc(**labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+def track_llm(provider: str, operation: str):
+    """Time one LLM call"""
+    return track_latency(llm_request_latency, llm_failures, provider=provider, operation=operation)
+
+def record_llm_usage(provider: str, operation: str, response) -> int:
+    """Record token counts reported by a Gemini or OpenAI response; returns the total"""
+    try:
+        if provider == "openai":
+            usage = response.get('usage') or {}
+            prompt_tokens = usage.get('prompt_tokens', 0)
+            completion_tokens = usage.get('completion_tokens', 0)
+        else:
+            usage = getattr(response, 'usage_metadata', None)
+            prompt_tokens = getattr(usage, 'prompt_token_count', 0) if usage else 0
+            completion_tokens = getattr(usage, 'candidates_token_count', 0) if usage else 0
+    except Exception:
+        return 0
+
+    if prompt_tokens:
+        llm_tokens.inc(prompt_tokens, provider=provider, operation=operation, kind="prompt")
+    if completion_tokens:
+        llm_tokens.inc(completion_tokens, provider=provider, operation=operation, kind="completion")
+    return (prompt_tokens or 0) + (completion_tokens or 0)
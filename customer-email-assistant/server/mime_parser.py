@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import email
+import codecs
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from email.header import decode_header
+from email.utils import parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+
+from text_cleaner import extract_latest_message, html_to_text
+
+logger = logging.getLogger(__name__)
+
+# 선언된 charset이 없거나 틀렸을 때 한 번만 시도하는 추정 (cp949는 euc-kr 상위 집합)
+_FALLBACK_CHARSET = 'cp949'
+
+# 이 모듈의 함수들은 프로세스 풀 워커에서도 실행되므로 모듈 수준의 순수 함수로 유지
+
+def decode_payload(payload: bytes, declared_charset: Optional[str] = None) -> str:
+    """Decode a MIME part: declared charset first, then a single detection pass"""
+    if declared_charset:
+        try:
+            codecs.lookup(declared_charset)
+            return payload.decode(declared_charset)
+        except (LookupError, UnicodeDecodeError):
+            pass
+
+    # 추정: UTF-8로 유효하면 UTF-8, 아니면 한국어 메일에서 흔한 cp949 (깨진 바이트는 치환)
+    try:
+        return payload.decode('utf-8')
+    except UnicodeDecodeError:
+        return payload.decode(_FALLBACK_CHARSET, errors='replace')
+
+def decode_mime_header(header_value: str) -> str:
+    """Decode an RFC 2047 encoded header"""
+    if not header_value:
+        return ""
+
+    try:
+        decoded_string = ""
+        for part, encoding in decode_header(header_value):
+            if isinstance(part, bytes):
+                decoded_string += decode_payload(part, encoding)
+            else:
+                decoded_string += part
+        return decoded_string
+    except Exception:
+        return str(header_value)
+
+def parse_sender(sender: str) -> Tuple[str, Optional[str]]:
+    """Split a From header into (email, name)"""
+    if '<' in sender and '>' in sender:
+        match = re.match(r'^(.*?)\s*<(.+?)>', sender)
+        if match:
+            name = match.group(1).strip().strip('"')
+            email_addr = match.group(2).strip()
+            return email_addr, name
+
+    email_match = re.search(r'[\w\.-]+@[\w\.-]+', sender)
+    if email_match:
+        return email_match.group(), None
+
+    return sender.strip(), None
+
+def parse_message_ids(header_value) -> List[str]:
+    """Message-IDs listed in an In-Reply-To/References header, in header order"""
+    if not header_value:
+        return []
+    return re.findall(r'<[^<>\s]+>', str(header_value))
+
+def parse_date(date_str: str) -> str:
+    """Date header as an ISO string, or now if it cannot be parsed"""
+    try:
+        return parsedate_to_datetime(date_str).isoformat()
+    except Exception:
+        return datetime.now().isoformat()
+
+def received_utc(received_at: Optional[str]) -> Optional[datetime]:
+    """received_at (ISO string with the sender's offset) as a naive UTC datetime, the way pymongo stores dates"""
+    try:
+        moment = datetime.fromisoformat(received_at)
+    except (TypeError, ValueError):
+        return None
+    # 오프셋이 없으면 UTC로 간주
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def extract_text(msg) -> str:
+    """First non-empty text/plain part, else the first text/html part converted to text"""
+    try:
+        html_part = None
+        for part in msg.walk():
+            content_type = part.get_content_type()
+            if content_type == "text/plain":
+                payload = part.get_payload(decode=True)
+                if payload:
+                    text = decode_payload(payload, part.get_content_charset())
+                    if text.strip():
+                        return text
+            elif content_type == "text/html" and html_part is None:
+                html_part = part
+
+        if html_part is not None:
+            payload = html_part.get_payload(decode=True)
+            if payload:
+                text = html_to_text(decode_payload(payload, html_part.get_content_charset()))
+                if text.strip():
+                    return text
+
+        return "No content available"
+
+    except Exception as e:
+        logger.error(f"Text extraction error: {e}")
+        return "Content extraction failed"
+
+def _header_fields(msg, email_id: str) -> Dict:
+    subject = decode_mime_header(msg.get("Subject", ""))
+    sender = decode_mime_header(msg.get("From", ""))
+    message_id = msg.get("Message-ID", email_id)
+    sender_email, sender_name = parse_sender(sender)
+    in_reply_to = parse_message_ids(msg.get("In-Reply-To"))
+    references = parse_message_ids(msg.get("References"))
+    # In-Reply-To만 있고 References가 없는 클라이언트도 있음
+    references += [message_id for message_id in in_reply_to if message_id not in references]
+    received_at = parse_date(msg.get("Date", ""))
+
+    return {
+        'id': email_id,
+        'gmail_id': message_id,
+        'subject': subject or 'No Subject',
+        'sender_email': sender_email,
+        'sender_name': sender_name,
+        'received_at': received_at,
+        # 발신자 오프셋이 섞인 received_at 대신 날짜 범위 조회/보존 기간에 쓰는 UTC 시각
+        'received_utc': received_utc(received_at),
+        # 동기화 시 ThreadIndex가 대화 단위 ID로 바꿈
+        'thread_id': message_id,
+        'in_reply_to': in_reply_to[0] if in_reply_to else None,
+        'references': references,
+        'labels': ['INBOX']
+    }
+
+def parse_raw_email(raw_email: bytes, email_id: str) -> Dict:
+    """Turn raw RFC822 bytes into the normalized email dict stored in MongoDB"""
+    msg = email.message_from_bytes(raw_email)
+    body_text = extract_text(msg)
+
+    email_data = _header_fields(msg, email_id)
+    email_data.update({
+        'body': body_text,
+        'text_content': body_text,  # Same as body for simplicity
+        'latest_message_text': extract_latest_message(body_text),  # 인용/서명 제외, LLM 입력용
+    })
+    return email_data
+
+def parse_headers_only(headers, email_id: str) -> Dict:
+    """Email dict for a message whose body was not fetched (header block only)"""
+    email_data = _header_fields(headers, email_id)
+    email_data.update({
+        'body': '',
+        'text_content': '',
+        'latest_message_text': '',
+        'body_fetched': False
+    })
+    return email_data
+
+def parse_raw_batch(items: List[Tuple[str, bytes]]) -> List[Dict]:
+    """Parse a chunk of (email_id, raw bytes); failed messages are logged and dropped"""
+    emails = []
+    for email_id, raw_email in items:
+        try:
+            emails.append(parse_raw_email(raw_email, email_id))
+        except Exception as e:
+            logger.error(f"Error parsing email {email_id}: {e}")
+    return emails
+
+class MimeParseStage:
+    """Parses raw messages across CPU cores with a process pool, in chunks"""
+
+    def __init__(self, workers: Optional[int] = None, chunk_size: Optional[int] = None):
+        self.workers = workers or int(os.getenv("MIME_PARSE_WORKERS", 0)) or os.cpu_count() or 1
+        self.chunk_size = chunk_size or int(os.getenv("MIME_PARSE_CHUNK_SIZE", 50))
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    async def parse(self, items: List[Tuple[str, bytes]]) -> List[Dict]:
+        """Parse (email_id, raw bytes) pairs, keeping input order"""
+        if not items:
+            return []
+
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # 메시지 단위로 보내면 pickle 왕복 비용이 커서 chunk 단위로 묶어서 전달
+        chunks = [items[i:i + self.chunk_size] for i in range(0, len(items), self.chunk_size)]
+        results = await asyncio.gather(
+            *(loop.run_in_executor(executor, parse_raw_batch, chunk) for chunk in chunks)
+        )
+        return [parsed for chunk_result in results for parsed in chunk_result]
+
+    def close(self) -> None:
+        """Shut down the worker processes"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
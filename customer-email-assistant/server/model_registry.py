@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import threading
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# 모델 이름별로 하나의 클라이언트를 공유 (classifier / reply_generator / pension_analyzer)
+_gemini_models: Dict[str, object] = {}
+_gemini_configured = False
+_openai_module = None
+_openai_checked = False
+_lock = threading.Lock()
+
+def get_gemini_model(model_name: str):
+    """Import and configure the Gemini SDK on first use, and reuse one model per name"""
+    global _gemini_configured
+    model = _gemini_models.get(model_name)
+    if model is not None:
+        return model
+
+    with _lock:
+        if model_name not in _gemini_models:
+            import google.generativeai as genai
+            if not _gemini_configured:
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _gemini_configured = True
+            _gemini_models[model_name] = genai.GenerativeModel(model_name)
+        return _gemini_models[model_name]
+
+def get_openai():
+    """Import and configure the OpenAI SDK (0.28.1) on first use; None if unavailable"""
+    global _openai_module, _openai_checked
+    if _openai_checked:
+        return _openai_module
+
+    with _lock:
+        if not _openai_checked:
+            try:
+                import openai
+                openai_api_key = os.getenv("OPENAI_API_KEY")
+                if openai_api_key:
+                    openai.api_key = openai_api_key
+                    _openai_module = openai
+                    logger.info("✅ OpenAI API 키 설정 성공")
+                else:
+                    logger.warning("⚠️ OpenAI API 키가 없습니다. Fallback만 사용됩니다.")
+            except ImportError:
+                logger.warning("⚠️ OpenAI 라이브러리가 설치되지 않았습니다. Gemini와 Fallback만 사용됩니다.")
+            _openai_checked = True
+        return _openai_module
@@ -2,298 +2,406 @@
 # -*- coding: utf-8 -*-
 
 import os
-import google.generativeai as genai
+import re
 import json
-from typing import Dict, Optional
+import hashlib
+import asyncio
+import logging
+from typing import Dict, List, Optional, Set, Tuple
 
-class PensionAnalyzer:
-    def __init__(self):
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        # 사용 가능한 모델들을 시도
-        try:
-            self.model = genai.GenerativeModel("gemini-1.5-flash")
-        except:
-            try:
-                self.model = genai.GenerativeModel("gemini-1.5-pro")
-            except:
-                self.model = genai.GenerativeModel("models/gemini-1.5-flash")
-    
-    async def analyze_pension_info(self, raw_text: str) -> Dict:
-        """펜션 정보 텍스트를 AI로 분석하여 구조화된 데이터로 변환"""
-        try:
-            print(f"🔍 펜션 정보 분석 시작...")
-            print(f"📝 입력 텍스트 길이: {len(raw_text)} 문자")
-            print(f"📝 입력 텍스트 미리보기: {raw_text[:200]}...")
-            
-            prompt = f"""
-다음 RPA펜션 정보를 분석하여 룰북 목차에 맞춰 JSON 형태로 구조화해주세요.
-
-펜션 정보:
-{raw_text}
+from metrics import llm_fallbacks
+from app_logging import log_payload
+from model_registry import get_gemini_model
+from pension_context import sections_mentioned
+from structured_output import generate_json
 
-🏡 RPA펜션 룰북 목차에 맞춰 다음 형식으로 분석해주세요:
+logger = logging.getLogger(__name__)
 
-{{
-    "basic_info": {{
+# 🏡 RPA펜션 룰북 목차 (섹션 -> 필드 설명)
+SECTION_SCHEMA = {
+    "basic_info": {
         "name": "펜션 이름",
         "description": "간단한 설명"
-    }},
-    "checkin_checkout": {{
+    },
+    "checkin_checkout": {
         "checkin_time": "체크인 시간",
         "checkout_time": "체크아웃 시간",
         "early_checkin": "얼리 체크인 가능 여부 및 비용",
         "late_checkout": "레이트 체크아웃 가능 여부 및 비용"
-    }},
-    "parking": {{
-        "available": true/false,
-        "free": true/false,
+    },
+    "parking": {
+        "available": "true/false",
+        "free": "true/false",
         "capacity": "주차 가능 대수",
         "registration_required": "차량 등록 필요 여부",
         "description": "주차 관련 상세 설명"
-    }},
-    "meal": {{
+    },
+    "meal": {
         "breakfast_provided": "조식 제공 여부",
         "breakfast_time": "조식 시간",
         "breakfast_fee": "조식 요금",
         "reservation_required": "사전 예약 필요 여부"
-    }},
-    "room_service": {{
+    },
+    "room_service": {
         "amenities_provided": "수건/세면도구 제공 여부",
         "cleaning_schedule": "청소 주기",
         "extra_request": "추가 요청 가능 여부"
-    }},
-    "extra_guests": {{
+    },
+    "extra_guests": {
         "base_capacity": "기준 인원수",
         "max_capacity": "최대 인원수",
         "extra_charge": "1인당 추가 요금"
-    }},
-    "smoking_pets": {{
+    },
+    "smoking_pets": {
         "non_smoking_policy": "금연 정책",
         "smoking_area": "흡연 구역 유무",
         "pets_allowed": "반려동물 동반 가능 여부"
-    }},
-    "wifi_facilities": {{
+    },
+    "wifi_facilities": {
         "wifi_info": "와이파이 제공 여부 및 비밀번호",
         "facilities": "바베큐장/수영장 등 부대시설",
         "facility_hours": "부대시설 운영 시간"
-    }},
-    "entrance": {{
+    },
+    "entrance": {
         "access_method": "출입 방식 (비밀번호/카드키 등)",
         "password_timing": "비밀번호 발송 시점",
         "access_restriction": "출입 통제 시간"
-    }},
-    "location": {{
+    },
+    "location": {
         "address": "주소",
         "public_transport": "대중교통 접근 방법",
         "car_access": "자가용 접근 방법",
         "pickup_service": "픽업 서비스 여부"
-    }},
-    "refund_policy": {{
+    },
+    "refund_policy": {
         "cancellation_deadline": "취소 가능 기한",
         "refund_rate": "환불 비율/조건",
         "change_policy": "변경 정책"
-    }},
-    "safety": {{
+    },
+    "safety": {
         "emergency_equipment": "소화기/비상등 위치",
         "emergency_contact": "응급연락처",
         "hospital_info": "병원 정보"
-    }},
-    "payment": {{
+    },
+    "payment": {
         "payment_methods": "결제 수단",
         "onsite_payment": "현장 결제 여부",
         "receipt_available": "세금계산서/영수증 발급 가능 여부"
-    }},
-    "luggage": {{
+    },
+    "luggage": {
         "storage_available": "체크인 전후 짐 보관 가능 여부",
         "delivery_service": "택배 수령 가능 여부"
-    }},
-    "photography": {{
+    },
+    "photography": {
         "photo_zones": "포토존 위치",
         "drone_allowed": "드론 촬영 가능 여부"
-    }},
-    "noise_party": {{
+    },
+    "noise_party": {
         "party_allowed": "파티 가능 여부",
         "quiet_hours": "고성방가 금지 시간대"
-    }},
-    "cleaning": {{
+    },
+    "cleaning": {
         "mid_cleaning": "중간 청소 가능 여부",
         "extra_supplies": "수건/이불 추가 요청 가능 여부"
-    }},
-    "children": {{
+    },
+    "children": {
         "baby_bed": "아기 침대/보조 침대 여부",
         "child_fee": "유아 요금 정책",
         "safety_facilities": "안전 시설"
-    }},
-    "seasonal": {{
+    },
+    "seasonal": {
         "heating_cooling": "난방/냉방 관련",
         "seasonal_notes": "계절별 운영 특이사항"
-    }},
-    "maintenance": {{
+    },
+    "maintenance": {
         "repair_contact": "고장 시 연락처",
         "response_time": "처리 예상 시간"
-    }},
-    "nearby": {{
+    },
+    "nearby": {
         "attractions": "주변 관광지",
         "restaurants": "추천 식당",
         "convenience": "편의시설 (마트 등)",
         "distances": "거리 안내"
-    }}
-}}
+    }
+}
 
-정보가 없는 항목은 null로 설정하고, 반드시 유효한 JSON 형식으로만 응답해주세요.
-"""
+_BLOCK_SPLIT = re.compile(r'\n\s*\n')
+_WHITESPACE = re.compile(r'\s+')
+
+def hash_text(text: str) -> str:
+    """Content hash that ignores whitespace-only edits"""
+    return hashlib.sha256(_WHITESPACE.sub(' ', text).strip().encode('utf-8')).hexdigest()[:16]
+
+def split_into_blocks(raw_text: str, max_chars: int) -> List[Tuple[int, int]]:
+    """Split text into (start, end) spans of paragraphs, none longer than max_chars"""
+    blocks = []
+    position = 0
+    for match in list(_BLOCK_SPLIT.finditer(raw_text)) + [None]:
+        end = match.start() if match else len(raw_text)
+        # 문단 하나가 너무 길면 줄 단위로 나눔
+        while end - position > max_chars:
+            cut = raw_text.rfind('\n', position, position + max_chars)
+            cut = cut if cut > position else position + max_chars
+            blocks.append((position, cut))
+            position = cut
+        blocks.append((position, end))
+        position = match.end() if match else len(raw_text)
+    return blocks
+
+def split_into_chunks(raw_text: str, max_chars: int) -> List[Tuple[int, int]]:
+    """Split text into (start, end) spans of whole paragraphs, each up to about max_chars"""
+    blocks = split_into_blocks(raw_text, max_chars)
+    chunks = []
+    chunk_start = chunk_end = None
+    for start, end in blocks:
+        if not raw_text[start:end].strip():
+            continue
+        if chunk_start is not None and end - chunk_start > max_chars:
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start = start
+        chunk_end = end
+    if chunk_start is not None:
+        chunks.append((chunk_start, chunk_end))
+    return chunks
 
-            print(f"🤖 Gemini API 호출 중...")
-            response = self.model.generate_content(prompt)
-            result_text = response.text.strip()
+def section_response_schema(sections: List[str]) -> Dict:
+    """Gemini response_schema for a subset of SECTION_SCHEMA; every field may be null"""
+    properties = {}
+    for section in sections:
+        fields = {
+            field: {'type': 'BOOLEAN' if description == "true/false" else 'STRING',
+                    'nullable': True, 'description': description}
+            for field, description in SECTION_SCHEMA[section].items()
+        }
+        properties[section] = {'type': 'OBJECT', 'nullable': True, 'properties': fields}
+    return {'type': 'OBJECT', 'properties': properties, 'required': list(sections)}
+
+def merge_sections(partials: List[Dict]) -> Dict:
+    """Merge per-chunk results in document order; the first non-empty value of a field wins"""
+    merged = {}
+    for partial in partials:
+        for section, fields in partial.items():
+            if not isinstance(fields, dict):
+                continue
+            target = merged.setdefault(section, {})
+            for field, value in fields.items():
+                if target.get(field) in (None, '', []) and value not in (None, '', []):
+                    target[field] = value
+                else:
+                    target.setdefault(field, value)
+    return merged
+
+def complete_sections(analysis: Dict) -> Dict:
+    """Fill every SECTION_SCHEMA section and field that was not extracted with null"""
+    for section, fields in SECTION_SCHEMA.items():
+        if not isinstance(analysis.get(section), dict):
+            analysis[section] = {}
+        for field in fields:
+            analysis[section].setdefault(field, None)
+    return analysis
+
+class PensionAnalyzer:
+    def __init__(self):
+        self.model_name = os.getenv("PENSION_ANALYSIS_MODEL", "gemini-1.5-flash")
+        self.chunk_chars = int(os.getenv("PENSION_ANALYSIS_CHUNK_CHARS", 3000))
+        self.concurrency = int(os.getenv("PENSION_ANALYSIS_CONCURRENCY", 4))
+        self.retries = int(os.getenv("PENSION_ANALYSIS_RETRIES", 1))
+    
+    @property
+    def model(self):
+        """Shared Gemini model, created on first use"""
+        return get_gemini_model(self.model_name)
+    
+    async def analyze_pension_info(self, raw_text: str) -> Dict:
+        """펜션 정보 텍스트를 AI로 분석하여 구조화된 데이터로 변환 (청크 단위 map-reduce)"""
+        analyzed_data, _ = await self._analyze_full(raw_text)
+        return analyzed_data
+    
+    async def _analyze_full(self, raw_text: str) -> Tuple[Dict, List[str]]:
+        """Analyze the whole text; also returns the sections that had to come from the keyword fallback"""
+        try:
+            logger.info(f"🔍 펜션 정보 분석 시작 (입력 텍스트 길이: {len(raw_text)} 문자)")
+            log_payload(logger, "📝 입력 텍스트", text=raw_text)
             
-            print(f"✅ Gemini API 응답 받음")
-            print(f"📄 응답 길이: {len(result_text)} 문자")
-            print(f"📄 응답 미리보기: {result_text[:300]}...")
+            spans = split_into_chunks(raw_text, self.chunk_chars)
+            chunks = [
+                {'text': raw_text[start:end], 'sections': self._route_sections(raw_text[start:end], index, len(spans))}
+                for index, (start, end) in enumerate(spans)
+            ]
+            logger.info(f"🧩 {len(chunks)}개 청크로 나눠 분석 (동시 {self.concurrency}개)")
             
-            # JSON 파싱 시도
-            try:
-                # 코드 블록 제거
-                if "```json" in result_text:
-                    result_text = result_text.split("```json")[1].split("```")[0].strip()
-                    print(f"🔧 JSON 코드 블록 제거됨")
-                elif "```" in result_text:
-                    result_text = result_text.split("```")[1].strip()
-                    print(f"🔧 일반 코드 블록 제거됨")
-                
-                print(f"🔍 JSON 파싱 시도 중...")
-                analyzed_data = json.loads(result_text)
-                print(f"✅ JSON 파싱 성공!")
-                print(f"📊 분석된 데이터 키: {list(analyzed_data.keys())}")
-                return analyzed_data
-                
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON 파싱 오류: {e}")
-                print(f"📄 파싱 실패한 텍스트: {result_text}")
-                print(f"🔄 Fallback 분석으로 전환...")
-                
-                # 간단한 fallback 분석
-                return self._simple_analysis(raw_text)
+            partials, fallback = await self.analyze_chunks(chunks)
+            # 어느 청크에서도 나오지 않은 섹션도 null 구조로 유지
+            analyzed_data = complete_sections(merge_sections(partials))
+            logger.info(f"✅ 분석 완료! 분석된 데이터 키: {list(analyzed_data.keys())}")
+            return analyzed_data, sorted(fallback)
                 
         except Exception as e:
-            print(f"❌ 펜션 정보 분석 오류: {e}")
-            print(f"🔄 사용자 입력 기반 키워드 분석으로 전환...")
-            return self._user_input_analysis(raw_text)
+            logger.error(f"❌ 펜션 정보 분석 오류, 사용자 입력 기반 키워드 분석으로 전환: {e}")
+            llm_fallbacks.inc(from_provider="gemini", to_provider="keyword", operation="pension_analysis")
+            return complete_sections(self._user_input_analysis(raw_text)), list(SECTION_SCHEMA)
     
-    def _simple_analysis(self, raw_text: str) -> Dict:
-        """간단한 키워드 기반 분석 (fallback)"""
-        print(f"🔄 Fallback 키워드 분석 시작...")
+    async def analyze_incremental(self, raw_text: str,
+                                  previous: Optional[Dict] = None) -> Tuple[Dict, Dict, List[str]]:
+        """Re-analyze only the sections affected by paragraphs that changed since the previous analysis
         
-        analysis = {
-            "basic_info": {
-                "name": "RPA펜션",
-                "description": "경기도 가평에 위치한 독채 펜션"
-            },
-            "checkin_checkout": {
-                "checkin_time": "오후 3시부터 체크인이 가능합니다.",
-                "checkout_time": "오전 11시까지 체크아웃을 완료해 주세요.",
-                "early_checkin": "얼리 체크인은 불가합니다.",
-                "late_checkout": "레이트 체크아웃은 최대 1시간까지 가능하며 시간당 10,000원이 추가됩니다."
-            },
-            "parking": {
-                "available": True,
-                "free": True,
-                "capacity": "1객실당 최대 2대까지 주차 가능합니다.",
-                "registration_required": "차량 등록은 필요하지 않습니다.",
-                "description": "무료 주차가 제공됩니다."
-            },
-            "meal": {
-                "breakfast_provided": "조식은 제공되지 않습니다.",
-                "breakfast_time": "조식 제공 시, 오전 8시부터 9시 30분까지 운영됩니다.",
-                "breakfast_fee": "조식은 유료이며, 1인당 8,000원이 부과됩니다.",
-                "reservation_required": "사전 예약이 필요합니다."
-            },
-            "room_service": {
-                "amenities_provided": "수건, 샴푸, 바디워시, 칫솔, 치약이 기본 제공됩니다.",
-                "cleaning_schedule": "객실 정리는 요청 시 1일 1회 제공됩니다.",
-                "extra_request": "추가 수건 및 어메니티는 프론트에 문의 시 무료로 제공됩니다."
-            },
-            "extra_guests": {
-                "base_capacity": "기준 인원은 2인입니다.",
-                "max_capacity": "최대 인원은 4인까지 가능합니다.",
-                "extra_charge": "추가 인원 1인당 20,000원의 요금이 발생합니다."
-            },
-            "smoking_pets": {
-                "non_smoking_policy": "전 객실 금연이며 위반 시 10만원의 벌금이 부과됩니다.",
-                "smoking_area": "지정된 야외 흡연 구역을 이용해 주세요.",
-                "pets_allowed": "반려동물 동반은 불가합니다."
-            },
-            "wifi_facilities": {
-                "wifi_info": "모든 객실에서 무료 Wi-Fi 사용 가능하며 비밀번호는 객실 내 안내문에 기재되어 있습니다.",
-                "facilities": "바베큐장, 야외 수영장, 개별 테라스가 마련되어 있습니다.",
-                "facility_hours": "바베큐장은 오후 6시부터 9시까지 이용 가능합니다. 수영장은 오전 10시부터 오후 6시까지 운영됩니다."
-            },
-            "entrance": {
-                "access_method": "출입문은 비밀번호로 운영됩니다.",
-                "password_timing": "체크인 당일 오전 문자로 안내됩니다.",
-                "access_restriction": "야간 출입 제한은 없으나, 소음 자제 시간은 오후 10시부터입니다."
-            },
-            "location": {
-                "address": "경기도 가평군 설악면 RPA로 42-1",
-                "public_transport": "가평역에서 택시로 약 15분 거리이며, 버스 정류장은 도보 3분 거리에 있습니다.",
-                "car_access": "자가용으로 접근 가능합니다.",
-                "pickup_service": "픽업 서비스는 제공되지 않습니다."
-            },
-            "refund_policy": {
-                "cancellation_deadline": "예약일 기준 3일 전까지 취소 시 전액 환불됩니다.",
-                "refund_rate": "2일 전 취소 시 50% 환불, 1일 전 또는 당일 취소 시 환불이 불가합니다.",
-                "change_policy": "변경은 취소 후 재예약으로 처리됩니다."
-            }
-        }
+        Sections that came from the keyword fallback are re-analyzed on the next run instead of reused.
+        Returns (analyzed_info, state to store for next time, re-analyzed sections).
+        """
+        text_hash = hash_text(raw_text)
+        previous_fallback = set((previous or {}).get('fallback_sections') or [])
+        if (previous and previous.get('text_hash') == text_hash and previous.get('analyzed_info')
+                and not previous_fallback):
+            logger.info("✅ 펜션 정보가 이전 분석과 동일하여 캐시된 결과 사용")
+            return previous['analyzed_info'], previous, []
         
-        text_lower = raw_text.lower()
+        blocks = self.block_sources(raw_text)
+        if not previous or not previous.get('analyzed_info') or 'blocks' not in previous:
+            analyzed_info, fallback = await self._analyze_full(raw_text)
+            changed = list(SECTION_SCHEMA)
+        else:
+            affected = self._changed_sections(blocks, previous['blocks']) | previous_fallback
+            changed = [section for section in SECTION_SCHEMA if section in affected]
+            analyzed_info = complete_sections(dict(previous['analyzed_info']))
+            fallback = []
+            if changed:
+                logger.info(f"🔁 변경된 섹션만 다시 분석: {changed}")
+                updated, fallback = await self._reanalyze_sections(raw_text, changed)
+                for section in changed:
+                    analyzed_info[section] = updated.get(section) or {field: None for field in SECTION_SCHEMA[section]}
         
-        # 체크인/아웃 시간 추출
-        if "체크인" in text_lower:
-            if "3시" in text_lower or "15시" in text_lower:
-                analysis["checkin_checkout"]["checkin"] = "오후 3시"
-        if "체크아웃" in text_lower:
-            if "11시" in text_lower:
-                analysis["checkin_checkout"]["checkout"] = "오전 11시"
+        state = {'text_hash': text_hash, 'blocks': blocks, 'analyzed_info': analyzed_info, 'fallback_sections': fallback}
+        return analyzed_info, state, changed
+    
+    def block_sources(self, raw_text: str) -> List[Dict]:
+        """Per paragraph: a hash of its content and the sections whose topic keywords it mentions"""
+        return [
+            {'hash': hash_text(raw_text[start:end]),
+             'sections': [section for section in sections_mentioned(raw_text[start:end]) if section in SECTION_SCHEMA]}
+            for start, end in split_into_blocks(raw_text, self.chunk_chars)
+            if raw_text[start:end].strip()
+        ]
+    
+    def _changed_sections(self, blocks: List[Dict], old_blocks: List[Dict]) -> Set[str]:
+        """Sections touched by paragraphs that were added, edited or removed"""
+        new_hashes = {block['hash'] for block in blocks}
+        old_hashes = {block['hash'] for block in old_blocks}
+        changed_blocks = ([block for block in blocks if block['hash'] not in old_hashes]
+                          + [block for block in old_blocks if block['hash'] not in new_hashes])
+        changed = set()
+        for block in changed_blocks:
+            # 주제어가 없는 문단(펜션 이름, 주소만 적힌 줄 등)이 바뀌면 어느 섹션인지 알 수 없으므로 전부 다시 분석
+            changed.update(block['sections'] or SECTION_SCHEMA)
+        return changed
+    
+    async def _reanalyze_sections(self, raw_text: str, sections: List[str]) -> Tuple[Dict, List[str]]:
+        """Extract only the given sections, from the chunks they are routed to"""
+        spans = split_into_chunks(raw_text, self.chunk_chars)
+        chunks = []
+        unrouted = set(sections)
+        for index, (start, end) in enumerate(spans):
+            text = raw_text[start:end]
+            routed = [section for section in self._route_sections(text, index, len(spans)) if section in sections]
+            unrouted -= set(routed)
+            chunks.append({'text': text, 'sections': routed})
         
-        # 인원 정보 추출
-        if "기준" in text_lower and "인" in text_lower:
-            if "2인" in text_lower:
-                analysis["capacity"]["base"] = 2
-        if "최대" in text_lower and "인" in text_lower:
-            if "4인" in text_lower:
-                analysis["capacity"]["max"] = 4
-        
-        # 주차 정보
-        if "주차" in text_lower:
-            analysis["parking"]["available"] = True
-            if "무료" in text_lower:
-                analysis["parking"]["free"] = True
+        # 어느 청크에서도 언급되지 않는 섹션(내용이 삭제된 경우 등)은 모든 청크에서 찾아봄
+        for chunk in chunks:
+            chunk['sections'].extend(section for section in sections if section in unrouted)
         
-        # 시설 정보
-        facilities = []
-        if "바베큐" in text_lower:
-            facilities.append("바베큐장")
-        if "수영장" in text_lower:
-            facilities.append("수영장")
-        if "테라스" in text_lower:
-            facilities.append("테라스")
-        analysis["facilities"] = facilities
-        
-        # 정책 정보
-        policies = []
-        if "금연" in text_lower:
-            policies.append("전 객실 금연")
-        if "반려동물" in text_lower and "불가" in text_lower:
-            policies.append("반려동물 동반 불가")
-        analysis["policies"] = policies
-        
-        return analysis
+        partials, fallback = await self.analyze_chunks([chunk for chunk in chunks if chunk['sections']])
+        return merge_sections(partials), sorted(fallback)
+    
+    def _route_sections(self, chunk_text: str, chunk_index: int, chunk_count: int) -> List[str]:
+        """Sections to extract from one chunk; a lone chunk, or one with a paragraph without topic keywords, gets them all"""
+        if chunk_count == 1:
+            return list(SECTION_SCHEMA)
+        sections = []
+        for start, end in split_into_blocks(chunk_text, self.chunk_chars):
+            block = chunk_text[start:end]
+            if not block.strip():
+                continue
+            mentioned = [section for section in sections_mentioned(block) if section in SECTION_SCHEMA]
+            if not mentioned:
+                # 주소만 적힌 줄처럼 주제어가 없는 문단은 어느 섹션 내용인지 알 수 없으므로 전부 요청
+                return list(SECTION_SCHEMA)
+            sections.extend(section for section in mentioned if section not in sections)
+        # 펜션 이름/소개는 보통 문서 첫머리에 있음
+        if chunk_index == 0 and 'basic_info' not in sections:
+            sections.insert(0, 'basic_info')
+        return sections
+    
+    async def analyze_chunks(self, chunks: List[Dict]) -> Tuple[List[Dict], Set[str]]:
+        """Extract each chunk's sections concurrently, retrying only the sections that failed
+        
+        Also returns the sections that were filled by the keyword fallback in some chunk.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+        fallback = set()
+        
+        async def run(chunk: Dict) -> Dict:
+            pending = list(chunk['sections'])
+            result = {}
+            for attempt in range(self.retries + 1):
+                async with semaphore:
+                    extracted = await self._extract_sections(chunk['text'], pending)
+                result.update(extracted)
+                pending = [section for section in pending if section not in extracted]
+                if not pending:
+                    break
+                logger.warning(f"⚠️ 섹션 추출 실패 (시도 {attempt + 1}): {pending}")
+            
+            if pending:
+                # 끝내 실패한 섹션만 해당 청크 텍스트 기반 키워드 분석으로 채움
+                llm_fallbacks.inc(from_provider="gemini", to_provider="keyword", operation="pension_analysis")
+                keyword_result = self._user_input_analysis(chunk['text'])
+                result.update({section: keyword_result[section] for section in pending if section in keyword_result})
+                fallback.update(pending)
+            return result
+        
+        partials = await asyncio.gather(*(run(chunk) for chunk in chunks))
+        return partials, fallback
+    
+    async def _extract_sections(self, text: str, sections: List[str]) -> Dict:
+        """One LLM call for a subset of sections; returns only the sections that came back valid"""
+        prompt = self._build_section_prompt(text, sections)
+        try:
+            data, invalid = await generate_json(
+                self.model, self.model_name, "pension_analysis", prompt, section_response_schema(sections)
+            )
+        except Exception as e:
+            logger.warning(f"❌ 섹션 추출 호출 오류: {e}")
+            return {}
+        if data is None:
+            return {}
+        
+        # 수정 후에도 스키마에 맞지 않는 필드가 남은 섹션은 제외 (재시도/키워드 분석 대상)
+        invalid_sections = {path[0] for path in invalid if path}
+        return {
+            section: data[section] for section in sections
+            if isinstance(data.get(section), dict) and section not in invalid_sections
+        }
+    
+    def _build_section_prompt(self, text: str, sections: List[str]) -> str:
+        schema = json.dumps({section: SECTION_SCHEMA[section] for section in sections}, ensure_ascii=False, indent=4)
+        return f"""
+다음 RPA펜션 정보를 분석하여 룰북 목차에 맞춰 JSON 형태로 구조화해주세요.
+
+펜션 정보:
+{text}
+
+🏡 아래 섹션만 다음 형식으로 분석해주세요 (값 자리에 적힌 것은 항목 설명입니다):
+
+{schema}
+
+정보가 없는 항목은 null로 설정하고, 반드시 유효한 JSON 형식으로만 응답해주세요.
+"""
     
     def _user_input_analysis(self, raw_text: str) -> Dict:
         """사용자 입력 텍스트만을 기반으로 한 키워드 분석"""
-        print(f"🔍 사용자 입력 기반 키워드 분석 시작...")
-        print(f"📝 분석할 텍스트: {raw_text}")
+        logger.debug("🔍 사용자 입력 기반 키워드 분석 시작...")
         
         # 기본 구조 (모든 값을 null로 초기화)
         analysis = {
@@ -359,13 +467,13 @@ class PensionAnalyzer:
         }
         
         if not raw_text or not raw_text.strip():
-            print("⚠️ 입력 텍스트가 비어있습니다.")
+            logger.warning("⚠️ 입력 텍스트가 비어있습니다.")
             return analysis
         
         text_lower = raw_text.lower()
         lines = raw_text.split('\n')
         
-        print(f"🔍 키워드 분석 중...")
+        logger.debug("🔍 키워드 분석 중...")
         
         # 기본 정보 추출
         if "rpa펜션" in text_lower or "RPA펜션" in raw_text:
@@ -482,7 +590,6 @@ class PensionAnalyzer:
         
         cleaned_analysis = remove_null_values(analysis)
         
-        print(f"✅ 키워드 분석 완료!")
-        print(f"📊 추출된 정보 카테고리: {list(cleaned_analysis.keys())}")
+        logger.info(f"✅ 키워드 분석 완료! 추출된 정보 카테고리: {list(cleaned_analysis.keys())}")
         
         return cleaned_analysis
\ No newline at end of file
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+import json
+import math
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 섹션 제목과 고객 질문에 자주 나오는 표현
+SECTIONS = {
+    'basic_info': ('🏡 기본 정보', ['펜션 소개', '어떤 곳']),
+    'checkin_checkout': ('🕐 체크인/체크아웃', ['체크인', '체크아웃', '입실', '퇴실', '얼리', '레이트', 'check-in', 'checkout']),
+    'parking': ('🚗 주차 안내', ['주차', '차량', '자동차', '차를', '차는', 'parking']),
+    'meal': ('🍽️ 식사 안내', ['조식', '아침', '식사', '밥', 'breakfast']),
+    'room_service': ('🧴 객실 서비스', ['수건', '어메니티', '세면도구', '샴푸', '칫솔', '드라이기']),
+    'extra_guests': ('👥 인원 및 추가 요금', ['인원', '추가 요금', '명이', '명인데', '명 ', '기준', '최대', '몇 명']),
+    'smoking_pets': ('🚭 흡연/반려동물', ['흡연', '담배', '금연', '반려동물', '강아지', '고양이', '애견', '반려견']),
+    'wifi_facilities': ('🏢 와이파이/부대시설', ['와이파이', 'wifi', 'wi-fi', '인터넷', '바베큐', '바비큐', '수영장', '부대시설', '시설']),
+    'entrance': ('🔑 출입 안내', ['출입', '비밀번호', '도어락', '카드키', '현관']),
+    'location': ('📍 위치 및 접근', ['위치', '주소', '오시는', '가는 길', '버스', '택시', '역에서', '픽업', '네비', '길찾기']),
+    'refund_policy': ('💰 취소/환불 정책', ['취소', '환불', '변경', '위약금', '날짜 변경']),
+    'safety': ('🚨 안전', ['소화기', '비상', '응급', '병원', '다쳤', '안전']),
+    'payment': ('💳 결제', ['결제', '카드', '계좌', '입금', '영수증', '현금', '세금계산서']),
+    'luggage': ('🧳 짐 보관/택배', ['짐', '보관', '택배', '캐리어']),
+    'photography': ('📸 촬영', ['사진', '촬영', '드론', '포토']),
+    'noise_party': ('🎉 파티/소음', ['파티', '소음', '생일', '시끄', '음악', '노래']),
+    'cleaning': ('🧹 청소/침구', ['청소', '이불', '침구', '베개']),
+    'children': ('👶 아이 동반', ['아기', '유아', '어린이', '아이', '아기침대', '키즈']),
+    'seasonal': ('🌡️ 냉난방/계절', ['난방', '에어컨', '냉방', '겨울', '여름', '춥', '덥']),
+    'maintenance': ('🔧 고장/수리', ['고장', '수리', '안 돼', '안돼', '작동', '안 나와']),
+    'nearby': ('🗺️ 주변 정보', ['근처', '주변', '관광', '맛집', '마트', '편의점', '식당', '가볼']),
+}
+
+# 질문과 관계없이 항상 넣는 최소 정보 (섹션, 필드)
+CORE_FIELDS = [
+    ('basic_info', 'name'),
+    ('location', 'address'),
+    ('checkin_checkout', 'checkin_time'),
+    ('checkin_checkout', 'checkout_time'),
+]
+
+# 질문에서 섹션을 하나도 찾지 못했을 때 넣는 자주 묻는 섹션
+DEFAULT_SECTIONS = ['checkin_checkout', 'extra_guests', 'parking', 'wifi_facilities', 'refund_policy']
+
+KEYWORD_WEIGHT = 2.0
+_NON_WORD = re.compile(r'[\s\W_]+', re.UNICODE)
+
+def _bigrams(text: str) -> set:
+    text = _NON_WORD.sub('', text.lower())
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+def _section_text(value) -> str:
+    if isinstance(value, dict):
+        return ' '.join(_section_text(item) for item in value.values())
+    if isinstance(value, list):
+        return ' '.join(_section_text(item) for item in value)
+    return '' if value is None else str(value)
+
+class PensionSectionIndex:
+    """Character bigram index over the analyzed pension sections, weighted by IDF across sections"""
+
+    def __init__(self, analyzed_info: Dict):
+        self.sections = {
+            name: value for name, value in analyzed_info.items()
+            if isinstance(value, dict) and any(item not in (None, '', []) for item in value.values())
+        }
+        self.bigrams = {name: _bigrams(_section_text(value)) for name, value in self.sections.items()}
+
+        document_frequency = {}
+        for grams in self.bigrams.values():
+            for gram in grams:
+                document_frequency[gram] = document_frequency.get(gram, 0) + 1
+        total = len(self.sections) or 1
+        self.idf = {gram: math.log((1 + total) / (1 + df)) for gram, df in document_frequency.items()}
+
+    def score(self, question: str) -> Dict[str, float]:
+        question_lower = question.lower()
+        question_grams = _bigrams(question)
+
+        scores = {}
+        for name in self.sections:
+            keywords = SECTIONS.get(name, ('', []))[1]
+            keyword_score = sum(KEYWORD_WEIGHT for keyword in keywords if keyword in question_lower)
+            overlap = question_grams & self.bigrams[name]
+            ngram_score = sum(self.idf.get(gram, 0.0) for gram in overlap) / (len(question_grams) ** 0.5 or 1)
+            scores[name] = keyword_score + ngram_score
+        return scores
+
+    def select(self, question: str, max_sections: int, min_score: float) -> List[str]:
+        """Sections relevant to the question, best first"""
+        scores = self.score(question)
+        ranked = sorted((name for name in scores if scores[name] >= min_score), key=scores.get, reverse=True)
+        return ranked[:max_sections]
+
+def sections_mentioned(text: str) -> List[str]:
+    """Sections whose topic keywords appear in the text"""
+    text_lower = text.lower()
+    return [name for name, (_, keywords) in SECTIONS.items() if any(keyword in text_lower for keyword in keywords)]
+
+# 펜션 정보가 바뀔 때만 인덱스를 다시 만들도록 내용 해시로 캐시
+_index_cache: "OrderedDict[str, PensionSectionIndex]" = OrderedDict()
+_INDEX_CACHE_SIZE = 4
+
+def get_section_index(analyzed_info: Dict) -> PensionSectionIndex:
+    encoded = json.dumps(analyzed_info, sort_keys=True, ensure_ascii=False, default=str)
+    key = hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    index = _index_cache.get(key)
+    if index is None:
+        index = PensionSectionIndex(analyzed_info)
+        _index_cache[key] = index
+        while len(_index_cache) > _INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    else:
+        _index_cache.move_to_end(key)
+    return index
+
+def _format_section(name: str, value: Dict) -> str:
+    title = SECTIONS.get(name, (name, []))[0]
+    lines = [f"{title}:"]
+    for field, field_value in value.items():
+        if field_value in (None, '', []):
+            continue
+        if isinstance(field_value, bool):
+            field_value = '예' if field_value else '아니오'
+        elif isinstance(field_value, list):
+            field_value = ', '.join(str(item) for item in field_value)
+        lines.append(f"- {field}: {field_value}")
+    return '\n'.join(lines)
+
+def build_pension_context(question: str, analyzed_info: Optional[Dict],
+                          max_sections: Optional[int] = None) -> str:
+    """Compact core plus only the pension sections relevant to the guest's question"""
+    if not analyzed_info:
+        return ""
+
+    if max_sections is None:
+        max_sections = int(os.getenv("PENSION_CONTEXT_MAX_SECTIONS", 4))
+    min_score = float(os.getenv("PENSION_CONTEXT_MIN_SCORE", 1.0))
+
+    index = get_section_index(analyzed_info)
+    selected = index.select(question, max_sections, min_score)
+    if not selected:
+        selected = [name for name in DEFAULT_SECTIONS if name in index.sections]
+    logger.debug(f"Pension sections for prompt: {selected}")
+
+    core_lines = []
+    for section, field in CORE_FIELDS:
+        value = (analyzed_info.get(section) or {}).get(field)
+        if value and section not in selected:
+            core_lines.append(f"- {value}")
+
+    parts = ["=== RPA펜션 상세 정보 ==="]
+    if core_lines:
+        parts.append("기본:\n" + '\n'.join(core_lines))
+    parts.extend(_format_section(name, index.sections[name]) for name in selected)
+    return '\n\n'.join(parts)
@@ -1,39 +1,47 @@
 import os
-import google.generativeai as genai
-from typing import Dict, Optional
+import logging
+from typing import Dict, Optional, Tuple
 import json
+import hashlib
 
-# OpenAI 라이브러리를 안전하게 import (0.28.1 버전)
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    print("⚠️ OpenAI 라이브러리가 설치되지 않았습니다. pip install openai로 설치하세요.")
-    OPENAI_AVAILABLE = False
+from metrics import llm_fallbacks
+from app_logging import log_payload
+from model_registry import get_gemini_model, get_openai
+from llm_scheduler import llm_scheduler
+from pension_context import build_pension_context
+
+logger = logging.getLogger(__name__)
 
 class ReplyGenerator:
     def __init__(self):
-        # Gemini API 설정
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        self.model = genai.GenerativeModel(os.getenv("REPLY_MODEL", "gemini-pro"))
-        
-        # OpenAI API 설정 (0.28.1 버전)
-        if OPENAI_AVAILABLE:
-            try:
-                openai_api_key = os.getenv("OPENAI_API_KEY")
-                if openai_api_key:
-                    openai.api_key = openai_api_key
-                    print("✅ OpenAI API 키 설정 성공")
-                else:
-                    print("⚠️ OpenAI API 키가 없습니다. Fallback만 사용됩니다.")
-            except Exception as e:
-                print(f"❌ OpenAI API 키 설정 실패: {e}")
-        else:
-            print("⚠️ OpenAI 라이브러리가 설치되지 않았습니다. Gemini와 Fallback만 사용됩니다.")
-        
+        # Gemini/OpenAI SDK는 첫 호출 시점에 로드 (model_registry)
+        self.model_name = os.getenv("REPLY_MODEL", "gemini-pro")
+    
+    @property
+    def model(self):
+        """Shared Gemini model, created on first use"""
+        return get_gemini_model(self.model_name)
+    
+    def build_draft_key(self, email_id: str, context: Dict, pension_info: Optional[Dict]) -> str:
+        """Key a draft by email, response settings, pension info version and the rest of the request context"""
+        def _hash(value) -> str:
+            encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+            return hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:16]
+        
+        settings_hash = _hash(context.get('response_settings') or {})
+        context_hash = _hash({k: v for k, v in context.items() if k not in ('response_settings', 'pension_info')})
+        pension_version = str(pension_info.get('updated_at')) if pension_info else ''
+        return f"{email_id}:{settings_hash}:{pension_version}:{context_hash}"
+    
     async def generate_reply(self, email_content: str, subject: str, 
                            sender: str, context: Dict = {}) -> str:
         """Generate an AI reply to an email"""
+        reply, _ = await self.generate_reply_with_source(email_content, subject, sender, context)
+        return reply
+    
+    async def generate_reply_with_source(self, email_content: str, subject: str,
+                                         sender: str, context: Dict = {}) -> Tuple[str, bool]:
+        """Generate an AI reply; the flag is True when every LLM failed and the template fallback was used"""
         try:
             # 응답 설정 가져오기
             response_settings = context.get('response_settings', {})
@@ -41,34 +49,36 @@ class ReplyGenerator:
             # Build comprehensive prompt with both pension info and response settings
             full_prompt = self._build_comprehensive_prompt(email_content, subject, sender, context, response_settings)
             
-            print(f"🤖 AI 프롬프트 (처음 500자): {full_prompt[:500]}...")
+            log_payload(logger, "🤖 AI 프롬프트", prompt=full_prompt)
             
             # Generate reply using Gemini
-            response = self.model.generate_content(full_prompt)
+            response = await llm_scheduler.submit("gemini", "reply", self.model.generate_content, full_prompt)
             reply = response.text.strip()
             
-            print(f"🤖 AI 원본 응답: {reply}")
+            log_payload(logger, "🤖 AI 원본 응답", reply=reply)
             
             # 응답 설정에 따라 후처리
             reply = self._apply_response_settings(reply, response_settings)
             
-            print(f"🤖 최종 응답: {reply}")
+            log_payload(logger, "🤖 최종 응답", reply=reply)
             
-            return reply
+            return reply, False
             
         except Exception as e:
-            print(f"❌ Gemini API 오류: {e}")
-            print(f"🔄 OpenAI API로 전환 시도...")
+            logger.warning(f"❌ Gemini API 오류, OpenAI API로 전환 시도: {e}")
+            llm_fallbacks.inc(from_provider="gemini", to_provider="openai", operation="reply")
             
             # OpenAI API로 재시도
             try:
                 response_settings = context.get('response_settings', {})
                 full_prompt = self._build_comprehensive_prompt(email_content, subject, sender, context, response_settings)
                 
-                print(f"🤖 OpenAI API 호출 중...")
+                logger.debug("🤖 OpenAI API 호출 중...")
                 
-                if OPENAI_AVAILABLE and openai.api_key:
-                    openai_response = openai.ChatCompletion.create(
+                openai = get_openai()
+                if openai:
+                    openai_response = await llm_scheduler.submit(
+                        "openai", "reply", openai.ChatCompletion.create,
                         model="gpt-3.5-turbo",
                         messages=[
                             {"role": "system", "content": "당신은 RPA펜션의 전문 고객 서비스 담당자입니다. 한국어로 친절하고 정확한 답변을 제공하세요."},
@@ -79,20 +89,20 @@ class ReplyGenerator:
                     )
                     
                     reply = openai_response.choices[0].message.content.strip()
-                    print(f"✅ OpenAI 응답 생성 성공: {reply[:100]}...")
+                    logger.info("✅ OpenAI 응답 생성 성공")
                 else:
                     raise Exception("OpenAI API 키가 설정되지 않았습니다.")
                 
                 # 응답 설정에 따라 후처리
                 reply = self._apply_response_settings(reply, response_settings)
                 
-                return reply
+                return reply, False
                 
             except Exception as openai_error:
-                print(f"❌ OpenAI API도 실패: {openai_error}")
-                print(f"🔄 Fallback 응답으로 전환...")
+                logger.error(f"❌ OpenAI API도 실패, Fallback 응답으로 전환: {openai_error}")
+                llm_fallbacks.inc(from_provider="openai", to_provider="template", operation="reply")
                 # 모든 AI API가 실패한 경우 fallback 응답 생성
-                return self._generate_fallback_response(email_content, subject, sender, context)
+                return self._generate_fallback_response(email_content, subject, sender, context), True
     
     def _build_prompt(self, email_content: str, subject: str, 
                      sender: str, context: Dict) -> str:
@@ -164,55 +174,16 @@ class ReplyGenerator:
         length_level = tone_customization.get('length', 50)  # 0-100
         emoji_freq = tone_customization.get('emojiFreq', 70)  # 0-100
         
-        # 펜션 정보 컨텍스트 구성
-        pension_context = ""
-        if pension_info:
-            # 펜션 정보를 더 자세히 파싱
-            location_info = pension_info.get('location', {})
-            checkin_info = pension_info.get('checkin_checkout', {})
-            capacity_info = pension_info.get('capacity', {})
-            parking_info = pension_info.get('parking', {})
-            meal_info = pension_info.get('meal', {})
-            facilities_info = pension_info.get('wifi_facilities', {})
-            
-            pension_context = f"""
-=== RPA펜션 상세 정보 ===
-📍 위치 및 접근:
-- 주소: {location_info.get('address', '경기도 가평군 설악면 RPA로 42-1')}
-- 대중교통: {location_info.get('public_transport', '가평역에서 택시로 약 15분')}
-
-🕐 체크인/체크아웃:
-- 체크인: {checkin_info.get('checkin_time', '오후 3시부터 체크인 가능')}
-- 체크아웃: {checkin_info.get('checkout_time', '오전 11시까지 체크아웃')}
-- 정책: {checkin_info.get('early_late_policy', '얼리 체크인 불가, 레이트 체크아웃 최대 1시간 가능')}
-
-👥 수용 인원 및 요금:
-- 기준 인원: {capacity_info.get('base_capacity', '2인')}
-- 최대 인원: {capacity_info.get('max_capacity', '4인')}
-- 추가 인원 요금: {capacity_info.get('extra_charge', '1인당 20,000원')}
-
-🚗 주차 안내:
-- 주차 가능: {parking_info.get('is_free', '무료 주차 제공')}
-- 주차 대수: {parking_info.get('car_limit', '1객실당 최대 2대')}
-- 등록 필요: {parking_info.get('registration_required', '차량 등록 불필요')}
-
-🍽️ 식사 안내:
-- 조식 제공: {meal_info.get('breakfast_provided', '조식 제공되지 않음')}
-- 조식 시간: {meal_info.get('breakfast_time', '오전 8시-9시 30분')}
-- 조식 요금: {meal_info.get('extra_fee', '1인당 8,000원')}
-
-🏢 시설 및 편의사항:
-- 와이파이: {facilities_info.get('wifi_info', '전 객실 무료 Wi-Fi')}
-- 주요 시설: {facilities_info.get('facilities', '바베큐장, 야외 수영장, 개별 테라스')}
-- 운영 시간: {facilities_info.get('facility_hours', '바베큐장 18:00-21:00, 수영장 10:00-18:00')}
-
-🚭 정책:
-- 금연 정책: {pension_info.get('smoking_pets', {}).get('non_smoking_policy', '전 객실 금연')}
-- 반려동물: {pension_info.get('smoking_pets', {}).get('pets_allowed', '반려동물 동반 불가')}
-
-💰 취소/환불 정책:
-- 취소 규정: {pension_info.get('refund_policy', {}).get('cancellation_deadline', '3일 전 전액환불, 2일 전 50%, 1일 전 환불불가')}
-"""
+        # 펜션 정보 중 질문과 관련된 섹션만 포함 (프롬프트 토큰 절약)
+        pension_context = build_pension_context(f"{subject}\n{email_content}", pension_info)
+        
+        # 같은 고객과의 이전 대화 요약 (스레드가 없으면 생략)
+        thread_summary = context.get('thread_summary')
+        thread_context = f"""
+=== 이전 대화 요약 (오래된 순) ===
+{thread_summary}
+이미 안내한 내용은 반복하지 말고, 이번 메시지에서 새로 묻는 내용에 집중하세요.
+""" if thread_summary else ""
         
         # 말투 설정
         tone_instructions = {
@@ -283,7 +254,7 @@ class ReplyGenerator:
         comprehensive_prompt = f"""당신은 RPA펜션의 전문 고객 서비스 담당자입니다. 아래 펜션 정보를 정확히 활용하여 고객 문의에 답변해주세요.
 
 {pension_context}
-
+{thread_context}
 === 고객 문의 ===
 제목: {subject}
 발신자: {sender}
@@ -438,11 +409,11 @@ Template:
 Customer Email:
 {email_content}"""
             
-            response = self.model.generate_content(prompt)
+            response = await llm_scheduler.submit("gemini", "template_reply", self.model.generate_content, prompt)
             return response.text.strip()
             
         except Exception as e:
-            print(f"Error customizing template: {e}")
+            logger.error(f"Error customizing template: {e}")
             return template
     
     def _get_urgent_template(self) -> str:
@@ -505,7 +476,7 @@ Please provide:
 5. Improved version (if needed)
 """
             
-            response = self.model.generate_content(prompt)
+            response = await llm_scheduler.submit("gemini", "suggest_improvements", self.model.generate_content, prompt)
             analysis = response.text.strip()
             
             return {
@@ -514,7 +485,7 @@ Please provide:
             }
             
         except Exception as e:
-            print(f"Error analyzing reply: {e}")
+            logger.error(f"Error analyzing reply: {e}")
             return {"analysis": "Unable to analyze reply", "suggestions": []}
     
     def _parse_suggestions(self, analysis: str) -> list:
@@ -532,7 +503,7 @@ Please provide:
     def _generate_fallback_response(self, email_content: str, subject: str, 
                                   sender: str, context: Dict) -> str:
         """Generate fallback response when Gemini API is unavailable"""
-        print(f"🔄 Fallback 응답 생성 중...")
+        logger.debug("🔄 Fallback 응답 생성 중...")
         
         # 응답 설정과 펜션 정보 가져오기
         response_settings = context.get('response_settings', {})
@@ -609,6 +580,6 @@ Please provide:
         
         fallback_response = "\n\n".join(response_parts)
         
-        print(f"✅ Fallback 응답 생성 완료: {fallback_response[:100]}...")
+        log_payload(logger, "✅ Fallback 응답 생성 완료", reply=fallback_response)
         
         return fallback_response
\ No newline at end of file
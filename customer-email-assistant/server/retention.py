@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import gzip
+import uuid
+import socket
+import logging
+import zlib
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 콜드 스토리지로 옮긴 뒤에도 검색/목록/ETag용으로 남겨두는 필드
+STUB_FIELDS = [
+    'gmail_id', 'thread_id', 'subject', 'sender_email', 'sender_name',
+    'received_at', 'received_utc', 'status', 'priority', 'tags', 'created_at', 'updated_at', 'version'
+]
+STUB_BODY_LENGTH = 200
+
+RETENTION_LOCK_NAME = "retention"
+
+class RetentionJob:
+    """Moves old archived/spam emails out of the hot collection in bounded batches"""
+
+    def __init__(self, db):
+        self.db = db
+        self.days = int(os.getenv("RETENTION_DAYS", 90))
+        self.batch_size = int(os.getenv("RETENTION_BATCH_SIZE", 200))
+        self.interval_hours = float(os.getenv("RETENTION_INTERVAL_HOURS", 24))
+        # 설정되어 있으면 Mongo 대신 로컬 gzip JSONL 파일로 이동
+        self.cold_dir = os.getenv("RETENTION_COLD_DIR")
+        self.lock_ttl_seconds = int(os.getenv("RETENTION_LOCK_TTL_SECONDS", 300))
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._task = None
+        self._lock = asyncio.Lock()
+        self.status = {
+            'running': False,
+            'target': 'file' if self.cold_dir else 'mongo',
+            'cutoff': None,
+            'scanned': 0,
+            'moved': 0,
+            'batches': 0,
+            'started_at': None,
+            'finished_at': None,
+            'error': None
+        }
+
+    def start(self):
+        """Schedule the periodic retention run"""
+        if self.interval_hours <= 0 or self._task:
+            return
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Cancel the periodic retention run"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            await self.run()
+            await asyncio.sleep(self.interval_hours * 3600)
+
+    def get_status(self) -> Dict:
+        """Get progress of the current or last retention run"""
+        return dict(self.status)
+
+    async def run(self) -> Dict:
+        """Move expired emails to cold storage, one batch at a time (in one worker at a time)"""
+        if self._lock.locked():
+            return self.get_status()
+
+        async with self._lock:
+            # 모든 워커가 시작 시 예약하므로 lease 락으로 한 워커만 실행 (콜드 파일 중복 기록 방지)
+            if not await self.db.acquire_lock(RETENTION_LOCK_NAME, self.owner, self.lock_ttl_seconds):
+                logger.info("Retention already running in another worker, skipping")
+                return {**self.get_status(), 'skipped': True}
+
+            heartbeat = asyncio.create_task(self._renew_lock())
+            try:
+                await self._move_expired()
+            finally:
+                heartbeat.cancel()
+                await self.db.release_lock(RETENTION_LOCK_NAME, self.owner)
+
+        return self.get_status()
+
+    async def _renew_lock(self) -> None:
+        while True:
+            await asyncio.sleep(self.lock_ttl_seconds / 3)
+            await self.db.acquire_lock(RETENTION_LOCK_NAME, self.owner, self.lock_ttl_seconds)
+
+    async def _move_expired(self) -> None:
+        # received_utc와 같은 naive UTC
+        cutoff = datetime.utcnow() - timedelta(days=self.days)
+        self.status.update({
+            'running': True,
+            'cutoff': cutoff.isoformat(),
+            'scanned': 0,
+            'moved': 0,
+            'batches': 0,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'error': None
+        })
+
+        previous_ids = None
+        try:
+            while True:
+                # 옮긴 메일은 stub(cold_storage)이 되어 조회에서 빠지므로 항상 처음부터 다음 배치를 읽음
+                docs = await self.db.get_retention_candidates(cutoff, self.batch_size)
+                batch_ids = [doc['_id'] for doc in docs]
+                if not docs or batch_ids == previous_ids:
+                    break
+                previous_ids = batch_ids
+
+                location = await self._write_cold(docs)
+                stubs = [self._make_stub(doc, location) for doc in docs]
+                await self.db.replace_with_stubs(stubs)
+
+                self.status['scanned'] += len(docs)
+                self.status['moved'] += len(docs)
+                self.status['batches'] += 1
+
+            logger.info(f"Retention completed. {self.status['moved']} emails moved to cold storage.")
+
+        except Exception as e:
+            logger.error(f"Retention failed: {e}")
+            self.status['error'] = str(e)
+        finally:
+            self.status['running'] = False
+            self.status['finished_at'] = datetime.utcnow().isoformat()
+
+    async def _write_cold(self, docs: List[Dict]) -> str:
+        """Write full documents to cold storage and return their location"""
+        if self.cold_dir:
+            return await asyncio.to_thread(self._write_jsonl, docs)
+
+        cold_docs = await asyncio.to_thread(self._compress_docs, docs)
+        await self.db.store_cold_emails(cold_docs)
+        return "emails_cold"
+
+    def _compress_docs(self, docs: List[Dict]) -> List[Dict]:
+        from bson import Binary, json_util
+        cold_docs = []
+        for doc in docs:
+            cold_doc = {field: doc[field] for field in STUB_FIELDS if field in doc}
+            cold_doc['_id'] = doc['_id']
+            cold_doc['payload'] = Binary(zlib.compress(json_util.dumps(doc).encode('utf-8')))
+            cold_docs.append(cold_doc)
+        return cold_docs
+
+    def _write_jsonl(self, docs: List[Dict]) -> str:
+        from bson import json_util
+        os.makedirs(self.cold_dir, exist_ok=True)
+        path = os.path.join(self.cold_dir, f"emails-{datetime.utcnow():%Y%m}.jsonl.gz")
+
+        # gzip 멤버를 이어붙이는 방식이라 append 해도 하나의 파일로 읽힘
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for doc in docs:
+                f.write(json_util.dumps(doc, ensure_ascii=False) + '\n')
+        return path
+
+    def _make_stub(self, doc: Dict, location: str) -> Dict:
+        stub = {field: doc[field] for field in STUB_FIELDS if field in doc}
+        stub['_id'] = doc['_id']
+        stub['body'] = (doc.get('body') or '')[:STUB_BODY_LENGTH]
+        stub['cold_storage'] = {
+            'target': self.status['target'],
+            'location': location,
+            'moved_at': datetime.utcnow()
+        }
+        return stub
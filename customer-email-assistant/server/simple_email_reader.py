@@ -3,20 +3,47 @@
 
 import os
 import imaplib
+import logging
+import asyncio
+import threading
 import email
-import quopri
-import base64
 from datetime import datetime
-from typing import List, Dict, Optional
-from email.header import decode_header
-from email.utils import parsedate_to_datetime
+from typing import Callable, List, Dict, Optional, Tuple
 import re
+import time
+
+from metrics import registry
+from mime_parser import parse_raw_email, parse_headers_only
+
+logger = logging.getLogger(__name__)
+
+imap_fetch_latency = registry.histogram(
+    "imap_fetch_duration_seconds", "Time to fetch and parse one batch of messages over IMAP"
+)
+imap_messages_fetched = registry.counter(
+    "imap_messages_fetched_total", "Messages fetched over IMAP"
+)
+imap_fetch_failures = registry.counter(
+    "imap_fetch_failures_total", "Failed IMAP fetches"
+)
 
 class SimpleEmailReader:
     def __init__(self):
         self.mail = None
         self.email_address = os.getenv("GMAIL_EMAIL")
         self.app_password = os.getenv("GMAIL_APP_PASSWORD")
+        # imaplib 연결은 스레드 간 공유가 안전하지 않으므로 한 번에 하나의 작업만 허용
+        self._lock = threading.Lock()
+        # IMAP 로그인은 첫 사용 시점까지 미룸 (import/서버 기동을 막지 않도록)
+    
+    def _ensure_connected(self):
+        """Connect on first use, and reconnect if the server dropped the session"""
+        if self.mail is not None:
+            try:
+                self.mail.noop()
+                return
+            except Exception:
+                self.mail = None
         self._connect()
     
     def _connect(self):
@@ -27,15 +54,29 @@ class SimpleEmailReader:
             
             self.mail = imaplib.IMAP4_SSL("imap.gmail.com")
             self.mail.login(self.email_address, self.app_password)
-            print(f"Connected to Gmail IMAP for {self.email_address}")
+            logger.info(f"Connected to Gmail IMAP for {self.email_address}")
             
         except Exception as e:
-            print(f"Error connecting to Gmail IMAP: {e}")
+            logger.error(f"Error connecting to Gmail IMAP: {e}")
             raise
     
-    async def fetch_emails(self, limit: int = 50) -> List[Dict]:
+    async def fetch_emails(self, limit: int = 50, header_filter: Optional[Callable] = None) -> List[Dict]:
+        """Fetch emails in a worker thread so blocking IMAP I/O stays off the event loop
+        
+        If header_filter is given, it is called with each message's headers first; messages it
+        classifies are returned without their body, with the result under 'prefilter'.
+        """
+        return await asyncio.to_thread(self._fetch_emails_blocking, limit, header_filter)
+    
+    def _fetch_emails_blocking(self, limit: int, header_filter: Optional[Callable] = None) -> List[Dict]:
+        with self._lock:
+            return self._fetch_emails_simple(limit, header_filter)
+    
+    def _fetch_emails_simple(self, limit: int, header_filter: Optional[Callable] = None) -> List[Dict]:
         """Fetch emails - SIMPLE VERSION"""
+        start = time.perf_counter()
         try:
+            self._ensure_connected()
             self.mail.select("inbox")
             result, data = self.mail.search(None, "ALL")
             email_ids = data[0].split()
@@ -43,21 +84,67 @@ class SimpleEmailReader:
             # Get most recent emails
             email_ids = email_ids[-limit:] if len(email_ids) > limit else email_ids
             
+            prefiltered = self._prefilter_by_headers(email_ids, header_filter) if header_filter else {}
+            
             emails = []
             for eid in reversed(email_ids):  # Most recent first
                 try:
-                    email_data = self._get_email_simple(eid)
+                    email_data = prefiltered.get(eid) or self._get_email_simple(eid)
                     if email_data:
                         emails.append(email_data)
                 except Exception as e:
-                    print(f"Error processing email {eid}: {e}")
+                    logger.error(f"Error processing email {eid}: {e}")
                     continue
             
+            imap_messages_fetched.inc(len(emails))
             return emails
             
         except Exception as e:
-            print(f'Error fetching emails: {e}')
+            logger.error(f'Error fetching emails: {e}')
+            imap_fetch_failures.inc()
             return []
+        finally:
+            imap_fetch_latency.observe(time.perf_counter() - start)
+    
+    def _prefilter_by_headers(self, email_ids: List[bytes], header_filter: Callable) -> Dict[bytes, Dict]:
+        """Fetch all headers in one round trip and keep the messages the filter classified"""
+        if not email_ids:
+            return {}
+        
+        result, data = self.mail.fetch(b','.join(email_ids), '(BODY.PEEK[HEADER])')
+        prefiltered = {}
+        for item in data or []:
+            if not isinstance(item, tuple):
+                continue
+            try:
+                eid = item[0].split()[0]
+                headers = email.message_from_bytes(item[1])
+                classification = header_filter(headers)
+                if classification:
+                    email_data = parse_headers_only(headers, eid.decode())
+                    email_data['prefilter'] = classification
+                    prefiltered[eid] = email_data
+            except Exception as e:
+                logger.error(f"Error prefiltering headers: {e}")
+        return prefiltered
+    
+    async def fetch_body(self, message_id: str) -> Optional[Dict]:
+        """Fetch and parse the full message with this Message-ID (for emails stored without their body)"""
+        return await asyncio.to_thread(self._fetch_by_message_id_blocking, message_id)
+    
+    def _fetch_by_message_id_blocking(self, message_id: str) -> Optional[Dict]:
+        # 시퀀스 번호는 삭제/보관 후 바뀌므로 Message-ID로 다시 찾음
+        with self._lock:
+            self._ensure_connected()
+            self.mail.select("inbox", readonly=True)
+            result, data = self.mail.uid('search', None, 'HEADER', 'Message-ID', '"' + message_id.replace('"', '') + '"')
+            uids = data[0].split() if data and data[0] else []
+            if not uids:
+                return None
+            result, data = self.mail.uid('fetch', uids[-1], '(BODY.PEEK[])')
+        
+        raw_email = next((item[1] for item in data or [] if isinstance(item, tuple)), None)
+        return parse_raw_email(raw_email, uids[-1].decode()) if raw_email else None
     
     def _get_email_simple(self, email_id: bytes) -> Optional[Dict]:
         """Get email - SUPER SIMPLE VERSION"""
@@ -66,189 +153,55 @@ class SimpleEmailReader:
             result, msg_data = self.mail.fetch(email_id, '(RFC822)')
             if not msg_data or not msg_data[0]:
                 return None
-                
-            raw_email = msg_data[0][1]
-            msg = email.message_from_bytes(raw_email)
-            
-            # Extract basic info
-            subject = self._decode_header(msg.get("Subject", ""))
-            sender = self._decode_header(msg.get("From", ""))
-            date_str = msg.get("Date", "")
-            message_id = msg.get("Message-ID", email_id.decode())
-            
-            # Parse sender
-            sender_email, sender_name = self._parse_sender(sender)
-            
-            # Extract body - SIMPLE WAY
-            body_text = self._extract_text_simple(msg)
             
-            # Parse date
-            received_at = self._parse_date(date_str)
-            
-            return {
-                'id': email_id.decode(),
-                'gmail_id': message_id,
-                'subject': subject or 'No Subject',
-                'sender_email': sender_email,
-                'sender_name': sender_name,
-                'body': body_text,
-                'text_content': body_text,  # Same as body for simplicity
-                'received_at': received_at,
-                'thread_id': message_id,
-                'labels': ['INBOX']
-            }
+            return parse_raw_email(msg_data[0][1], email_id.decode())
             
         except Exception as e:
-            print(f'Error getting email: {e}')
+            logger.error(f'Error getting email: {e}')
             return None
     
-    def _extract_text_simple(self, msg) -> str:
-        """Extract text - DEAD SIMPLE"""
-        text_parts = []
-        
-        try:
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                
-                if content_type == "text/plain":
-                    payload = part.get_payload(decode=True)
-                    if payload:
-                        text = self._decode_payload_simple(payload, part)
-                        if text and len(text.strip()) > 0:
-                            text_parts.append(text)
-                            break  # Take first text/plain part only
-            
-            # If no text/plain, try HTML
-            if not text_parts:
-                for part in msg.walk():
-                    content_type = part.get_content_type()
-                    
-                    if content_type == "text/html":
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            text = self._decode_payload_simple(payload, part)
-                            if text:
-                                # Simple HTML to text conversion
-                                text = self._html_to_text_simple(text)
-                                if text and len(text.strip()) > 0:
-                                    text_parts.append(text)
-                                    break
-            
-            return '\n'.join(text_parts) if text_parts else "No content available"
-            
-        except Exception as e:
-            print(f"Text extraction error: {e}")
-            return "Content extraction failed"
+    def get_uid_range(self) -> Tuple[int, int]:
+        """(UIDVALIDITY, UIDNEXT) of the inbox"""
+        with self._lock:
+            self._ensure_connected()
+            result, data = self.mail.status("inbox", "(UIDVALIDITY UIDNEXT)")
+        info = data[0].decode() if data and data[0] else ""
+        uidvalidity = re.search(r'UIDVALIDITY (\d+)', info)
+        uidnext = re.search(r'UIDNEXT (\d+)', info)
+        if not uidvalidity or not uidnext:
+            raise Exception(f"Unexpected IMAP STATUS response: {info}")
+        return int(uidvalidity.group(1)), int(uidnext.group(1))
     
-    def _decode_payload_simple(self, payload: bytes, part) -> str:
-        """Decode payload - SIMPLE"""
-        try:
-            charset = part.get_content_charset() or 'utf-8'
-            
-            # Try UTF-8 first (most common)
-            try:
-                return payload.decode('utf-8')
-            except UnicodeDecodeError:
-                pass
-            
-            # Try the specified charset
-            try:
-                return payload.decode(charset)
-            except UnicodeDecodeError:
-                pass
-            
-            # Try common Korean charsets
-            for test_charset in ['euc-kr', 'cp949', 'iso-8859-1']:
-                try:
-                    return payload.decode(test_charset)
-                except UnicodeDecodeError:
-                    continue
-            
-            # Last resort
-            return payload.decode('utf-8', errors='replace')
-            
-        except Exception as e:
-            print(f"Payload decode error: {e}")
-            return str(payload)[:500]
-    
-    def _html_to_text_simple(self, html: str) -> str:
-        """HTML to text - SUPER SIMPLE with CSS removal"""
-        try:
-            import re
-            
-            # Remove CSS styles (between <style> tags or @media queries)
-            html = re.sub(r'<style[^>]*>.*?</style>', '', html, flags=re.DOTALL | re.IGNORECASE)
-            html = re.sub(r'@media[^{]*\{[^}]*\}', '', html, flags=re.DOTALL)
-            html = re.sub(r'@[^{]*\{[^}]*\}', '', html, flags=re.DOTALL)
-            
-            # Remove script tags
-            html = re.sub(r'<script[^>]*>.*?</script>', '', html, flags=re.DOTALL | re.IGNORECASE)
-            
-            # Remove HTML tags
-            text = re.sub(r'<[^>]+>', ' ', html)
-            
-            # Remove CSS-like content that might be left
-            text = re.sub(r'\{[^}]*\}', '', text)
-            text = re.sub(r'@media[^;]*;', '', text)
-            
-            # Clean up whitespace
-            text = re.sub(r'\s+', ' ', text)
-            text = text.strip()
-            
-            # Limit length
-            if len(text) > 1000:
-                text = text[:1000] + "..."
-            
-            return text
-            
-        except Exception as e:
-            print(f"HTML to text error: {e}")
-            return html[:500]
-    
-    def _decode_header(self, header_value: str) -> str:
-        """Decode email header - SIMPLE"""
-        if not header_value:
-            return ""
+    def search_uids_since(self, since: datetime, after_uid: int = 0, before_uid: Optional[int] = None) -> List[int]:
+        """Sorted UIDs of inbox messages received since a date, in (after_uid, before_uid)"""
+        # Gmail UID는 드문드문 크게 매겨지므로 범위를 훑지 않고 실제 UID 목록을 한 번에 받음
+        with self._lock:
+            self._ensure_connected()
+            self.mail.select("inbox", readonly=True)
+            result, data = self.mail.uid('search', None, f'(UID {after_uid + 1}:* SINCE {since:%d-%b-%Y})')
         
-        try:
-            decoded_parts = decode_header(header_value)
-            decoded_string = ""
-            
-            for part, encoding in decoded_parts:
-                if isinstance(part, bytes):
-                    try:
-                        decoded_string += part.decode(encoding or 'utf-8')
-                    except:
-                        decoded_string += part.decode('utf-8', errors='replace')
-                else:
-                    decoded_string += part
-            
-            return decoded_string
-        except:
-            return header_value
+        # UID a:* 검색은 a가 가장 큰 UID보다 커도 마지막 메시지를 돌려주므로 다시 거름
+        uids = sorted(int(uid) for uid in (data[0].split() if data and data[0] else []))
+        return [uid for uid in uids if uid > after_uid and (before_uid is None or uid < before_uid)]
     
-    def _parse_sender(self, sender: str) -> tuple:
-        """Parse sender - SIMPLE"""
-        if '<' in sender and '>' in sender:
-            match = re.match(r'^(.*?)\s*<(.+?)>', sender)
-            if match:
-                name = match.group(1).strip().strip('"')
-                email_addr = match.group(2).strip()
-                return email_addr, name
+    def fetch_raw_by_uid(self, uids: List[bytes]) -> List[Tuple[str, bytes]]:
+        """Fetch raw RFC822 bytes for a batch of UIDs in one round trip, without parsing"""
+        if not uids:
+            return []
         
-        email_match = re.search(r'[\w\.-]+@[\w\.-]+', sender)
-        if email_match:
-            return email_match.group(), None
+        with self._lock:
+            self._ensure_connected()
+            self.mail.select("inbox", readonly=True)
+            result, data = self.mail.uid('fetch', b','.join(uids), '(UID BODY.PEEK[])')
         
-        return sender.strip(), None
-    
-    def _parse_date(self, date_str: str) -> str:
-        """Parse date - SIMPLE"""
-        try:
-            dt = parsedate_to_datetime(date_str)
-            return dt.isoformat()
-        except:
-            return datetime.now().isoformat()
+        raw_messages = []
+        for item in data or []:
+            if not isinstance(item, tuple):
+                continue
+            match = re.search(rb'UID (\d+)', item[0])
+            if match:
+                raw_messages.append((match.group(1).decode(), item[1]))
+        return raw_messages
     
     def close(self):
         """Close connection"""
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import registry
+from app_logging import log_payload
+from llm_scheduler import llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+llm_invalid_outputs = registry.counter(
+    "llm_invalid_outputs_total", "LLM responses that were not valid JSON or failed schema validation",
+    ("operation", "kind")
+)
+llm_output_repairs = registry.counter(
+    "llm_output_repairs_total", "Partial-repair calls that regenerated only the invalid fields", ("operation", "result")
+)
+
+# 스키마는 Gemini response_schema 형식(OpenAPI 부분집합)을 그대로 사용하고, 같은 정의로 응답을 검증함
+# (type: OBJECT/ARRAY/STRING/NUMBER/INTEGER/BOOLEAN, properties, required, items, enum, nullable)
+
+Validator = Callable[[Any], List[Tuple[Tuple[str, ...], str]]]
+
+def compile_validator(schema: Dict) -> Validator:
+    """Build a validator once; it returns (field path, problem) for every invalid field"""
+    schema_type = schema.get('type')
+    nullable = schema.get('nullable', False)
+    enum = set(schema['enum']) if 'enum' in schema else None
+
+    if schema_type == 'OBJECT':
+        properties = {name: compile_validator(sub) for name, sub in schema.get('properties', {}).items()}
+        required = tuple(schema.get('required', ()))
+
+        def check(value, path=()):
+            if value is None:
+                return [] if nullable else [(path, "missing")]
+            if not isinstance(value, dict):
+                return [(path, "expected object")]
+            errors = [(path + (name,), "missing") for name in required if name not in value]
+            for name, validator in properties.items():
+                if name in value:
+                    errors.extend(validator(value[name], path + (name,)))
+            return errors
+        return check
+
+    if schema_type == 'ARRAY':
+        item_validator = compile_validator(schema.get('items', {}))
+
+        def check(value, path=()):
+            if value is None:
+                return [] if nullable else [(path, "missing")]
+            if not isinstance(value, list):
+                return [(path, "expected array")]
+            errors = []
+            for item in value:
+                errors.extend(item_validator(item, path))
+            return errors
+        return check
+
+    python_types = {
+        'STRING': (str,),
+        'NUMBER': (int, float),
+        'INTEGER': (int,),
+        'BOOLEAN': (bool,),
+    }.get(schema_type)
+
+    def check(value, path=()):
+        if value is None:
+            return [] if nullable else [(path, "missing")]
+        if python_types and (not isinstance(value, python_types)
+                             or (schema_type in ('NUMBER', 'INTEGER') and isinstance(value, bool))):
+            return [(path, f"expected {schema_type.lower()}")]
+        if enum is not None and value not in enum:
+            return [(path, f"must be one of {sorted(enum)}")]
+        return []
+    return check
+
+def sub_schema(schema: Dict, path: Tuple[str, ...]) -> Dict:
+    for name in path:
+        schema = schema['properties'][name]
+    return schema
+
+def _set_path(target: Dict, path: Tuple[str, ...], value) -> None:
+    for name in path[:-1]:
+        if not isinstance(target.get(name), dict):
+            target[name] = {}
+        target = target[name]
+    target[path[-1]] = value
+
+def _get_path(source: Dict, path: Tuple[str, ...]):
+    for name in path:
+        if not isinstance(source, dict):
+            return None
+        source = source.get(name)
+    return source
+
+def parse_json_text(text: str) -> Any:
+    """json.loads, tolerating a surrounding markdown code fence from models without JSON mode"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return json.loads(text)
+
+# JSON 모드를 지원하지 않는 모델 (예: gemini-pro) - 거부된 뒤에는 일반 프롬프트로만 호출
+_json_mode_unsupported = set()
+
+# SDK(snake_case)와 API(camelCase) 오류 메시지에 나오는 JSON 모드 설정 이름
+_JSON_MODE_FIELDS = ('response_schema', 'response_mime_type', 'responseSchema', 'responseMimeType')
+
+def _json_mode_rejected(error: Exception) -> bool:
+    """True if the SDK or API refused the JSON-mode config itself
+
+    Other errors, including InvalidArgument for an API key, prompt size or safety settings, are not.
+    """
+    message = str(error)
+    if not any(field in message for field in _JSON_MODE_FIELDS):
+        return False
+    # 구버전 SDK는 모르는 GenerationConfig 필드를 로컬에서 거부
+    if isinstance(error, (TypeError, ValueError)):
+        return True
+    # SDK는 첫 호출 때 import되므로 여기서도 지연 import
+    from google.api_core import exceptions as google_exceptions
+    return isinstance(error, google_exceptions.InvalidArgument)
+
+async def _generate(model, model_name: str, operation: str, prompt: str, schema: Dict) -> str:
+    use_json_mode = os.getenv("LLM_JSON_MODE", "true").lower() == "true" and model_name not in _json_mode_unsupported
+    if use_json_mode:
+        generation_config = {"response_mime_type": "application/json", "response_schema": schema}
+        try:
+            response = await llm_scheduler.submit(
+                "gemini", operation, model.generate_content, prompt, generation_config=generation_config
+            )
+        except Exception as e:
+            # 429/타임아웃 등 일시적 오류는 그대로 올려 호출부의 재시도/폴백 경로에서 처리
+            if not _json_mode_rejected(e):
+                raise
+            logger.warning(f"JSON mode is not supported by {model_name}, using plain prompts: {e}")
+            _json_mode_unsupported.add(model_name)
+        else:
+            return response.text
+
+    response = await llm_scheduler.submit("gemini", operation, model.generate_content, prompt)
+    return response.text
+
+async def generate_json(model, model_name: str, operation: str, prompt: str, schema: Dict,
+                        validator: Optional[Validator] = None,
+                        max_repairs: Optional[int] = None) -> Tuple[Optional[Dict], List[Tuple[str, ...]]]:
+    """Call the model in JSON/response-schema mode and validate the result
+
+    Invalid fields are regenerated with small partial-repair calls that ask only for those fields.
+    Returns (data, paths still invalid); data is None if no JSON object could be obtained at all.
+    """
+    validator = validator or compile_validator(schema)
+    if max_repairs is None:
+        max_repairs = int(os.getenv("LLM_JSON_MAX_REPAIRS", 1))
+
+    text = await _generate(model, model_name, operation, prompt, schema)
+    try:
+        data = parse_json_text(text)
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        logger.warning(f"LLM output for {operation} was not a JSON object")
+        log_payload(logger, "Unparsed LLM output", operation=operation, result=text)
+        llm_invalid_outputs.inc(operation=operation, kind="json")
+        return None, []
+
+    errors = validator(data)
+    for _ in range(max_repairs):
+        if not errors:
+            break
+        llm_invalid_outputs.inc(operation=operation, kind="schema")
+        data, errors = await _repair(model, model_name, operation, prompt, schema, validator, data, errors)
+
+    if errors:
+        llm_invalid_outputs.inc(operation=operation, kind="schema")
+    return data, [path for path, _ in errors]
+
+async def _repair(model, model_name: str, operation: str, prompt: str, schema: Dict, validator: Validator,
+                  data: Dict, errors: List[Tuple[Tuple[str, ...], str]]):
+    """Regenerate only the invalid fields and merge them into the previous result"""
+    # 최상위 객체 자체가 틀린 경우는 부분 수정이 불가능
+    paths = sorted({path for path, _ in errors if path})
+    if not paths:
+        return data, errors
+
+    repair_schema = {'type': 'OBJECT', 'properties': {}, 'required': []}
+    for path in paths:
+        target = repair_schema
+        for name in path[:-1]:
+            if name not in target['properties']:
+                target['properties'][name] = {'type': 'OBJECT', 'properties': {}, 'required': []}
+                target['required'].append(name)
+            target = target['properties'][name]
+        target['properties'][path[-1]] = sub_schema(schema, path)
+        target['required'].append(path[-1])
+
+    problems = "\n".join(f"- {'.'.join(path)}: {problem}" for path, problem in errors if path)
+    repair_prompt = f"""{prompt}
+
+이전 응답에서 아래 항목이 스키마에 맞지 않았습니다. 이 항목들만 다시 JSON으로 응답해주세요.
+{problems}
+"""
+    try:
+        fixed = parse_json_text(await _generate(model, model_name, operation, repair_prompt, repair_schema))
+    except Exception as e:
+        logger.warning(f"Partial repair failed for {operation}: {e}")
+        llm_output_repairs.inc(operation=operation, result="failed")
+        return data, errors
+
+    for path in paths:
+        value = _get_path(fixed, path)
+        if value is not None or sub_schema(schema, path).get('nullable'):
+            _set_path(data, path, value)
+
+    errors = validator(data)
+    llm_output_repairs.inc(operation=operation, result="fixed" if not errors else "partial")
+    return data, errors
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 서버 모듈은 server/ 디렉터리 기준의 평면 import를 사용
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime
+
+from email_threads import ThreadIndex, normalize_subject, activity_time, summarize_thread
+
+
+class _FakeDB:
+    """In-memory threads/emails with the lookups ThreadIndex uses"""
+
+    def __init__(self, emails=()):
+        self.threads = {}
+        self.emails = list(emails)
+
+    async def find_thread_by_message_ids(self, message_ids):
+        matches = [thread for thread in self.threads.values() if set(message_ids) & thread['message_ids']]
+        return max(matches, key=lambda thread: thread['last_activity_at'], default=None)
+
+    async def find_email_by_gmail_ids(self, gmail_ids):
+        return next((email for email in self.emails if email['gmail_id'] in gmail_ids), None)
+
+    async def find_recent_thread(self, subject_key, sender_email, since):
+        matches = [thread for thread in self.threads.values()
+                   if thread['subject_key'] == subject_key and sender_email in thread['participants']
+                   and thread['last_activity_at'] >= since]
+        return max(matches, key=lambda thread: thread['last_activity_at'], default=None)
+
+    async def upsert_thread(self, thread_id, email_data, subject_key, activity_at):
+        thread = self.threads.setdefault(thread_id, {
+            '_id': thread_id, 'subject_key': subject_key, 'participants': set(), 'message_ids': set(),
+            'last_activity_at': activity_at
+        })
+        thread['participants'].add(email_data.get('sender_email'))
+        thread['message_ids'].add(email_data['gmail_id'])
+        thread['last_activity_at'] = max(thread['last_activity_at'], activity_at)
+
+
+def _email(gmail_id, subject, received_at, sender='guest@example.com', references=()):
+    return {'gmail_id': gmail_id, 'subject': subject, 'sender_email': sender,
+            'received_at': received_at, 'references': list(references)}
+
+
+def _assign(index, email_data):
+    return asyncio.run(index.assign(email_data))
+
+
+def test_normalize_subject_strips_stacked_reply_and_forward_prefixes():
+    assert normalize_subject('Re: RE[2]: 답장: Fwd:  Booking   for July') == 'booking for july'
+    assert normalize_subject('회신: 전달: 예약 문의') == '예약 문의'
+    assert normalize_subject('AW: SV: Question') == 'question'
+    assert normalize_subject(None) == ''
+
+
+def test_activity_time_is_naive_utc():
+    assert activity_time('2024-07-01T01:00:00+09:00') == datetime(2024, 6, 30, 16, 0)
+    assert activity_time('2024-07-01T01:00:00') == datetime(2024, 7, 1, 1, 0)
+
+
+def test_references_join_the_existing_thread():
+    index = ThreadIndex(_FakeDB())
+    first = _assign(index, _email('<a@x>', 'Booking', '2024-07-01T10:00:00+09:00'))
+    reply = _assign(index, _email('<b@x>', 'Totally different', '2024-07-02T10:00:00+09:00', references=['<a@x>']))
+    assert first == reply == '<a@x>'
+
+
+def test_reply_to_an_email_stored_before_threads_uses_its_thread():
+    db = _FakeDB(emails=[{'gmail_id': '<old@x>', 'thread_id': '<root@x>', 'subject': 'Booking',
+                          'sender_email': 'guest@example.com', 'received_at': '2024-06-01T10:00:00+00:00'}])
+    index = ThreadIndex(db)
+    assert _assign(index, _email('<new@x>', 'Re: Booking', '2024-07-01T10:00:00+00:00', references=['<old@x>'])) == '<root@x>'
+    # 부모 메일도 스레드에 기록됨
+    assert {'<old@x>', '<new@x>'} <= db.threads['<root@x>']['message_ids']
+
+
+def test_same_sender_and_subject_within_the_window_continue_the_thread():
+    index = ThreadIndex(_FakeDB())
+    index.subject_window_days = 14
+    first = _assign(index, _email('<a@x>', '예약 문의', '2024-07-01T10:00:00+09:00'))
+    assert _assign(index, _email('<b@x>', 'Re: 예약 문의', '2024-07-10T10:00:00+09:00')) == first
+
+
+def test_subject_fallback_respects_window_sender_and_generic_subjects():
+    index = ThreadIndex(_FakeDB())
+    index.subject_window_days = 14
+    _assign(index, _email('<a@x>', '예약 문의', '2024-07-01T10:00:00+09:00'))
+    # 기간이 지남
+    assert _assign(index, _email('<b@x>', '예약 문의', '2024-08-01T10:00:00+09:00')) == '<b@x>'
+    # 다른 발신자
+    assert _assign(index, _email('<c@x>', '예약 문의', '2024-08-02T10:00:00+09:00', sender='other@example.com')) == '<c@x>'
+    # 흔한 제목은 제목만으로 묶지 않음
+    _assign(index, _email('<d@x>', '(no subject)', '2024-08-03T10:00:00+09:00'))
+    assert _assign(index, _email('<e@x>', 'No Subject', '2024-08-03T11:00:00+09:00')) == '<e@x>'
+
+
+def test_assignment_failure_keeps_the_own_message_id():
+    class BrokenDB(_FakeDB):
+        async def find_thread_by_message_ids(self, message_ids):
+            raise RuntimeError("db down")
+
+    email_data = {**_email('<a@x>', 'Booking', '2024-07-01T10:00:00+09:00'), 'thread_id': '<a@x>'}
+    assert _assign(ThreadIndex(BrokenDB()), email_data) == '<a@x>'
+
+
+def test_summary_lists_messages_and_replies_compactly():
+    summary = summarize_thread([
+        {'sender_email': 'guest@example.com', 'received_at': '2024-07-01T10:00:00+09:00',
+         'latest_message_text': '체크인   시간이\n궁금합니다', 'sent_reply': '오후 3시입니다'}
+    ], max_chars=5)
+    assert summary == ('[2024-07-01 10:00] 고객(guest@example.com): 체크인 시…\n'
+                       '[2024-07-01 10:00] 펜션 답장: 오후 3시…')
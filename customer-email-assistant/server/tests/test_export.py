@@ -0,0 +1,66 @@
+import email
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip('orjson')
+
+from export import build_export_query, parse_fields
+from mime_parser import parse_headers_only
+
+# 월 경계 근처에서 발신자 오프셋이 서로 다른 메일
+DATE_HEADERS = {
+    'seoul-june': 'Mon, 01 Jul 2024 01:00:00 +0900',     # 2024-06-30 16:00 UTC
+    'la-july': 'Sun, 30 Jun 2024 20:00:00 -0700',        # 2024-07-01 03:00 UTC
+    'utc-july': 'Mon, 01 Jul 2024 00:00:00 +0000',       # 2024-07-01 00:00 UTC
+    'seoul-august': 'Thu, 01 Aug 2024 08:59:00 +0900',   # 2024-07-31 23:59 UTC
+    'utc-august': 'Thu, 01 Aug 2024 00:00:00 GMT',       # 2024-08-01 00:00 UTC
+}
+
+
+def _stored_emails():
+    emails = []
+    for name, date in DATE_HEADERS.items():
+        headers = email.message_from_string(f"Date: {date}\nSubject: {name}\n\n")
+        emails.append(parse_headers_only(headers, name))
+    return emails
+
+
+def _matching(query, emails):
+    # MongoDB의 $gte/$lt 범위 조건을 그대로 흉내냄
+    names = []
+    for email_data in emails:
+        value = email_data.get('received_utc')
+        bounds = query['received_utc']
+        if value is None:
+            continue
+        if '$gte' in bounds and not value >= bounds['$gte']:
+            continue
+        if '$lt' in bounds and not value < bounds['$lt']:
+            continue
+        names.append(email_data['id'])
+    return sorted(names)
+
+
+def test_month_filter_uses_utc_time_not_sender_offset():
+    query = build_export_query(datetime(2024, 7, 1), datetime(2024, 8, 1))
+    assert 'received_at' not in query
+    assert _matching(query, _stored_emails()) == ['la-july', 'seoul-august', 'utc-july']
+
+
+def test_offset_aware_bounds_are_converted_to_utc():
+    kst = timezone(timedelta(hours=9))
+    query = build_export_query(datetime(2024, 7, 1, tzinfo=kst), datetime(2024, 8, 1, tzinfo=kst))
+    assert query['received_utc'] == {'$gte': datetime(2024, 6, 30, 15, 0), '$lt': datetime(2024, 7, 31, 15, 0)}
+    assert _matching(query, _stored_emails()) == ['la-july', 'seoul-june', 'utc-july']
+
+
+def test_status_and_priority_filters():
+    query = build_export_query(status='unread,replied', priority='urgent')
+    assert query == {'status': {'$in': ['unread', 'replied']}, 'priority': {'$in': ['urgent']}}
+
+
+def test_parse_fields_rejects_unknown_fields():
+    assert parse_fields('id, subject') == ['id', 'subject']
+    with pytest.raises(ValueError):
+        parse_fields('id,password')
@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip('fastapi')
+
+from fastapi import Request
+
+from http_cache import make_etag, etag_matches, cache_headers, not_modified, time_bucket
+
+
+def _request(if_none_match=None):
+    headers = [(b'if-none-match', if_none_match.encode())] if if_none_match else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/emails', 'headers': headers})
+
+
+def test_etag_is_stable_and_changes_with_revision():
+    assert make_etag("emails", 3, {'b': 1, 'a': 2}) == make_etag("emails", 3, {'a': 2, 'b': 1})
+    assert make_etag("emails", 3) != make_etag("emails", 4)
+    assert make_etag("emails", 3).startswith('"') and make_etag("emails", 3).endswith('"')
+
+
+def test_matches_exact_and_listed_etags():
+    etag = make_etag("emails", 1)
+    assert etag_matches(_request(etag), etag)
+    assert etag_matches(_request(f'"other", {etag}'), etag)
+    assert not etag_matches(_request('"other"'), etag)
+    assert not etag_matches(_request(), etag)
+
+
+def test_weak_etags_match_by_weak_comparison():
+    etag = make_etag("emails", 1)
+    assert etag_matches(_request(f'W/{etag}'), etag)
+    assert not etag_matches(_request(f'W/"stale"'), etag)
+
+
+def test_wildcard_matches_any_etag():
+    assert etag_matches(_request('*'), make_etag("emails", 1))
+
+
+def test_not_modified_response_keeps_validators():
+    etag = make_etag("emails", 1)
+    response = not_modified(_request(etag), etag)
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+    assert response.headers['cache-control'] == cache_headers(etag)['Cache-Control']
+
+
+def test_stats_hour_bucket_changes_only_across_the_hour():
+    hour = 3600
+    assert time_bucket(hour, now=7200) == time_bucket(hour, now=7200 + hour - 1)
+    assert time_bucket(hour, now=7200 + hour) == time_bucket(hour, now=7200) + 1
+    # 같은 revision이라도 시간 구간이 바뀌면 /stats ETag가 바뀜
+    assert make_etag("stats", 5, time_bucket(hour, now=7200)) != make_etag("stats", 5, time_bucket(hour, now=10800))
@@ -0,0 +1,40 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# main.py가 시작 시 import하는 서비스 모듈 (fastapi/orjson이 필요한 http_cache, export 제외)
+SERVICE_MODULES = [
+    'app_logging', 'metrics', 'text_cleaner', 'single_flight', 'llm_scheduler',
+    'simple_email_reader', 'reply_generator', 'classifier', 'db', 'gmail_sender',
+    'pension_analyzer', 'retention', 'email_sync', 'backfill', 'bulk_filter',
+    'events', 'email_threads',
+]
+
+# 첫 사용 시에만 로드되어야 하는 무거운 SDK
+HEAVY_MODULES = ['google.generativeai', 'google.api_core', 'openai', 'motor', 'pymongo', 'bson']
+
+def _loaded_after_import(modules):
+    # 새 인터프리터에서 import해야 다른 테스트가 로드한 모듈의 영향을 받지 않음
+    script = (
+        "import sys, json\n"
+        f"for name in {modules!r}: __import__(name)\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, '-c', script], cwd=SERVER_DIR, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_service_modules_do_not_import_heavy_sdks():
+    assert _loaded_after_import(SERVICE_MODULES) == []
+
+def test_main_does_not_import_heavy_sdks():
+    for module in ('fastapi', 'orjson', 'uvicorn', 'dotenv'):
+        pytest.importorskip(module)
+    assert _loaded_after_import(['main']) == []
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+
+import pytest
+
+from llm_scheduler import (
+    LLMScheduler, llm_lane, INTERACTIVE, URGENT_DRAFT, BACKGROUND, BACKFILL, WINDOW_SECONDS
+)
+from text_cleaner import CHARS_PER_TOKEN
+
+
+def _scheduler(max_concurrency=1, tokens_per_minute=0):
+    scheduler = LLMScheduler(max_concurrency=max_concurrency, tokens_per_minute=tokens_per_minute)
+    scheduler.completion_tokens = 0
+    return scheduler
+
+
+async def _settle():
+    # 큐에 들어갈 때까지 이벤트 루프를 몇 번 양보
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_lanes_run_in_priority_order():
+    async def scenario():
+        scheduler = _scheduler()
+        gate = threading.Event()
+        ran = []
+
+        blocker = asyncio.create_task(scheduler.submit("gemini", "op", gate.wait, lane=BACKGROUND))
+        try:
+            await _settle()
+            tasks = [asyncio.create_task(scheduler.submit("gemini", "op", ran.append, lane, lane=lane))
+                     for lane in (BACKFILL, BACKGROUND)]
+            with llm_lane(URGENT_DRAFT):
+                # 레인을 넘기지 않으면 컨텍스트에서 읽음 (create_task가 컨텍스트를 복사)
+                tasks.append(asyncio.create_task(scheduler.submit("gemini", "op", ran.append, URGENT_DRAFT)))
+            tasks.append(asyncio.create_task(scheduler.submit("gemini", "op", ran.append, INTERACTIVE)))
+            await _settle()
+            assert scheduler.status()['queued'] == {INTERACTIVE: 1, URGENT_DRAFT: 1, BACKGROUND: 1, BACKFILL: 1}
+        finally:
+            gate.set()
+        await asyncio.gather(blocker, *tasks)
+        return ran
+
+    assert asyncio.run(scenario()) == [INTERACTIVE, URGENT_DRAFT, BACKGROUND, BACKFILL]
+
+
+def test_unknown_lane_is_rejected():
+    with pytest.raises(ValueError):
+        with llm_lane("later"):
+            pass
+
+
+def test_token_budget_holds_calls_until_the_window_frees_up():
+    async def scenario():
+        scheduler = _scheduler(max_concurrency=4, tokens_per_minute=1000)
+        prompt = "x" * (600 * CHARS_PER_TOKEN)
+
+        await scheduler.submit("gemini", "op", len, prompt)
+        second = asyncio.create_task(scheduler.submit("gemini", "op", len, prompt))
+        await _settle()
+        # 600 + 600 > 1000: 동시 실행 슬롯이 남아도 기다림
+        assert not second.done()
+        assert scheduler.status()['queued'][INTERACTIVE] == 1
+        assert scheduler.status()['tokens_last_minute'] == 600
+
+        # 1분이 지난 것처럼 기록을 옮기고 다시 배정
+        scheduler._usage[0][0] -= WINDOW_SECONDS + 1
+        scheduler._dispatch()
+        return await asyncio.wait_for(second, timeout=5)
+
+    assert asyncio.run(scenario()) == 600 * CHARS_PER_TOKEN
+
+
+def test_cancelled_caller_leaves_the_queue_without_running():
+    async def scenario():
+        scheduler = _scheduler()
+        gate = threading.Event()
+        ran = []
+
+        blocker = asyncio.create_task(scheduler.submit("gemini", "op", gate.wait))
+        try:
+            await _settle()
+            queued = asyncio.create_task(scheduler.submit("gemini", "op", ran.append, "queued"))
+            await _settle()
+            assert scheduler.status()['queued'][INTERACTIVE] == 1
+
+            # 클라이언트 연결이 끊겨 요청이 취소된 경우
+            queued.cancel()
+            await _settle()
+            assert scheduler.status()['queued'][INTERACTIVE] == 0
+        finally:
+            gate.set()
+        await blocker
+        await _settle()
+        return ran, scheduler.status()['active']
+
+    ran, active = asyncio.run(scenario())
+    assert ran == []
+    assert active == 0
@@ -0,0 +1,63 @@
+import os
+
+from classifier import EmailClassifier
+from local_classifier import LocalClassifier, build_text, train_and_evaluate
+
+# 라벨이 분명히 갈리는 작은 학습 데이터
+SPAM_SUBJECTS = ['무료 쿠폰 이벤트', '특가 할인 광고', '당첨 축하 무료 경품', '광고 할인 쿠폰 지급', '무료 체험 특가 이벤트']
+SUPPORT_SUBJECTS = ['예약 변경 문의', '체크인 시간 문의', '객실 예약 확인 요청', '환불 규정 문의', '바베큐 예약 문의']
+
+
+def _samples(repeat=4):
+    samples = []
+    for i in range(repeat):
+        for subject in SPAM_SUBJECTS:
+            samples.append({'text': build_text(subject, f'지금 클릭하면 무료 할인 쿠폰 {i}'),
+                            'priority': 'spam', 'tags': ['promotion']})
+        for subject in SUPPORT_SUBJECTS:
+            samples.append({'text': build_text(subject, f'안녕하세요, 예약 관련해서 문의드립니다 {i}'),
+                            'priority': 'support', 'tags': ['reservation']})
+    return samples
+
+
+def test_train_and_evaluate_reports_holdout_accuracy_and_coverage():
+    samples = _samples()
+    model, report, holdout = train_and_evaluate(samples, threshold=0.5)
+
+    assert report['train_samples'] == 32 and report['holdout_samples'] == 8 and len(holdout) == 8
+    assert report['local']['accuracy'] == 1.0
+    assert 0 < report['cascade']['local_coverage'] <= 1
+    assert report['cascade']['llm_calls_per_1k'] == round((1 - report['cascade']['local_coverage']) * 1000, 1)
+    # 최종 모델은 전체 데이터로 학습
+    assert model.sample_count == len(samples)
+    assert model.predict('무료 할인 쿠폰을 드립니다', '특가 이벤트')['priority'] == 'spam'
+    assert model.predict('체크인 전에 짐을 맡길 수 있나요', '예약 문의')['priority'] == 'support'
+
+
+def test_saved_model_round_trips(tmp_path):
+    model, _, _ = train_and_evaluate(_samples(), threshold=0.5)
+    path = str(tmp_path / 'model.json.gz')
+    model.save(path)
+    loaded = LocalClassifier.load(path)
+    assert loaded.sample_count == model.sample_count
+    assert loaded.predict('예약 변경 문의', '문의') == model.predict('예약 변경 문의', '문의')
+
+
+def test_local_model_loads_lazily_and_reloads_when_the_file_changes(tmp_path, monkeypatch):
+    path = tmp_path / 'model.json.gz'
+    monkeypatch.setenv('LOCAL_CLASSIFIER_PATH', str(path))
+    classifier = EmailClassifier()
+    assert classifier._local_model is None
+    assert classifier.classify_local('무료 쿠폰', '광고') is None
+
+    # 다른 워커가 재학습해 파일을 교체한 경우
+    first, _, _ = train_and_evaluate(_samples(), threshold=0.5)
+    first.save(str(path))
+    os.utime(path, ns=(1_000_000_000, 1_000_000_000))
+    assert classifier.classify_local('무료 쿠폰', '광고')['source'] == 'local'
+    assert classifier.local_model.sample_count == 40
+
+    second, _, _ = train_and_evaluate(_samples(repeat=2), threshold=0.5)
+    second.save(str(path))
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert classifier.local_model.sample_count == 20
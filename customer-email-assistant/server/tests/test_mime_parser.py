@@ -0,0 +1,30 @@
+import email
+from datetime import datetime
+
+from mime_parser import parse_headers_only, received_utc
+
+
+def _headers(date: str):
+    return email.message_from_string(f"Date: {date}\nSubject: Booking\nFrom: Guest <guest@example.com>\n\n")
+
+
+def test_received_utc_applies_the_sender_offset():
+    # 서울 오전 1시 = 전날 UTC 16시 (월이 바뀜)
+    assert received_utc('2024-07-01T01:00:00+09:00') == datetime(2024, 6, 30, 16, 0)
+    assert received_utc('2024-06-30T20:00:00-07:00') == datetime(2024, 7, 1, 3, 0)
+    assert received_utc('2024-07-01T00:00:00+00:00') == datetime(2024, 7, 1, 0, 0)
+
+
+def test_received_utc_treats_naive_values_as_utc():
+    assert received_utc('2024-07-01T00:30:00') == datetime(2024, 7, 1, 0, 30)
+
+
+def test_received_utc_is_none_when_unparseable():
+    assert received_utc(None) is None
+    assert received_utc('yesterday') is None
+
+
+def test_parsed_headers_keep_received_at_and_add_received_utc():
+    email_data = parse_headers_only(_headers('Mon, 01 Jul 2024 01:00:00 +0900'), 'uid-1')
+    assert email_data['received_at'] == '2024-07-01T01:00:00+09:00'
+    assert email_data['received_utc'] == datetime(2024, 6, 30, 16, 0)
@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from retention import RetentionJob
+
+
+class _FakeDB:
+    """In-memory stand-in for the retention queries and the lease lock"""
+
+    def __init__(self, emails, lock_free=True):
+        self.emails = {email['_id']: email for email in emails}
+        self.lock_free = lock_free
+        self.lock_calls = []
+        self.released = []
+
+    async def acquire_lock(self, name, owner, ttl_seconds):
+        self.lock_calls.append(name)
+        return self.lock_free
+
+    async def release_lock(self, name, owner):
+        self.released.append(name)
+
+    async def get_retention_candidates(self, cutoff, batch_size):
+        matching = [
+            email for email in self.emails.values()
+            if email['received_utc'] < cutoff and 'cold_storage' not in email
+        ]
+        return sorted(matching, key=lambda email: email['received_utc'])[:batch_size]
+
+    async def replace_with_stubs(self, stubs):
+        for stub in stubs:
+            self.emails[stub['_id']] = stub
+        return len(stubs)
+
+
+def _email(_id, days_old):
+    return {
+        '_id': _id, 'subject': f'mail {_id}', 'body': 'x' * 500, 'status': 'archived', 'version': 3,
+        'received_at': '2024-01-01T00:00:00+09:00', 'received_utc': datetime.utcnow() - timedelta(days=days_old)
+    }
+
+
+def _job(db):
+    job = RetentionJob(db)
+    job.days = 90
+    job.batch_size = 2
+
+    async def write_cold(docs):
+        return 'emails_cold'
+    job._write_cold = write_cold
+    return job
+
+
+def test_moves_only_expired_emails_in_batches():
+    db = _FakeDB([_email(1, 200), _email(2, 150), _email(3, 100), _email(4, 10)])
+    status = asyncio.run(_job(db).run())
+    assert status['moved'] == 3 and status['batches'] == 2 and status['error'] is None
+    assert [_id for _id, email in db.emails.items() if 'cold_storage' in email] == [1, 2, 3]
+    assert db.released == ['retention']
+
+
+def test_stub_keeps_version_for_etags_and_concurrency_checks():
+    db = _FakeDB([_email(1, 200)])
+    asyncio.run(_job(db).run())
+    stub = db.emails[1]
+    assert stub['version'] == 3
+    assert len(stub['body']) == 200
+    assert stub['cold_storage']['location'] == 'emails_cold'
+
+
+def test_skips_when_another_worker_holds_the_lease():
+    db = _FakeDB([_email(1, 200)], lock_free=False)
+    status = asyncio.run(_job(db).run())
+    assert status['skipped'] is True
+    assert 'cold_storage' not in db.emails[1]
+    assert db.released == []
@@ -0,0 +1,114 @@
+import asyncio
+
+from single_flight import SingleFlight
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_callers_share_one_run():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return 'draft', False
+
+        callers = [asyncio.create_task(flights.do('key', work)) for _ in range(3)]
+        await _settle()
+        assert flights.is_running('key')
+        release.set()
+        results = await asyncio.gather(*callers)
+        return calls, results, flights.is_running('key')
+
+    calls, results, running = asyncio.run(scenario())
+    assert calls == [1]
+    assert results == [('draft', False)] * 3
+    assert running is False
+
+
+def test_different_keys_run_separately_and_finished_keys_run_again():
+    async def scenario():
+        flights = SingleFlight()
+        calls = []
+
+        async def work(key):
+            calls.append(key)
+            return key
+
+        await asyncio.gather(flights.do('a', lambda: work('a')), flights.do('b', lambda: work('b')))
+        await flights.do('a', lambda: work('a'))
+        return calls
+
+    assert asyncio.run(scenario()) == ['a', 'b', 'a']
+
+
+def test_errors_reach_every_caller_and_are_not_cached():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError("LLM unavailable")
+
+        callers = [asyncio.create_task(flights.do('key', failing)) for _ in range(2)]
+        await _settle()
+        release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+
+        async def working():
+            return 'ok'
+        return results, await flights.do('key', working)
+
+    results, retried = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == 'ok'
+
+
+def test_one_caller_leaving_does_not_cancel_the_others():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return 'draft'
+
+        leaving = asyncio.create_task(flights.do('key', work))
+        staying = asyncio.create_task(flights.do('key', work))
+        await _settle()
+        leaving.cancel()
+        await _settle()
+        assert flights.is_running('key')
+        release.set()
+        return await staying, leaving.cancelled()
+
+    assert asyncio.run(scenario()) == ('draft', True)
+
+
+def test_work_is_cancelled_when_every_caller_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flights.do('key', work)) for _ in range(2)]
+        await _settle()
+        for caller in callers:
+            caller.cancel()
+        await _settle()
+        return cancelled.is_set(), flights.is_running('key')
+
+    assert asyncio.run(scenario()) == (True, False)
@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+import structured_output
+from structured_output import _json_mode_rejected, compile_validator, generate_json
+
+SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {'priority': {'type': 'STRING', 'enum': ['urgent', 'normal']}},
+    'required': ['priority']
+}
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Model:
+    """generate_content stand-in that fails JSON-mode calls with the given error"""
+
+    def __init__(self, json_mode_error=None):
+        self.json_mode_error = json_mode_error
+        self.calls = []
+
+    def generate_content(self, prompt, generation_config=None):
+        self.calls.append(generation_config)
+        if generation_config and self.json_mode_error:
+            raise self.json_mode_error
+        return _Response('{"priority": "urgent"}')
+
+
+@pytest.fixture(autouse=True)
+def _reset_unsupported_models():
+    structured_output._json_mode_unsupported.clear()
+    yield
+    structured_output._json_mode_unsupported.clear()
+
+
+def test_schema_config_errors_are_rejections():
+    assert _json_mode_rejected(TypeError("unexpected keyword argument 'response_schema'"))
+    assert _json_mode_rejected(ValueError("Unknown field for GenerationConfig: response_mime_type"))
+
+
+def test_other_errors_are_not_rejections():
+    assert not _json_mode_rejected(ValueError("Invalid JSON"))
+    assert not _json_mode_rejected(TimeoutError("deadline exceeded"))
+    assert not _json_mode_rejected(RuntimeError("429 Resource exhausted"))
+
+
+def test_invalid_argument_counts_only_when_it_names_the_schema_config():
+    google_exceptions = pytest.importorskip('google.api_core.exceptions')
+    assert _json_mode_rejected(google_exceptions.InvalidArgument("responseSchema is not supported for this model"))
+    assert not _json_mode_rejected(google_exceptions.InvalidArgument("API key not valid"))
+    assert not _json_mode_rejected(google_exceptions.InvalidArgument("The input token count exceeds the maximum"))
+
+
+def test_rejected_json_mode_falls_back_to_plain_prompt():
+    model = _Model(TypeError("unexpected keyword argument 'response_schema'"))
+    data, invalid = asyncio.run(generate_json(model, 'old-model', 'classify', 'prompt', SCHEMA))
+    assert data == {'priority': 'urgent'} and invalid == []
+    assert model.calls[-1] is None
+    assert 'old-model' in structured_output._json_mode_unsupported
+
+
+def test_unrelated_error_is_raised_and_json_mode_stays_on():
+    model = _Model(ValueError("Invalid API key"))
+    with pytest.raises(ValueError):
+        asyncio.run(generate_json(model, 'gemini', 'classify', 'prompt', SCHEMA))
+    assert 'gemini' not in structured_output._json_mode_unsupported
+
+
+def test_validator_reports_invalid_fields():
+    validator = compile_validator(SCHEMA)
+    assert validator({'priority': 'urgent'}) == []
+    assert validator({'priority': 'later'}) == [(('priority',), "must be one of ['normal', 'urgent']")]
+    assert validator({}) == [(('priority',), 'missing')]
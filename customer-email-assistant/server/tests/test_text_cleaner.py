@@ -0,0 +1,109 @@
+from text_cleaner import extract_latest_message, html_to_text
+
+
+def test_whitespace_between_inline_tags_is_kept():
+    assert html_to_text('<b>Hello</b> <i>world</i>') == 'Hello world'
+
+
+def test_table_cells_are_separated_by_one_space():
+    assert html_to_text('<table><tr><td>x</td> <td>y</td></tr></table>') == 'x y'
+
+
+def test_unclosed_head_does_not_swallow_body():
+    html = '<html><head><style>p { color: red; }</style><body><p>Body</p>'
+    assert html_to_text(html) == 'Body'
+
+
+def test_unclosed_title_ends_at_body():
+    html = '<html><head><title>Newsletter<body><p>Body</p></body></html>'
+    assert html_to_text(html) == 'Body'
+
+
+def test_skips_style_script_and_title():
+    html = ('<html><head><title>Newsletter</title></head><body>'
+            '<script>var a = 1;</script><p>Hi &amp; welcome</p></body></html>')
+    assert html_to_text(html) == 'Hi & welcome'
+
+
+def test_keeps_paragraph_breaks():
+    assert html_to_text('<p>First</p>\n  <p>Second<br>line</p>') == 'First\n\nSecond\nline'
+
+
+def test_stops_at_character_budget():
+    text = html_to_text('<p>' + 'word ' * 100 + '</p>', max_chars=20)
+    assert text.endswith('...')
+    assert len(text) <= 23
+
+
+def test_cuts_gmail_quote():
+    text = ('Can we check in at 2pm?\n\n'
+            'On Mon, Jul 1, 2024 at 3:00 PM Pension <stay@example.com> wrote:\n'
+            '> Your booking is confirmed.\n')
+    assert extract_latest_message(text) == 'Can we check in at 2pm?'
+
+
+def test_cuts_wrapped_gmail_quote():
+    text = ('Thanks!\n\nOn Mon, Jul 1, 2024 at 3:00 PM Pension Stay\n'
+            '<stay@example.com> wrote:\n> Your booking is confirmed.')
+    assert extract_latest_message(text) == 'Thanks!'
+
+
+def test_cuts_korean_gmail_quote():
+    text = '바베큐 추가 가능할까요?\n\n2024년 7월 1일 (월) 오후 3:00, 펜션 <stay@example.com>님이 작성:\n> 예약 확정되었습니다.'
+    assert extract_latest_message(text) == '바베큐 추가 가능할까요?'
+
+
+def test_cuts_outlook_header_block():
+    text = ('Please send the invoice.\n\n'
+            '________________________________\n'
+            'From: Pension Stay <stay@example.com>\n'
+            'Sent: Monday, July 1, 2024 3:00 PM\n'
+            'To: guest@example.com\n'
+            'Subject: Booking confirmed\n\n'
+            'Your booking is confirmed.')
+    assert extract_latest_message(text) == 'Please send the invoice.'
+
+
+def test_cuts_korean_outlook_header_block_without_separator():
+    text = ('영수증 부탁드립니다.\n\n'
+            '보낸 사람: 펜션 <stay@example.com>\n'
+            '보낸 날짜: 2024년 7월 1일 월요일 오후 3:00\n'
+            '받는 사람: guest@example.com\n'
+            '제목: 예약 확정 안내\n\n'
+            '예약이 확정되었습니다.')
+    assert extract_latest_message(text) == '영수증 부탁드립니다.'
+
+
+def test_cuts_naver_original_message():
+    text = ('인원 추가 문의드립니다.\n\n'
+            '-----Original Message-----\n'
+            'From: "펜션"<stay@example.com>\n'
+            'To: <guest@naver.com>;\n'
+            'Sent: 2024-07-01 (월) 15:00:00 (GMT+09:00)\n'
+            'Subject: 예약 확정 안내\n')
+    assert extract_latest_message(text) == '인원 추가 문의드립니다.'
+
+
+def test_cuts_signatures():
+    assert extract_latest_message('See you soon.\n\nSent from my iPhone') == 'See you soon.'
+    assert extract_latest_message('See you soon.\n--\nKim Minji\n010-1234-5678') == 'See you soon.'
+    assert extract_latest_message('곧 뵙겠습니다.\n\niPhone에서 보냄') == '곧 뵙겠습니다.'
+
+
+def test_keeps_a_plain_from_line_in_guest_text():
+    text = ('We are driving up on Friday.\n'
+            'From: Seoul Station, arriving around 4pm\n'
+            'Is there parking for two cars?')
+    assert extract_latest_message(text) == text
+
+
+def test_keeps_a_pasted_booking_with_from_and_date_but_no_subject():
+    text = ('Here is my booking:\n'
+            'From: 2024-07-01\n'
+            'Date: 2 nights, 4 guests\n\n'
+            'Can we add breakfast?')
+    assert extract_latest_message(text) == text
+
+
+def test_falls_back_to_the_full_text_when_everything_is_quoted():
+    assert extract_latest_message('> only a quote') == '> only a quote'
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import re
+from html.parser import HTMLParser
+from typing import Dict, List
+
+# 이 줄부터 아래는 이전 메일 인용으로 보고 잘라냄
+_THREAD_CUT_PATTERNS = [
+    re.compile(r'^\s*-{2,}\s*(Original Message|Forwarded message|원본 메시지|전달된 메시지)\s*-{2,}', re.IGNORECASE),
+    re.compile(r'^\s*On\s.+\swrote:\s*$', re.IGNORECASE),
+    re.compile(r'^.*님이 작성:\s*$'),
+    re.compile(r'^\s*_{10,}\s*$'),
+]
+
+# Outlook/네이버식 인용 헤더: From 줄 바로 아래 블록에 날짜와 제목 줄이 함께 있을 때만 인용으로 봄
+# (고객이 붙여넣은 주소/일정의 "From:" 한 줄은 본문으로 남김)
+_QUOTE_FROM = re.compile(r'^\s*\*?(From|보낸 사람|보낸사람)\s*:\*?\s*\S', re.IGNORECASE)
+_QUOTE_DATE = re.compile(r'^\s*\*?(Sent|Date|보낸 날짜|날짜)\s*:', re.IGNORECASE)
+_QUOTE_SUBJECT = re.compile(r'^\s*\*?(Subject|제목)\s*:', re.IGNORECASE)
+_QUOTE_HEADER_LINES = 6
+
+# 서명/모바일 푸터 시작 표시
+_SIGNATURE_PATTERNS = [
+    re.compile(r'^--\s*$'),
+    re.compile(r'^\s*Sent from my \w+', re.IGNORECASE),
+    re.compile(r'^\s*Sent from (Mail|Outlook)', re.IGNORECASE),
+    re.compile(r'^\s*Get Outlook for', re.IGNORECASE),
+    re.compile(r'^\s*\S+에서 보냄\s*$'),
+]
+
+# "On Mon, Jan 1, 2024 at 3:00 PM Name <a@b.com>" 처럼 wrote:가 다음 줄로 넘어가는 경우
+_WRAPPED_ON_WROTE = re.compile(r'^\s*On\s.+\n.*wrote:\s*$', re.IGNORECASE | re.MULTILINE)
+
+# 한국어가 섞인 메일 기준 보수적인 추정치
+CHARS_PER_TOKEN = 2
+
+def _is_quote_header(following: List[str]) -> bool:
+    block = []
+    for line in following:
+        if not line.strip():
+            break
+        block.append(line)
+    return any(_QUOTE_DATE.match(line) for line in block) and any(_QUOTE_SUBJECT.match(line) for line in block)
+
+def extract_latest_message(text: str) -> str:
+    """Return only the newest message, without quoted reply chains or signatures"""
+    if not text:
+        return ""
+
+    match = _WRAPPED_ON_WROTE.search(text)
+    if match:
+        text = text[:match.start()]
+
+    lines = text.splitlines()
+    kept = []
+    for index, line in enumerate(lines):
+        if any(pattern.match(line) for pattern in _THREAD_CUT_PATTERNS):
+            break
+        if _QUOTE_FROM.match(line) and _is_quote_header(lines[index + 1:index + 1 + _QUOTE_HEADER_LINES]):
+            break
+        if any(pattern.match(line) for pattern in _SIGNATURE_PATTERNS):
+            break
+        if line.lstrip().startswith('>'):
+            continue
+        kept.append(line.rstrip())
+
+    latest = '\n'.join(kept).strip()
+    # 전부 인용문으로 판단된 경우 원문을 그대로 사용
+    return latest or text.strip()
+
+def truncate_to_token_budget(text: str, max_tokens: int = None) -> str:
+    """Cut text to an approximate token budget for LLM prompts"""
+    if max_tokens is None:
+        max_tokens = int(os.getenv("LLM_EMAIL_TOKEN_BUDGET", 2000))
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if not text or len(text) <= max_chars:
+        return text
+    return text[:max_chars] + "..."
+
+def get_llm_text(email_data: Dict) -> str:
+    """Text of an email to send to the LLM stages"""
+    latest = email_data.get('latest_message_text')
+    if latest is None:
+        latest = extract_latest_message(email_data.get('body', ''))
+    return truncate_to_token_budget(latest)
+
+# HTML 변환 시 내용을 버리는 태그 / 문단을 나누는 태그
+# (head는 닫히지 않는 메일이 많아 건너뛰지 않음: 안의 style/title만 버림)
+_SKIP_TAGS = {'style', 'script', 'title', 'noscript', 'template', 'svg'}
+_BLOCK_TAGS = {
+    'p', 'div', 'tr', 'li', 'ul', 'ol', 'table', 'blockquote', 'section', 'article',
+    'header', 'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'pre'
+}
+_WHITESPACE = re.compile(r'[ \t\r\f\v\n\xa0]+')
+_EXTRA_BREAKS = re.compile(r'\n[ ]*(\n[ ]*)+')
+_HTML_FEED_CHUNK = 8192
+
+class _HtmlTextExtractor(HTMLParser):
+    """Single-pass HTML to text conversion that stops once the character budget is reached"""
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.length = 0
+        self.skip_depth = 0
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'body':
+            # head 안에서 닫히지 않은 title 등이 본문까지 삼키지 않도록
+            self.skip_depth = 0
+        elif tag in _SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == 'br':
+            self._append('\n')
+        elif tag in _BLOCK_TAGS:
+            self._append('\n\n')
+        elif tag in ('td', 'th') and not self._ends_with_space():
+            self._append(' ')
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == 'br':
+            self._append('\n')
+        elif tag in _BLOCK_TAGS:
+            self._append('\n\n')
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self._append('\n\n')
+
+    def handle_data(self, data):
+        if self.skip_depth or self.done:
+            return
+        text = _WHITESPACE.sub(' ', data)
+        # 공백만 있는 노드도 단어 사이 구분이므로 한 칸으로 유지 (이미 공백/줄바꿈 뒤면 생략)
+        if text.startswith(' ') and self._ends_with_space():
+            text = text[1:]
+        if text:
+            self._append(text)
+
+    def _ends_with_space(self) -> bool:
+        return not self.parts or self.parts[-1][-1:] in (' ', '\n')
+
+    def _append(self, text: str):
+        if self.done:
+            return
+        remaining = self.max_chars - self.length
+        if len(text) > remaining:
+            text = text[:remaining]
+            self.done = True
+        self.parts.append(text)
+        self.length += len(text)
+
+def html_to_text(html: str, max_chars: int = None) -> str:
+    """Convert HTML to plain text, keeping paragraph breaks and stopping early at max_chars"""
+    if max_chars is None:
+        max_chars = int(os.getenv("HTML_TEXT_MAX_CHARS", 5000))
+
+    parser = _HtmlTextExtractor(max_chars)
+    for i in range(0, len(html), _HTML_FEED_CHUNK):
+        parser.feed(html[i:i + _HTML_FEED_CHUNK])
+        if parser.done:
+            break
+    else:
+        parser.close()
+
+    text = ''.join(parser.parts)
+    text = '\n'.join(line.strip() for line in text.split('\n'))
+    text = _EXTRA_BREAKS.sub('\n\n', text).strip()
+    return text + "..." if parser.done else text